@@ -1,20 +1,20 @@
-import os
-import requests
 from typing import List, Dict, Any
-from dotenv import load_dotenv, find_dotenv
 
-# Load environment variables
-load_dotenv(find_dotenv())
+from api import http_client, rate_limit, search_cache, sources
+from lib.shared import config
 
-GOOGLE_CUSTOM_SEARCH_API_KEY = os.environ.get("GOOGLE_CUSTOM_SEARCH_API_KEY")
-GOOGLE_CSE_ID = os.environ.get("GOOGLE_CSE_ID")
+GOOGLE_CUSTOM_SEARCH_API_KEY = config.GOOGLE_CUSTOM_SEARCH_API_KEY
+GOOGLE_CSE_ID = config.GOOGLE_CSE_ID
 BASE_URL = "https://www.googleapis.com/customsearch/v1"
 
-def search_google_images(query: str, num: int = 10) -> List[Dict[str, Any]]:
+@search_cache.cached_search("Google Custom Search")
+def search_google_images(query: str, num: int = 10, page: int = 1) -> List[Dict[str, Any]]:
     """
     Searches for images using the Google Custom Search API.
-    Returns a list of images in a unified format.
-    Google Custom Search API has a limit of 10 results per page.
+    Returns a list of images in a unified format ([] when the query has no more results);
+    request and HTTP errors raise instead of looking like an empty page.
+    Google Custom Search API has a limit of 10 results per page and 100 results per query.
+    `page` is 1-based and is translated into the API's `start` index.
     """
     if not GOOGLE_CUSTOM_SEARCH_API_KEY or not GOOGLE_CSE_ID:
         print("Google Custom Search API Key or CSE ID not found.")
@@ -26,35 +26,36 @@ def search_google_images(query: str, num: int = 10) -> List[Dict[str, Any]]:
         "q": query,
         "searchType": "image",
         "num": num, # Max 10 results per request
+        "start": (page - 1) * num + 1, # 1-based index of the first result
     }
 
-    try:
-        response = requests.get(BASE_URL, params=params)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        data = response.json()
-        
-        if data and "items" in data:
-            unified_images = []
-            for item in data["items"]:
-                unified_images.append({
-                    "url": item.get("link"),
-                    "source": "Google Custom Search",
-                    "source_url": item.get("image", {}).get("contextLink"),
-                    "alt_text": item.get("title"),
-                    "width": item.get("image", {}).get("width"),
-                    "height": item.get("image", {}).get("height"),
-                    "size": item.get("image", {}).get("byteSize"),
-                    "format": item.get("fileFormat", "").replace("image/", ""),
-                    "tags": [], # Google Custom Search API does not provide tags directly
-                })
-            return unified_images
-        return []
-    except requests.exceptions.RequestException as e:
-        print(f"Error searching Google Custom Search images: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred with Google Custom Search API: {e}")
-        return []
+    response = http_client.get(BASE_URL, params=params)
+    rate_limit.observe_response("Google Custom Search", response.status_code, response.headers)
+    # HTTP errors, timeouts and 429s raise, so the source engine retries or reroutes the page
+    response.raise_for_status()
+    data = response.json()
+
+    if data and "items" in data:
+        unified_images = []
+        for item in data["items"]:
+            unified_images.append({
+                "url": item.get("link"),
+                "source": "Google Custom Search",
+                "source_url": item.get("image", {}).get("contextLink"),
+                "alt_text": item.get("title"),
+                "width": item.get("image", {}).get("width"),
+                "height": item.get("image", {}).get("height"),
+                "size": item.get("image", {}).get("byteSize"),
+                "format": item.get("fileFormat", "").replace("image/", ""),
+                "tags": [], # Google Custom Search API does not provide tags directly
+            })
+        return unified_images
+    return []
+
+# 10 results per page ('num'), 100 per query; free tier allows 100 queries per day
+sources.register(sources.SearchFunctionAdapter(
+    "Google Custom Search", search_google_images, per_page_limit=10, size_param="num", max_results=100,
+    quota=(100, 86400), priority=40, configured=lambda: bool(GOOGLE_CUSTOM_SEARCH_API_KEY and GOOGLE_CSE_ID)))
 
 if __name__ == "__main__":
     # Example usage (replace with your actual key and CSE ID)
@@ -0,0 +1,58 @@
+import asyncio
+import hashlib
+from typing import List, Dict, Any
+
+from api import http_client, rate_limit, sources
+from lib.shared import config
+
+SOURCE_NAME = "Mock Provider"
+
+
+class MockProviderAdapter(sources.SourceAdapter):
+    """
+    Local stand-in provider for load testing, enabled by adding this module to SOURCE_MODULES.
+
+    With MOCK_PROVIDER_URL set, pages are fetched from that server as
+    GET <url>?q=<keyword>&page=<n>&per_page=<size>, which must answer {"hits": [<unified images>]}.
+    Otherwise pages are generated in-process after MOCK_PROVIDER_LATENCY seconds. Generated
+    results are deterministic per (keyword, position) and stop after MOCK_PROVIDER_TOTAL_RESULTS,
+    so repeated runs exercise dedup the same way real providers would.
+    """
+
+    name = SOURCE_NAME
+    per_page_limit = 100
+    priority = 5 # Ahead of the real providers so load tests do not spend their quota
+
+    def __init__(self):
+        self.max_results = config.MOCK_PROVIDER_TOTAL_RESULTS
+        self.quota = (config.MOCK_PROVIDER_QUOTA, 1)
+
+    def _image(self, keyword: str, position: int) -> Dict[str, Any]:
+        seed = hashlib.blake2b(f"{keyword}:{position}".encode("utf-8"), digest_size=8).hexdigest()
+        return {
+            "url": config.MOCK_PROVIDER_IMAGE_URL.format(seed=seed),
+            "source": SOURCE_NAME,
+            "source_url": f"https://mock.invalid/photos/{seed}",
+            "alt_text": f"{keyword} {position}",
+            "width": 640,
+            "height": 480,
+            "size": None,
+            "format": "jpg",
+            "tags": [keyword],
+        }
+
+    async def fetch_page(self, keyword: str, page: int, page_size: int) -> List[Dict[str, Any]]:
+        if config.MOCK_PROVIDER_URL:
+            response = await http_client.async_get(
+                config.MOCK_PROVIDER_URL, params={"q": keyword, "page": page, "per_page": page_size})
+            rate_limit.observe_response(SOURCE_NAME, response.status_code, response.headers)
+            response.raise_for_status()
+            return [dict(hit, source=SOURCE_NAME) for hit in response.json().get("hits", [])]
+
+        await asyncio.sleep(config.MOCK_PROVIDER_LATENCY)
+        start = (page - 1) * page_size
+        end = min(start + page_size, self.max_results)
+        return [self._image(keyword, position) for position in range(start, end)]
+
+
+sources.register(MockProviderAdapter())
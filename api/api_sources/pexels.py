@@ -1,18 +1,17 @@
-import os
-import requests
 from typing import List, Dict, Any
-from dotenv import load_dotenv, find_dotenv
 
-# Load environment variables
-load_dotenv(find_dotenv())
+from api import http_client, rate_limit, search_cache, sources
+from lib.shared import config
 
-PEXELS_API_KEY = os.environ.get("PEXELS_API_KEY")
+PEXELS_API_KEY = config.PEXELS_API_KEY
 BASE_URL = "https://api.pexels.com/v1/search"
 
-def search_pexels_images(query: str, per_page: int = 80) -> List[Dict[str, Any]]:
+@search_cache.cached_search("Pexels")
+def search_pexels_images(query: str, per_page: int = 80, page: int = 1) -> List[Dict[str, Any]]:
     """
     Searches for images using the Pexels API.
-    Returns a list of images in a unified format.
+    Returns a list of images in a unified format ([] when the query has no more results);
+    request and HTTP errors raise instead of looking like an empty page.
     Pexels API has a limit of 80 results per page.
     """
     if not PEXELS_API_KEY:
@@ -25,35 +24,36 @@ def search_pexels_images(query: str, per_page: int = 80) -> List[Dict[str, Any]]
     params = {
         "query": query,
         "per_page": per_page,
+        "page": page, # 1-based page index for paginated collection
     }
 
-    try:
-        response = requests.get(BASE_URL, headers=headers, params=params)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        data = response.json()
-        
-        if data and "photos" in data:
-            unified_images = []
-            for photo in data["photos"]:
-                unified_images.append({
-                    "url": photo["src"].get("medium"),  # Pexels specific field
-                    "source": "Pexels",
-                    "source_url": photo.get("url"),
-                    "alt_text": photo.get("alt"),
-                    "width": photo.get("width"),
-                    "height": photo.get("height"),
-                    "size": None, # Pexels API does not provide file size directly
-                    "format": "jpg", # Pexels images are typically jpg
-                    "tags": [], # Pexels API does not provide tags directly
-                })
-            return unified_images
-        return []
-    except requests.exceptions.RequestException as e:
-        print(f"Error searching Pexels images: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred with Pexels API: {e}")
-        return []
+    response = http_client.get(BASE_URL, headers=headers, params=params)
+    rate_limit.observe_response("Pexels", response.status_code, response.headers)
+    # HTTP errors, timeouts and 429s raise, so the source engine retries or reroutes the page
+    response.raise_for_status()
+    data = response.json()
+
+    if data and "photos" in data:
+        unified_images = []
+        for photo in data["photos"]:
+            unified_images.append({
+                "url": photo["src"].get("medium"),  # Pexels specific field
+                "source": "Pexels",
+                "source_url": photo.get("url"),
+                "alt_text": photo.get("alt"),
+                "width": photo.get("width"),
+                "height": photo.get("height"),
+                "size": None, # Pexels API does not provide file size directly
+                "format": "jpg", # Pexels images are typically jpg
+                "tags": [], # Pexels API does not provide tags directly
+            })
+        return unified_images
+    return []
+
+# 80 results per page; free tier allows 200 requests per hour
+sources.register(sources.SearchFunctionAdapter(
+    "Pexels", search_pexels_images, per_page_limit=80,
+    quota=(200, 3600), priority=20, configured=lambda: bool(PEXELS_API_KEY)))
 
 if __name__ == "__main__":
     # Example usage
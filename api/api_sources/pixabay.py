@@ -1,18 +1,18 @@
-import os
-import requests
 from typing import List, Dict, Any
-from dotenv import load_dotenv, find_dotenv
 
-# Load environment variables
-load_dotenv(find_dotenv())
+from api import http_client, rate_limit, search_cache, sources
+from lib.shared import config
 
-PIXABAY_API_KEY = os.environ.get("PIXABAY_API_KEY")
+PIXABAY_API_KEY = config.PIXABAY_API_KEY
 BASE_URL = "https://pixabay.com/api/"
 
-def search_pixabay_images(query: str, per_page: int = 200) -> List[Dict[str, Any]]:
+@search_cache.cached_search("Pixabay")
+def search_pixabay_images(query: str, per_page: int = 200, page: int = 1) -> List[Dict[str, Any]]:
     """
     Searches for images using the Pixabay API.
-    Returns a list of images in a unified format.
+    Returns a list of images in a unified format ([] when the query has no more results);
+    request and HTTP errors raise instead of looking like an empty page.
+    Pixabay API returns at most 500 results per query across all pages.
     """
     if not PIXABAY_API_KEY:
         print("Pixabay API key not found.")
@@ -23,36 +23,37 @@ def search_pixabay_images(query: str, per_page: int = 200) -> List[Dict[str, Any
         "q": query,
         "image_type": "photo",
         "per_page": per_page,
+        "page": page, # 1-based page index for paginated collection
         "safesearch": True,
     }
 
-    try:
-        response = requests.get(BASE_URL, params=params)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        data = response.json()
-        
-        if data and "hits" in data:
-            unified_images = []
-            for hit in data["hits"]:
-                unified_images.append({
-                    "url": hit.get("webformatURL"),  # Pixabay specific field
-                    "source": "Pixabay",
-                    "source_url": hit.get("pageURL"),
-                    "alt_text": hit.get("tags"), # Pixabay tags can be used as alt_text
-                    "width": hit.get("webformatWidth"),
-                    "height": hit.get("webformatHeight"),
-                    "size": None, # Pixabay API does not provide file size directly
-                    "format": "jpg", # Most webformatURL are jpg
-                    "tags": hit.get("tags").split(", ") if hit.get("tags") else [],
-                })
-            return unified_images
-        return []
-    except requests.exceptions.RequestException as e:
-        print(f"Error searching Pixabay images: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred with Pixabay API: {e}")
-        return []
+    response = http_client.get(BASE_URL, params=params)
+    rate_limit.observe_response("Pixabay", response.status_code, response.headers)
+    # HTTP errors, timeouts and 429s raise, so the source engine retries or reroutes the page
+    response.raise_for_status()
+    data = response.json()
+
+    if data and "hits" in data:
+        unified_images = []
+        for hit in data["hits"]:
+            unified_images.append({
+                "url": hit.get("webformatURL"),  # Pixabay specific field
+                "source": "Pixabay",
+                "source_url": hit.get("pageURL"),
+                "alt_text": hit.get("tags"), # Pixabay tags can be used as alt_text
+                "width": hit.get("webformatWidth"),
+                "height": hit.get("webformatHeight"),
+                "size": None, # Pixabay API does not provide file size directly
+                "format": "jpg", # Most webformatURL are jpg
+                "tags": hit.get("tags").split(", ") if hit.get("tags") else [],
+            })
+        return unified_images
+    return []
+
+# 200 results per page, 500 per query; free tier allows 100 requests per minute
+sources.register(sources.SearchFunctionAdapter(
+    "Pixabay", search_pixabay_images, per_page_limit=200, max_results=500,
+    quota=(100, 60), priority=10, configured=lambda: bool(PIXABAY_API_KEY)))
 
 if __name__ == "__main__":
     # Example usage
@@ -1,18 +1,17 @@
-import os
-import requests
 from typing import List, Dict, Any
-from dotenv import load_dotenv, find_dotenv
 
-# Load environment variables
-load_dotenv(find_dotenv())
+from api import http_client, rate_limit, search_cache, sources
+from lib.shared import config
 
-UNSPLASH_ACCESS_KEY = os.environ.get("UNSPLASH_ACCESS_KEY")
+UNSPLASH_ACCESS_KEY = config.UNSPLASH_ACCESS_KEY
 BASE_URL = "https://api.unsplash.com/search/photos"
 
-def search_unsplash_images(query: str, per_page: int = 30) -> List[Dict[str, Any]]:
+@search_cache.cached_search("Unsplash")
+def search_unsplash_images(query: str, per_page: int = 30, page: int = 1) -> List[Dict[str, Any]]:
     """
     Searches for images using the Unsplash API.
-    Returns a list of images in a unified format.
+    Returns a list of images in a unified format ([] when the query has no more results);
+    request and HTTP errors raise instead of looking like an empty page.
     Unsplash API has a limit of 30 results per page for search.
     """
     if not UNSPLASH_ACCESS_KEY:
@@ -25,36 +24,37 @@ def search_unsplash_images(query: str, per_page: int = 30) -> List[Dict[str, Any
     params = {
         "query": query,
         "per_page": per_page,
+        "page": page, # 1-based page index for paginated collection
         "orientation": "landscape", # Common orientation for general images
     }
 
-    try:
-        response = requests.get(BASE_URL, headers=headers, params=params)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        data = response.json()
-        
-        if data and "results" in data:
-            unified_images = []
-            for result in data["results"]:
-                unified_images.append({
-                    "url": result["urls"].get("regular"),  # Unsplash specific field
-                    "source": "Unsplash",
-                    "source_url": result.get("links", {}).get("html"),
-                    "alt_text": result.get("alt_description") or result.get("description"),
-                    "width": result.get("width"),
-                    "height": result.get("height"),
-                    "size": None, # Unsplash API does not provide file size directly
-                    "format": "jpg", # Unsplash images are typically jpg
-                    "tags": [tag["title"] for tag in result.get("tags", []) if "title" in tag],
-                })
-            return unified_images
-        return []
-    except requests.exceptions.RequestException as e:
-        print(f"Error searching Unsplash images: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred with Unsplash API: {e}")
-        return []
+    response = http_client.get(BASE_URL, headers=headers, params=params)
+    rate_limit.observe_response("Unsplash", response.status_code, response.headers)
+    # HTTP errors, timeouts and 429s raise, so the source engine retries or reroutes the page
+    response.raise_for_status()
+    data = response.json()
+
+    if data and "results" in data:
+        unified_images = []
+        for result in data["results"]:
+            unified_images.append({
+                "url": result["urls"].get("regular"),  # Unsplash specific field
+                "source": "Unsplash",
+                "source_url": result.get("links", {}).get("html"),
+                "alt_text": result.get("alt_description") or result.get("description"),
+                "width": result.get("width"),
+                "height": result.get("height"),
+                "size": None, # Unsplash API does not provide file size directly
+                "format": "jpg", # Unsplash images are typically jpg
+                "tags": [tag["title"] for tag in result.get("tags", []) if "title" in tag],
+            })
+        return unified_images
+    return []
+
+# 30 results per page; demo apps get 50 requests per hour
+sources.register(sources.SearchFunctionAdapter(
+    "Unsplash", search_unsplash_images, per_page_limit=30,
+    quota=(50, 3600), priority=30, configured=lambda: bool(UNSPLASH_ACCESS_KEY)))
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,87 @@
+import copy
+from typing import List, Dict, Any, Optional
+
+from api import db_writer
+from lib.shared import config
+
+TABLE = "crawl_job_checkpoints"
+
+
+class JobCheckpoint:
+    """
+    Page-by-page record of a crawl job, so a failed or interrupted job can resume.
+
+    Every page the job reads is committed to crawl_job_checkpoints as soon as it is accepted,
+    with the images it added to the job and the source engine's read positions for its query
+    (see source_engine.iter_source_pages). The images are committed even while their
+    image_metadata rows are still buffered, so nothing collected is lost when the job fails
+    afterwards. On retry, `load()` reads the checkpoints back: the stored images are restored
+    into the collector (their image_metadata upserts are idempotent) and every source resumes
+    after its last stored page, so pages fetched before the failure cost no provider quota again.
+    Backup crawl pages are stored too, but the crawl itself starts over (it spends no quota).
+    The checkpoints of a completed job are deleted, since they duplicate its image_metadata rows.
+    """
+
+    def __init__(self, supabase, job_id: str):
+        self.supabase = supabase
+        self.job_id = job_id
+        self.rows: List[Dict[str, Any]] = []
+        self._positions: Dict[str, Dict[str, Optional[int]]] = {}
+        # One upsert per page, written in the background while the job keeps going
+        self.writer = db_writer.BulkWriter(supabase, TABLE, chunk_size=1, on_conflict="job_id,seq")
+
+    @property
+    def images(self) -> List[Dict[str, Any]]:
+        """Images committed by earlier attempts, in the order they were accepted."""
+        return [img_data for row in self.rows for img_data in row.get("images") or []]
+
+    def load(self):
+        """Reads the checkpoints of earlier attempts (blocking)."""
+        if not config.CHECKPOINT_ENABLED:
+            return
+        response = (self.supabase.table(TABLE).select("*").eq("job_id", self.job_id)
+                    .order("seq").execute())
+        self.rows = response.data or []
+        for row in self.rows:
+            if row.get("positions") is not None:
+                self._positions[row["query"]] = dict(row["positions"])
+
+    def positions(self, query: str) -> Dict[str, Optional[int]]:
+        """Read positions for `query`; the source engine keeps this dict current as pages are read."""
+        return self._positions.setdefault(query, {})
+
+    def queries(self, phase: str) -> List[str]:
+        """Queries checkpointed in `phase`, in the order they were first used."""
+        seen = []
+        for row in self.rows:
+            if row.get("phase") == phase and row["query"] not in seen:
+                seen.append(row["query"])
+        return seen
+
+    async def record(self, phase: str, query: str, source: str, images: List[Dict[str, Any]],
+                     positions: Optional[Dict[str, Optional[int]]] = None):
+        """
+        Commits one page: the images it added and the read positions of its query as of that page
+        (None for backup crawl pages). Searches that read ahead pass a snapshot taken with the page.
+        """
+        if not config.CHECKPOINT_ENABLED:
+            return
+        row = {
+            "job_id": self.job_id,
+            "seq": len(self.rows),
+            "phase": phase,
+            "query": query,
+            "source": source,
+            "positions": dict(positions) if positions is not None else None,
+            "images": copy.deepcopy(images),
+        }
+        self.rows.append(row)
+        await self.writer.add(row)
+
+    async def flush(self):
+        await self.writer.flush()
+
+    def clear(self):
+        """Deletes the job's checkpoints once it completed and can no longer be retried (blocking)."""
+        if config.CHECKPOINT_ENABLED:
+            self.supabase.table(TABLE).delete().eq("job_id", self.job_id).execute()
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set
+
+from api import db_writer, dedup, image_store
+from lib.shared import config
+
+
+class ImageCollector:
+    """
+    Per-job storage path shared by every image producer (API sources, backup crawler).
+
+    Each page of candidate images is deduplicated, optionally downloaded and verified into the
+    local store, normalized to the image_metadata shape and queued on the bulk writer, stopping
+    once the job's `limit` is reached. Images are claimed in the dedup index on behalf of
+    `job_id`, so a retry of the job can take back the images its earlier attempts accepted.
+    """
+
+    def __init__(self, supabase, keyword: str, limit: int, errors: List[str], job_id: Optional[str] = None):
+        self.supabase = supabase
+        self.keyword = keyword
+        self.limit = limit
+        self.errors = errors
+        self.job_id = job_id
+        self.collected: List[Dict[str, Any]] = []
+        self.duplicates_skipped = 0
+        # Rows are upserted in chunks in the background while collection continues
+        self.writer = db_writer.ImageMetadataWriter(supabase)
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - len(self.collected))
+
+    @property
+    def full(self) -> bool:
+        return self.remaining == 0
+
+    async def accept_page(self, page: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Stores as many images from `page` as the limit allows and returns the accepted ones."""
+        remaining_limit = self.remaining
+        if not page or remaining_limit == 0:
+            return []
+
+        # Skip images already stored by earlier jobs (or seen earlier in this one)
+        skipped: List[Dict[str, Any]] = []
+        new_images = await dedup.filter_new_images(
+            page, self.supabase, max_count=remaining_limit,
+            fetch=image_store.fetch_and_store if config.DOWNLOAD_IMAGES_ON_CRAWL else None,
+            owner=self.job_id, skipped=skipped)
+        self.duplicates_skipped += len(skipped)
+        if config.DOWNLOAD_IMAGES_ON_CRAWL:
+            # Download, verify and store locally; fills in size/format/width/height
+            stored = await image_store.store_images(new_images, errors=self.errors)
+            # Images that could not be stored give their dedup claim back
+            kept = {id(img_data) for img_data in stored}
+            for img_data in new_images:
+                if id(img_data) not in kept:
+                    dedup.get_index().release(img_data)
+            new_images = stored
+
+        for img_data in new_images:
+            # Ensure all required fields are present and handle None
+            img_data['crawl_date'] = datetime.now().isoformat()
+            img_data['source_url'] = img_data.get('source_url', 'N/A')
+            img_data['alt_text'] = img_data.get('alt_text', '')
+            img_data['tags'] = img_data.get('tags', [])
+            img_data['keyword'] = self.keyword # Add the keyword to image metadata
+            self.collected.append(img_data)
+            await self.writer.add(img_data)
+        return new_images
+
+    async def restore(self, images: List[Dict[str, Any]]):
+        """
+        Takes back images a failed attempt of the job already accepted (see api/checkpoint.py).
+        They count towards the limit again and are re-upserted, since their rows may not have
+        been written before the failure; their keys are claimed so the job cannot accept them twice.
+        An image is only taken back when its row was stored for this keyword or the job can claim
+        it again; images another job claimed or stored in the meantime are skipped.
+        """
+        index = dedup.get_index()
+        await index.ensure_warm(self.supabase)
+        stored = await asyncio.to_thread(self._stored_urls, [img_data.get("url") for img_data in images])
+        for img_data in images:
+            if self.full:
+                break
+            if img_data.get("url") not in stored and not (
+                    index.reclaim(img_data, self.job_id) if self.job_id else index.claim(img_data)):
+                self.duplicates_skipped += 1
+                continue
+            self.collected.append(img_data)
+            await self.writer.add(img_data)
+
+    def _stored_urls(self, urls: List[str], chunk_size: int = 200) -> Set[str]:
+        """URLs among `urls` that already have an image_metadata row for this keyword (blocking)."""
+        stored: Set[str] = set()
+        urls = [url for url in urls if url]
+        for start in range(0, len(urls), chunk_size):
+            response = (self.supabase.table("image_metadata").select("url")
+                        .in_("url", urls[start:start + chunk_size]).eq("keyword", self.keyword).execute())
+            stored.update(row["url"] for row in response.data or [])
+        return stored
+
+    def disown(self):
+        """Releases the job's ownership of its dedup claims once it completed and cannot be retried."""
+        dedup.get_index().disown(self.collected)
+
+    async def flush(self):
+        """Waits for the remaining buffered rows to reach Supabase."""
+        await self.writer.flush()
+        self.errors.extend(self.writer.errors)
@@ -0,0 +1,298 @@
+"""
+Sharded dataset export in WebDataset layout.
+
+    python -m api.dataset_export --out ./data/exports/pattern --keyword pattern
+
+Writes <out>/images-000000.tar, images-000001.tar, ... Each shard holds up to DATASET_SHARD_BYTES
+or DATASET_SHARD_SAMPLES samples, and each sample is two tar members sharing a key:
+<key>.<ext> (the image bytes) and <key>.json (its image_metadata row). Shards are written
+under a .tmp name and renamed when full, so a loader never reads a partial shard.
+
+A manifest of every exported row (with the shard and key of its sample) is written alongside,
+flushed in row groups while the export runs: manifest.parquet (pyarrow, see requirements.txt),
+or manifest.jsonl with --jsonl. index.json lists the shards with their sample counts once the export
+is done. GET /api/images/download?layout=webdataset streams a single shard in the same layout.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import tarfile
+import time
+from contextlib import aclosing
+from typing import List, Dict, Any, AsyncIterator, Optional
+
+from api import http_client, image_search, metrics, zip_stream
+from lib.shared import config
+
+SHARD_PREFIX = "images"
+# Manifest columns after the image_metadata listing columns
+MANIFEST_EXTRA_COLUMNS = ["shard", "key", "bytes"]
+
+
+def sample_key(row: Dict[str, Any]) -> str:
+    """WebDataset key of a row: zero-padded numeric ids sort in id order; keys may not contain dots."""
+    image_id = str(row["id"])
+    if image_id.isdigit():
+        return image_id.zfill(12)
+    return re.sub(r"[^A-Za-z0-9_-]", "_", image_id)
+
+
+def image_extension(row: Dict[str, Any]) -> str:
+    extension = (row.get("format") or "jpg").lower()
+    return "jpg" if extension == "jpeg" else extension
+
+
+def sample_metadata(row: Dict[str, Any]) -> bytes:
+    return json.dumps({column: row.get(column) for column in image_search.LISTING_COLUMNS},
+                      ensure_ascii=False, default=str).encode()
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes, mtime: float):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = mtime
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+
+class TarShardWriter:
+    """
+    Writes WebDataset samples into numbered tar shards, starting a new shard once the current
+    one reaches `max_bytes` or `max_samples`.
+    """
+
+    def __init__(self, out_dir: str, prefix: str = SHARD_PREFIX, max_bytes: Optional[int] = None,
+                 max_samples: Optional[int] = None):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.max_bytes = max_bytes or config.DATASET_SHARD_BYTES
+        self.max_samples = max_samples or config.DATASET_SHARD_SAMPLES
+        self.shards: List[Dict[str, Any]] = []
+        self._tar: Optional[tarfile.TarFile] = None
+        self._current: Optional[Dict[str, Any]] = None
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _open_shard(self):
+        name = f"{self.prefix}-{len(self.shards):06d}.tar"
+        self._current = {"name": name, "samples": 0, "bytes": 0}
+        self._tar = tarfile.open(os.path.join(self.out_dir, name + ".tmp"), "w", format=tarfile.USTAR_FORMAT)
+
+    def _close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        name = self._current["name"]
+        path = os.path.join(self.out_dir, name)
+        os.replace(path + ".tmp", path)
+        self._current["bytes"] = os.path.getsize(path)
+        self.shards.append(self._current)
+        self._tar = None
+        self._current = None
+
+    def add(self, key: str, files: Dict[str, bytes]) -> str:
+        """Writes one sample (extension -> bytes) and returns the name of the shard it went into."""
+        size = sum(len(data) for data in files.values())
+        if self._current is not None and self._current["samples"] and (
+                self._current["samples"] >= self.max_samples or self._current["bytes"] + size > self.max_bytes):
+            self._close_shard()
+        if self._tar is None:
+            self._open_shard()
+        mtime = time.time()
+        for extension, data in files.items():
+            _add_member(self._tar, f"{key}.{extension}", data, mtime)
+        self._current["samples"] += 1
+        # Each member costs a 512-byte header plus padding to a 512-byte block
+        self._current["bytes"] += sum(512 + -(-len(data) // 512) * 512 for data in files.values())
+        return self._current["name"]
+
+    def close(self):
+        self._close_shard()
+
+
+class ManifestWriter:
+    """
+    Streams manifest rows to Parquet (pyarrow) or JSON Lines, one row group every `row_group` rows,
+    so the manifest of an export of any size is written with bounded memory.
+    """
+
+    def __init__(self, out_dir: str, row_group: Optional[int] = None, use_parquet: bool = True):
+        self.row_group = row_group or config.DATASET_MANIFEST_ROW_GROUP
+        self.columns = image_search.LISTING_COLUMNS + MANIFEST_EXTRA_COLUMNS
+        self._rows: List[Dict[str, Any]] = []
+        self._writer = None
+        self._file = None
+        if use_parquet:
+            try:
+                import pyarrow # noqa: F401
+            except ImportError:
+                # Fail before any shard is written rather than silently switching formats
+                raise RuntimeError("Writing manifest.parquet needs pyarrow (pip install -r requirements.txt); "
+                                   "use JSON Lines (--jsonl) instead.")
+        self.format = "parquet" if use_parquet else "jsonl"
+        self.path = os.path.join(out_dir, f"manifest.{self.format}")
+        self.rows_written = 0
+
+    def _schema(self):
+        import pyarrow as pa
+
+        types = {"tags": pa.list_(pa.string()), "width": pa.int64(), "height": pa.int64(),
+                 "size": pa.int64(), "bytes": pa.int64()}
+        return pa.schema([(column, types.get(column, pa.string())) for column in self.columns])
+
+    def _normalize(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        normalized = {}
+        for column in self.columns:
+            value = row.get(column)
+            if value is not None and column not in ("tags", "width", "height", "size", "bytes"):
+                value = str(value)
+            normalized[column] = value
+        return normalized
+
+    def add(self, row: Dict[str, Any]):
+        self._rows.append(self._normalize(row))
+        if len(self._rows) >= self.row_group:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path + ".tmp", self._schema())
+            self._writer.write_table(pa.Table.from_pylist(self._rows, schema=self._writer.schema))
+        else:
+            if self._file is None:
+                self._file = open(self.path + ".tmp", "w", encoding="utf-8")
+            for row in self._rows:
+                self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._file.flush()
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+        elif self._file is not None:
+            self._file.close()
+        elif self.format == "parquet":
+            # Empty export: still leave a readable manifest with the schema
+            import pyarrow.parquet as pq
+
+            pq.ParquetWriter(self.path + ".tmp", self._schema()).close()
+        else:
+            open(self.path + ".tmp", "w").close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+async def export_dataset(rows: AsyncIterator[Dict[str, Any]], out_dir: str, prefix: str = SHARD_PREFIX,
+                         max_bytes: Optional[int] = None, max_samples: Optional[int] = None,
+                         concurrency: Optional[int] = None, use_parquet: bool = True) -> Dict[str, Any]:
+    """
+    Exports the images described by `rows` as WebDataset shards plus a manifest in `out_dir`.
+    Images are fetched concurrently (local store first); samples are written in completion order.
+    Failed downloads are logged and left out of both the shards and the manifest.
+    """
+    started = time.perf_counter()
+    shards = TarShardWriter(out_dir, prefix, max_bytes, max_samples)
+    manifest = ManifestWriter(out_dir, use_parquet=use_parquet)
+    failed = 0
+
+    try:
+        async with aclosing(zip_stream.iter_fetched(rows, concurrency=concurrency)) as fetched:
+            async for row, content, error in fetched:
+                if error is not None:
+                    failed += 1
+                    metrics.DATASET_SAMPLES.inc(outcome="failed")
+                    print(f"Error downloading image {row.get('id')} for dataset export: {error}")
+                    continue
+                key = sample_key(row)
+                files = {image_extension(row): content, "json": sample_metadata(row)}
+                shard = await asyncio.to_thread(shards.add, key, files)
+                await asyncio.to_thread(manifest.add, dict(row, shard=shard, key=key, bytes=len(content)))
+                metrics.DATASET_SAMPLES.inc(outcome="written")
+    finally:
+        await asyncio.to_thread(shards.close)
+        await asyncio.to_thread(manifest.close)
+
+    summary = {
+        "shards": shards.shards,
+        "samples": sum(shard["samples"] for shard in shards.shards),
+        "failed": failed,
+        "manifest": os.path.basename(manifest.path),
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    }
+    if shards.shards:
+        last = len(shards.shards) - 1
+        # Brace pattern accepted by WebDataset loaders, e.g. images-{000000..000012}.tar
+        summary["pattern"] = f"{prefix}-{{{0:06d}..{last:06d}}}.tar"
+    with open(os.path.join(out_dir, "index.json"), "w") as index_file:
+        json.dump(summary, index_file, indent=2)
+    return summary
+
+
+async def stream_webdataset(rows: AsyncIterator[Dict[str, Any]],
+                            concurrency: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Streams one WebDataset tar (image + JSON per sample) for download, like stream_zip."""
+    sink = zip_stream.StreamSink()
+    tar = tarfile.open(fileobj=sink, mode="w|", format=tarfile.USTAR_FORMAT)
+    try:
+        async with aclosing(zip_stream.iter_fetched(rows, concurrency=concurrency)) as fetched:
+            async for row, content, error in fetched:
+                if error is not None:
+                    metrics.DATASET_SAMPLES.inc(outcome="failed")
+                    print(f"Error downloading image {row.get('id')} for dataset export: {error}")
+                    continue
+                key = sample_key(row)
+                mtime = time.time()
+                _add_member(tar, f"{key}.{image_extension(row)}", content, mtime)
+                _add_member(tar, f"{key}.json", sample_metadata(row), mtime)
+                metrics.DATASET_SAMPLES.inc(outcome="written")
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+    finally:
+        tar.close()
+    # End-of-archive blocks
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+if __name__ == "__main__":
+    from api.model_runner import _create_supabase
+
+    parser = argparse.ArgumentParser(description="Export images as WebDataset tar shards with a manifest.")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--keyword", help="Only images matching this keyword/tag")
+    parser.add_argument("--source")
+    parser.add_argument("--format")
+    parser.add_argument("--min-width", type=int)
+    parser.add_argument("--min-height", type=int)
+    parser.add_argument("--prefix", default=SHARD_PREFIX, help="Shard file name prefix")
+    parser.add_argument("--shard-bytes", type=int, default=config.DATASET_SHARD_BYTES)
+    parser.add_argument("--shard-samples", type=int, default=config.DATASET_SHARD_SAMPLES)
+    parser.add_argument("--concurrency", type=int, default=config.ZIP_DOWNLOAD_CONCURRENCY)
+    parser.add_argument("--jsonl", action="store_true", help="Write manifest.jsonl instead of manifest.parquet")
+    args = parser.parse_args()
+
+    search = image_search.ImageSearch(args.keyword, source=args.source, format=args.format,
+                                      min_width=args.min_width, min_height=args.min_height)
+
+    async def main():
+        try:
+            rows = image_search.iter_rows(_create_supabase(), search)
+            summary = await export_dataset(rows, args.out, args.prefix, args.shard_bytes, args.shard_samples,
+                                           args.concurrency, use_parquet=not args.jsonl)
+            print(f"Exported {summary['samples']} samples in {len(summary['shards'])} shards "
+                  f"({summary['failed']} failed) to {args.out}")
+        finally:
+            await http_client.close_async_session()
+
+    asyncio.run(main())
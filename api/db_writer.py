@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Set
+
+from api import dedup, metrics
+from lib.shared import config
+
+
+class BulkWriter:
+    """
+    Buffers rows for one Supabase table and writes them in chunks.
+
+    Chunks are upserted in a worker thread while the caller keeps producing rows; at most
+    `max_in_flight` chunk writes run at once and `add()` waits when that limit is reached.
+    A chunk that fails is split in half and retried, so one bad row only costs its own write
+    and is reported in `errors` instead of sinking the whole chunk.
+    """
+
+    def __init__(self, supabase, table: str, chunk_size: Optional[int] = None,
+                 on_conflict: Optional[str] = None, ignore_duplicates: bool = False,
+                 exclude_fields: Iterable[str] = (), max_in_flight: Optional[int] = None):
+        self.supabase = supabase
+        self.table = table
+        self.chunk_size = chunk_size or config.DB_WRITE_CHUNK_SIZE
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        self.exclude_fields = set(exclude_fields)
+        self.written = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self._stats_lock = threading.Lock() # Chunk writes finish on worker threads
+        self._buffer: List[Dict[str, Any]] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(max_in_flight or config.DB_WRITE_MAX_IN_FLIGHT)
+
+    async def add(self, row: Dict[str, Any]):
+        """Queues one row; a full buffer is handed to a background chunk write."""
+        self._buffer.append({k: v for k, v in row.items() if k not in self.exclude_fields})
+        if len(self._buffer) >= self.chunk_size:
+            await self._start_flush()
+
+    async def _start_flush(self):
+        if not self._buffer:
+            return
+        chunk, self._buffer = self._buffer, []
+        await self._slots.acquire() # Backpressure: wait for a free write slot
+        task = asyncio.create_task(self._write_chunk(chunk))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write_chunk(self, chunk: List[Dict[str, Any]]):
+        try:
+            with metrics.DB_WRITES_IN_FLIGHT.track_inflight(table=self.table):
+                await asyncio.to_thread(self._write_with_split, chunk)
+        finally:
+            self._slots.release()
+
+    def _execute(self, rows: List[Dict[str, Any]]):
+        # PostgREST bulk writes need every object to carry the same keys
+        keys = set().union(*(row.keys() for row in rows))
+        rows = [{key: row.get(key) for key in keys} for row in rows]
+        table = self.supabase.table(self.table)
+        if self.on_conflict:
+            # Postgres rejects an upsert that touches the same conflict key twice in one statement
+            conflict_keys = [key.strip() for key in self.on_conflict.split(",")]
+            rows = list({tuple(row.get(key) for key in conflict_keys): row for row in rows}.values())
+            query = table.upsert(rows, on_conflict=self.on_conflict, ignore_duplicates=self.ignore_duplicates)
+        else:
+            query = table.insert(rows)
+        return query.execute()
+
+    def _write_with_split(self, rows: List[Dict[str, Any]]):
+        try:
+            with metrics.span("db.write", metrics.DB_WRITE_SECONDS, table=self.table):
+                self._execute(rows)
+            metrics.DB_WRITE_ROWS.inc(len(rows), table=self.table, outcome="written")
+            with self._stats_lock:
+                self.written += len(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                metrics.DB_WRITE_ROWS.inc(table=self.table, outcome="failed")
+                message = f"Supabase write error for {self.table} row {rows[0].get('url', '')}: {e}"
+                with self._stats_lock:
+                    self.failed += 1
+                    self.errors.append(message)
+                print(message)
+                self._row_failed(rows[0])
+                return
+            # Isolate the failing rows by bisecting the chunk
+            middle = len(rows) // 2
+            self._write_with_split(rows[:middle])
+            self._write_with_split(rows[middle:])
+
+    def _row_failed(self, row: Dict[str, Any]):
+        """Called (on a worker thread) for each row that could not be written."""
+
+    async def flush(self):
+        """Writes any buffered rows and waits for all in-flight chunk writes."""
+        await self._start_flush()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+
+class ImageMetadataWriter(BulkWriter):
+    """
+    BulkWriter for image_metadata, inserting on the image URL and skipping URLs already stored.
+    Another worker process may have stored the same image since this process's dedup index was
+    loaded; its row (keyword, crawl_date) is kept rather than overwritten by the later job.
+    """
+
+    def __init__(self, supabase, **kwargs):
+        kwargs.setdefault("on_conflict", "url")
+        kwargs.setdefault("ignore_duplicates", True)
+        super().__init__(supabase, "image_metadata", **kwargs)
+
+    def _row_failed(self, row: Dict[str, Any]):
+        # The image was claimed in the dedup index but never stored: let later jobs take it
+        dedup.get_index().release(row)
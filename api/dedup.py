@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import io
+import re
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from lib.shared import config
+
+# Query parameters that identify the request rather than the image (tracking, per-request ids)
+IGNORED_QUERY_PARAMS = {"ixid", "ixlib", "fbclid", "gclid", "ref", "ref_id"}
+IGNORED_QUERY_PREFIXES = ("utm_",)
+# Single-photo page paths per site: such a source_url identifies the image even when the CDN URL
+# changes between API calls (e.g. Pixabay's rotating webformatURL). Search and listing pages on the
+# same hosts hold many images, so they must not match.
+PHOTO_PAGE_PATHS = {
+    "pixabay.com": re.compile(r"^/(?:[a-z]{2}/)?(?:photos|illustrations|vectors)/[^/]+-\d+/?$"),
+    "pexels.com": re.compile(r"^/(?:[a-z]{2}-[a-z]{2}/)?photo/[^/]+/?$"),
+    "www.pexels.com": re.compile(r"^/(?:[a-z]{2}-[a-z]{2}/)?photo/[^/]+/?$"),
+    "unsplash.com": re.compile(r"^/photos/[^/]+/?$"),
+}
+# Sources whose source_url is the page an image was found on rather than the image's own page
+# (a crawled photo page also shows related photos, avatars and banners)
+PAGE_KEY_EXCLUDED_SOURCES = {"Web Crawl"}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for exact-duplicate checks: lowercase scheme and host,
+    no default port, no fragment, tracking parameters removed and the rest sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in IGNORED_QUERY_PARAMS and not key.lower().startswith(IGNORED_QUERY_PREFIXES)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def _url_key(normalized: str) -> int:
+    # 64-bit digests keep the in-memory index compact (collision odds are negligible at our scale)
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def is_photo_page(source_url: Optional[str]) -> bool:
+    """Whether a URL is the page of exactly one photo on a site listed in PHOTO_PAGE_PATHS."""
+    if not source_url or source_url == "N/A":
+        return False
+    parts = urlsplit(source_url)
+    pattern = PHOTO_PAGE_PATHS.get((parts.hostname or "").lower())
+    return pattern is not None and pattern.match(parts.path) is not None
+
+
+def dedup_keys(img_data: Dict[str, Any]) -> List[int]:
+    """Exact-duplicate keys for an image: its URL plus its photo page when source_url is one."""
+    keys = []
+    if img_data.get("url"):
+        keys.append(_url_key(normalize_url(img_data["url"])))
+    source_url = img_data.get("source_url")
+    if img_data.get("source") not in PAGE_KEY_EXCLUDED_SOURCES and is_photo_page(source_url):
+        keys.append(_url_key(normalize_url(source_url)))
+    return keys
+
+
+def dhash(content: bytes, hash_size: int = 8) -> int:
+    """64-bit difference hash (dHash) of an image, computed with Pillow."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(content)) as image:
+        image = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def to_signed64(value: int) -> int:
+    """Maps an unsigned 64-bit hash onto Postgres' signed bigint range."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class HammingIndex:
+    """
+    Near-duplicate lookup for 64-bit perceptual hashes.
+    The hash is split into `max_distance + 1` bands; two hashes within `max_distance` bits
+    must agree exactly on at least one band (pigeonhole), so only that band's bucket is scanned.
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = 64 // bands
+        self._bands: List[Tuple[int, int]] = [
+            (i * width, 64 - i * width if i == bands - 1 else width) for i in range(bands)
+        ]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+
+    def _band_values(self, value: int):
+        for shift, width in self._bands:
+            yield (value >> shift) & ((1 << width) - 1)
+
+    def find(self, value: int) -> Optional[int]:
+        for bucket, band in zip(self._buckets, self._band_values(value)):
+            for candidate in bucket.get(band, ()):
+                if (candidate ^ value).bit_count() <= self.max_distance:
+                    return candidate
+        return None
+
+    def add(self, value: int):
+        for bucket, band in zip(self._buckets, self._band_values(value)):
+            bucket.setdefault(band, []).append(value)
+
+    def remove(self, value: int):
+        for bucket, band in zip(self._buckets, self._band_values(value)):
+            candidates = bucket.get(band)
+            if candidates and value in candidates:
+                candidates.remove(value)
+
+
+class DedupIndex:
+    """
+    Process-wide index of images already stored in image_metadata.
+
+    Exact duplicates are caught by normalized URL (and photo page) keys held in a set of 64-bit
+    digests; near duplicates across sources are caught by an optional dHash stage. The index is
+    warm-started once from the database and then kept current as jobs accept new images.
+    """
+
+    def __init__(self, max_distance: Optional[int] = None):
+        self._keys: Set[int] = set()
+        self._owners: Dict[int, str] = {} # key -> job that claimed it in this process
+        self._hashes = HammingIndex(config.DEDUP_PHASH_MAX_DISTANCE if max_distance is None else max_distance)
+        self._lock = threading.Lock()
+        self._warm = False
+        self._warm_lock: Optional[asyncio.Lock] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _load_rows(self, rows: List[Dict[str, Any]]):
+        with self._lock:
+            for row in rows:
+                self._keys.update(dedup_keys(row))
+                if row.get("phash") is not None:
+                    self._hashes.add(from_signed64(int(row["phash"])))
+
+    def warm_start(self, supabase, page_size: int = 1000):
+        """
+        Loads URL keys (and stored perceptual hashes) of every existing image_metadata row.
+        Pages are read by keyset on id, so each one is an index range scan however large the table is.
+        """
+        # source and source_url feed the photo-page key of single-photo pages (see dedup_keys)
+        columns = "id, url, source, source_url, phash" if config.DEDUP_PERCEPTUAL else "id, url, source, source_url"
+        last_id = None
+        while True:
+            query = supabase.table("image_metadata").select(columns)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.order("id").limit(page_size).execute().data or []
+            self._load_rows(rows)
+            if len(rows) < page_size:
+                break
+            last_id = rows[-1]["id"]
+        print(f"Dedup index warm-started with {len(self._keys)} keys.")
+
+    async def ensure_warm(self, supabase):
+        """Warm-starts the index on first use; later calls return immediately."""
+        if self._warm:
+            return
+        if self._warm_lock is None:
+            self._warm_lock = asyncio.Lock()
+        async with self._warm_lock:
+            if not self._warm:
+                try:
+                    await asyncio.to_thread(self.warm_start, supabase)
+                except Exception as e:
+                    # Still dedup within this process; the unique URL index backs us up in the database
+                    print(f"Dedup index warm start failed: {e}")
+                self._warm = True
+
+    def claim(self, img_data: Dict[str, Any], owner: Optional[str] = None) -> bool:
+        """
+        Registers an image if none of its keys are known yet, on behalf of job `owner`.
+        Returns False for exact duplicates (including duplicates within the same job).
+        """
+        keys = dedup_keys(img_data)
+        with self._lock:
+            if any(key in self._keys for key in keys):
+                return False
+            self._keys.update(keys)
+            if owner is not None:
+                self._owners.update((key, owner) for key in keys)
+            return True
+
+    def reclaim(self, img_data: Dict[str, Any], owner: str) -> bool:
+        """
+        Like `claim()`, but also succeeds when every known key was claimed by `owner`, so a retried
+        job can take back what its earlier attempt claimed in this process.
+        """
+        keys = dedup_keys(img_data)
+        with self._lock:
+            if any(key in self._keys and self._owners.get(key) != owner for key in keys):
+                return False
+            self._keys.update(keys)
+            self._owners.update((key, owner) for key in keys)
+            return True
+
+    def release(self, img_data: Dict[str, Any]):
+        """
+        Forgets an image claimed by `claim()` (and its dHash) that was not stored after all,
+        e.g. because its download failed or its row could not be written, so later jobs may take it.
+        """
+        with self._lock:
+            for key in dedup_keys(img_data):
+                self._keys.discard(key)
+                self._owners.pop(key, None)
+            if img_data.get("phash") is not None:
+                self._hashes.remove(from_signed64(int(img_data["phash"])))
+
+    def disown(self, images: List[Dict[str, Any]]):
+        """Drops the job ownership of claimed images (their keys stay known) once the job can no longer be retried."""
+        with self._lock:
+            for img_data in images:
+                for key in dedup_keys(img_data):
+                    self._owners.pop(key, None)
+
+    def claim_perceptual(self, img_data: Dict[str, Any], content: bytes) -> bool:
+        """
+        Registers an image's dHash (stored on img_data['phash']) unless a near-duplicate is known.
+        Images that cannot be decoded are accepted without a hash.
+        """
+        try:
+            value = dhash(content)
+        except Exception as e:
+            print(f"Could not compute perceptual hash for {img_data.get('url')}: {e}")
+            return True
+        with self._lock:
+            if self._hashes.find(value) is not None:
+                return False
+            self._hashes.add(value)
+        img_data["phash"] = to_signed64(value)
+        return True
+
+
+_index: Optional[DedupIndex] = None
+
+
+def get_index() -> DedupIndex:
+    global _index
+    if _index is None:
+        _index = DedupIndex()
+    return _index
+
+
+async def filter_new_images(images: List[Dict[str, Any]], supabase=None, max_count: Optional[int] = None,
+                            fetch=None, concurrency: Optional[int] = None, owner: Optional[str] = None,
+                            skipped: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Drops images already in the index (or repeated within `images`) and claims the rest for job
+    `owner`, up to `max_count` images so that results the caller cannot use stay unclaimed.
+    With DEDUP_PERCEPTUAL enabled, survivors are downloaded concurrently through `fetch`
+    and near-duplicates by dHash are dropped too. Dropped duplicates are appended to `skipped`.
+    """
+    skipped = [] if skipped is None else skipped
+    index = get_index()
+    if supabase is not None:
+        await index.ensure_warm(supabase)
+
+    fresh = []
+    for img_data in images:
+        if max_count is not None and len(fresh) >= max_count:
+            break
+        if index.claim(img_data, owner):
+            fresh.append(img_data)
+        else:
+            skipped.append(img_data)
+    if not config.DEDUP_PERCEPTUAL or not fresh:
+        return fresh
+
+    if fetch is None:
+        from api.zip_stream import fetch_image_bytes
+        fetch = fetch_image_bytes
+    slots = asyncio.Semaphore(concurrency or config.ZIP_DOWNLOAD_CONCURRENCY)
+
+    async def check(img_data: Dict[str, Any]) -> bool:
+        async with slots:
+            try:
+                content = await fetch(img_data)
+            except Exception as e:
+                print(f"Could not download {img_data.get('url')} for perceptual dedup: {e}")
+                return True
+        return await asyncio.to_thread(index.claim_perceptual, img_data, content)
+
+    keep = await asyncio.gather(*(check(img) for img in fresh))
+    skipped.extend(img for img, ok in zip(fresh, keep) if not ok)
+    return [img for img, ok in zip(fresh, keep) if ok]
@@ -0,0 +1,468 @@
+"""
+Derivative store: thumbnails and model-input pixels, built once and read without decoding.
+
+    python -m api.derivatives --spec thumb --spec model:qr_detector --keyword pattern
+
+Derivatives are appended to packed shard files (<root>/<spec>/00000.pack, ...) and indexed by
+(spec, image_id) in <root>/index.sqlite3. Readers memory-map the shards, so a gallery page or a
+model test run gets thousands of images as slices of already-mapped files instead of fetching
+and decoding the original JPEGs. Records are never rewritten in place; rebuilding an image
+appends a new record and repoints the index.
+"""
+import argparse
+import asyncio
+import io
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from api import http_client, image_search, model_plugins, zip_stream
+from lib.shared import config
+
+IMAGE_COLUMNS = ["id", "url", "content_hash", "format", "has_thumbnail"]
+# Ids per SQLite IN (...) lookup
+LOOKUP_CHUNK = 500
+
+
+class DerivativeSpec:
+    """
+    One kind of derivative: images are converted to `mode` and stored either as JPEG ("jpeg",
+    for galleries; shrunk to fit `size`, aspect ratio kept) or as raw row-major pixel bytes
+    ("raw", model inputs; letterboxed to exactly `size` on a `fill` background, so every record
+    has the same length and a batch of them can be stacked into one array).
+    """
+
+    def __init__(self, name: str, mode: str, size: Tuple[int, int], encoding: str = "raw", quality: int = 85,
+                 fill: int = 0):
+        if encoding not in ("raw", "jpeg"):
+            raise ValueError("encoding must be 'raw' or 'jpeg'")
+        self.name = name
+        self.mode = mode
+        self.size = tuple(size)
+        self.encoding = encoding
+        self.quality = quality
+        self.fill = fill
+
+    def derive(self, image, original_size: Tuple[int, int]):
+        if self.encoding == "raw":
+            return letterbox_image(image, self.mode, self.size, original_size, self.fill)
+        return shrink_image(image, self.mode, self.size)
+
+    def encode(self, image) -> bytes:
+        if self.encoding == "raw":
+            return image.tobytes()
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=self.quality, optimize=True)
+        return buffer.getvalue()
+
+
+THUMBNAIL = DerivativeSpec("thumb", "RGB", (config.THUMBNAIL_SIZE, config.THUMBNAIL_SIZE), "jpeg",
+                           config.THUMBNAIL_QUALITY)
+
+
+def model_input_spec(plugin: model_plugins.ModelPlugin) -> DerivativeSpec:
+    """Raw pixels as the plugin wants them; plugins with the same input share one derivative."""
+    width, height = plugin.input_size
+    return DerivativeSpec(f"{plugin.input_mode.lower()}-{width}x{height}-pad{plugin.input_fill}",
+                          plugin.input_mode, (width, height), fill=plugin.input_fill)
+
+
+def get_spec(name: str) -> DerivativeSpec:
+    """Resolves "thumb" or "model:<model_id>" to a spec."""
+    if name == THUMBNAIL.name:
+        return THUMBNAIL
+    if name.startswith("model:"):
+        return model_input_spec(model_plugins.get_plugin(name[len("model:"):]))
+    raise KeyError(f"Unknown derivative spec {name!r}; use 'thumb' or 'model:<model_id>'")
+
+
+def shrink_image(image, mode: str, size: Tuple[int, int]):
+    """Converts a decoded Pillow image to `mode` and shrinks it (keeping the aspect ratio) to fit `size`."""
+    image.draft(mode, size) # Lets JPEG decoding skip straight to a smaller scale
+    converted = image.convert(mode)
+    converted.thumbnail(size)
+    return converted
+
+
+def letterbox_image(image, mode: str, size: Tuple[int, int], original_size: Optional[Tuple[int, int]] = None,
+                    fill: int = 0):
+    """
+    Converts a decoded Pillow image to `mode` and letterboxes it to exactly `size`: shrunk to fit
+    (aspect ratio kept, never enlarged) and centred on a `fill` background. The image lands in
+    `model_plugins.content_box(original_size, size)`; pass the size before any JPEG draft so
+    stored derivatives and freshly decoded images agree on it.
+    """
+    from PIL import Image
+
+    left, top, width, height = model_plugins.content_box(original_size or image.size, size)
+    image.draft(mode, size) # Lets JPEG decoding skip straight to a smaller scale
+    converted = image.convert(mode)
+    if converted.size != (width, height):
+        converted = converted.resize((width, height), Image.BICUBIC, reducing_gap=2.0)
+    if converted.size == tuple(size):
+        return converted
+    canvas = Image.new(mode, size, (fill,) * len(mode) if len(mode) > 1 else fill)
+    canvas.paste(converted, (left, top))
+    return canvas
+
+
+def render(content: bytes, specs: List[DerivativeSpec]) -> Dict[str, Tuple[bytes, Tuple[int, int], Tuple[int, int]]]:
+    """Decodes image bytes once and returns {spec name: (data, size, original size)}."""
+    from PIL import Image
+
+    rendered = {}
+    with Image.open(io.BytesIO(content)) as image:
+        original_size = image.size
+        # Decode once at the smallest JPEG scale that still covers the largest spec
+        largest = max(specs, key=lambda spec: spec.size[0] * spec.size[1])
+        modes = {spec.mode for spec in specs}
+        image.draft(modes.pop() if len(modes) == 1 else "RGB", largest.size)
+        image.load()
+        for spec in specs:
+            derived = spec.derive(image, original_size)
+            rendered[spec.name] = (spec.encode(derived), derived.size, original_size)
+    return rendered
+
+
+def render_batch(batch: List[Tuple[str, bytes]], specs: List[DerivativeSpec]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Pool entry point: renders every spec for each image, or returns {'error': ...} for that image."""
+    results = []
+    for image_id, content in batch:
+        try:
+            results.append((image_id, render(content, specs)))
+        except Exception as e:
+            results.append((image_id, {"error": f"Could not decode image: {e}"}))
+    return results
+
+
+class Derivative:
+    """One stored derivative. `data` is a memoryview into the mapped shard (valid while the store is open)."""
+
+    def __init__(self, image_id: str, size: Tuple[int, int], original_size: Tuple[int, int], data: memoryview):
+        self.image_id = image_id
+        self.size = size
+        self.original_size = original_size
+        self.data = data
+
+    def to_prepared(self, mode: str) -> model_plugins.PreparedImage:
+        # Model-input derivatives are letterboxed, so the image's place follows from the two sizes
+        return model_plugins.PreparedImage(self.image_id, mode, self.size, bytes(self.data), self.original_size,
+                                           model_plugins.content_box(self.original_size, self.size))
+
+
+class DerivativeStore:
+    """
+    Packed, memory-mapped derivative storage.
+
+    Writers append records to the current shard of a spec (a new shard is started past
+    DERIVATIVE_SHARD_BYTES) and index them in the same SQLite transaction; BEGIN IMMEDIATE makes
+    concurrent builders take turns. Readers look records up by image id and slice them out of
+    shards mapped read-only, remapping a shard when it has grown since it was mapped.
+    """
+
+    def __init__(self, root: Optional[str] = None, shard_bytes: Optional[int] = None):
+        self.root = root or config.DERIVATIVE_STORE_PATH
+        self.shard_bytes = shard_bytes or config.DERIVATIVE_SHARD_BYTES
+        os.makedirs(self.root, exist_ok=True)
+        self.index_path = os.path.join(self.root, "index.sqlite3")
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._maps_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS derivatives (
+                    spec TEXT NOT NULL,
+                    image_id TEXT NOT NULL,
+                    shard INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    original_width INTEGER,
+                    original_height INTEGER,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (spec, image_id)
+                ) WITHOUT ROWID""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def shard_path(self, spec: str, shard: int) -> str:
+        return os.path.join(self.root, spec, f"{shard:05d}.pack")
+
+    def put_many(self, spec: str, records: List[Tuple[str, bytes, Tuple[int, int], Tuple[int, int]]]):
+        """Appends (image_id, data, size, original size) records for `spec` and indexes them."""
+        if not records:
+            return
+        os.makedirs(os.path.join(self.root, spec), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT MAX(shard) AS shard FROM derivatives WHERE spec = ?", (spec,)).fetchone()
+                shard = row["shard"] or 0
+                path = self.shard_path(spec, shard)
+                offset = os.path.getsize(path) if os.path.exists(path) else 0
+                pack = open(path, "ab")
+                try:
+                    index_rows = []
+                    for image_id, data, size, original_size in records:
+                        if offset and offset + len(data) > self.shard_bytes:
+                            pack.close()
+                            shard += 1
+                            offset = 0
+                            pack = open(self.shard_path(spec, shard), "ab")
+                        pack.write(data)
+                        index_rows.append((spec, str(image_id), shard, offset, len(data), size[0], size[1],
+                                           original_size[0], original_size[1], time.time()))
+                        offset += len(data)
+                    pack.flush()
+                finally:
+                    pack.close()
+                conn.executemany("INSERT OR REPLACE INTO derivatives VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 index_rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def existing(self, spec: str, image_ids: List[str]) -> Set[str]:
+        """The subset of `image_ids` that already have a `spec` derivative."""
+        found: Set[str] = set()
+        with self._connect() as conn:
+            for start in range(0, len(image_ids), LOOKUP_CHUNK):
+                chunk = [str(image_id) for image_id in image_ids[start:start + LOOKUP_CHUNK]]
+                placeholders = ", ".join("?" * len(chunk))
+                found.update(row["image_id"] for row in conn.execute(
+                    f"SELECT image_id FROM derivatives WHERE spec = ? AND image_id IN ({placeholders})",
+                    [spec] + chunk))
+        return found
+
+    def get_many(self, spec: str, image_ids: List[str]) -> Dict[str, Derivative]:
+        """Looks up `spec` derivatives for `image_ids`; ids without one are left out."""
+        rows = []
+        with self._connect() as conn:
+            for start in range(0, len(image_ids), LOOKUP_CHUNK):
+                chunk = [str(image_id) for image_id in image_ids[start:start + LOOKUP_CHUNK]]
+                placeholders = ", ".join("?" * len(chunk))
+                rows.extend(conn.execute(
+                    f"SELECT * FROM derivatives WHERE spec = ? AND image_id IN ({placeholders})", [spec] + chunk))
+        found = {}
+        for row in rows:
+            view = self._view(self.shard_path(spec, row["shard"]), row["offset"], row["length"])
+            found[row["image_id"]] = Derivative(row["image_id"], (row["width"], row["height"]),
+                                                (row["original_width"], row["original_height"]), view)
+        return found
+
+    def get(self, spec: str, image_id: str) -> Optional[Derivative]:
+        return self.get_many(spec, [image_id]).get(str(image_id))
+
+    def _view(self, path: str, offset: int, length: int) -> memoryview:
+        with self._maps_lock:
+            mapped = self._maps.get(path)
+            if mapped is None or offset + length > len(mapped):
+                # Older maps are dropped rather than closed; views handed out earlier keep them alive
+                with open(path, "rb") as pack:
+                    mapped = mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[path] = mapped
+        return memoryview(mapped)[offset:offset + length]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT spec, COUNT(*) AS images, SUM(length) AS bytes, MAX(shard) + 1 AS shards "
+                                "FROM derivatives GROUP BY spec").fetchall()
+        return {row["spec"]: {"images": row["images"], "bytes": row["bytes"], "shards": row["shards"]}
+                for row in rows}
+
+
+_store: Optional[DerivativeStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store(create: bool = True) -> Optional[DerivativeStore]:
+    """
+    Process-wide store at DERIVATIVE_STORE_PATH, so shard maps are shared between requests.
+    With `create=False` (request paths) nothing is created on disk: None if no store was built yet.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if not create and not os.path.exists(os.path.join(config.DERIVATIVE_STORE_PATH, "index.sqlite3")):
+                return None
+            _store = DerivativeStore()
+        return _store
+
+
+class DerivativeBuilder:
+    """
+    Builds the missing derivatives of the images matching `search`.
+
+    Images are read from the local store (or downloaded) while a process pool decodes and
+    renders earlier batches; every spec is rendered from a single decode. Images that already
+    have all requested derivatives are skipped unless `rebuild` is set.
+    """
+
+    def __init__(self, supabase, search: image_search.ImageSearch, specs: List[DerivativeSpec],
+                 store: Optional[DerivativeStore] = None, batch_size: Optional[int] = None,
+                 processes: Optional[int] = None, limit: Optional[int] = None, rebuild: bool = False):
+        self.supabase = supabase
+        self.search = search
+        self.specs = specs
+        self.store = store or DerivativeStore()
+        self.batch_size = batch_size or config.MODEL_TEST_BATCH_SIZE
+        self.processes = config.MODEL_TEST_PROCESSES if processes is None else processes
+        self.limit = limit
+        self.rebuild = rebuild
+        self.counts = {"built": 0, "skipped": 0, "failed": 0}
+        self.errors: List[str] = []
+
+    def _missing(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.rebuild:
+            return rows
+        ids = [str(row["id"]) for row in rows]
+        complete = set(ids)
+        for spec in self.specs:
+            complete &= self.store.existing(spec.name, ids)
+        return [row for row in rows if str(row["id"]) not in complete]
+
+    async def _fetch(self, rows: List[Dict[str, Any]], slots: asyncio.Semaphore) -> List[Tuple[str, bytes]]:
+        async def fetch(row):
+            async with slots:
+                try:
+                    return str(row["id"]), await zip_stream.fetch_image_bytes(row)
+                except Exception as e:
+                    self._fail(f"Could not load image {row['id']} ({row.get('url')}): {e}")
+                    return None
+
+        return [item for item in await asyncio.gather(*(fetch(row) for row in rows)) if item is not None]
+
+    def _fail(self, message: str):
+        self.counts["failed"] += 1
+        print(message)
+        self.errors.append(message)
+
+    def _store_results(self, results: List[Tuple[str, Dict[str, Any]]]):
+        per_spec: Dict[str, List[Any]] = {spec.name: [] for spec in self.specs}
+        for image_id, rendered in results:
+            if "error" in rendered:
+                self._fail(f"Image {image_id}: {rendered['error']}")
+                continue
+            for name, (data, size, original_size) in rendered.items():
+                per_spec[name].append((image_id, data, size, original_size))
+            self.counts["built"] += 1
+        for name, records in per_spec.items():
+            self.store.put_many(name, records)
+        if THUMBNAIL.name in per_spec:
+            self._mark_thumbnails([image_id for image_id, *_ in per_spec[THUMBNAIL.name]])
+
+    def _mark_thumbnails(self, ids: List[str]):
+        """Flags rows whose thumbnail is stored, so listings only point at the thumbnail route for those."""
+        if not ids:
+            return
+        try:
+            self.supabase.table("image_metadata").update({"has_thumbnail": True}).in_("id", ids).execute()
+        except Exception as e:
+            print(f"Could not flag {len(ids)} images as having thumbnails: {e}")
+
+    async def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(self.processes) if self.processes > 0 else None
+        max_pending = max(1, self.processes) * 2
+        download_slots = asyncio.Semaphore(config.IMAGE_DOWNLOAD_CONCURRENCY)
+        pending = set()
+        submitted = 0
+
+        async def drain(return_when):
+            nonlocal pending
+            done, pending = await asyncio.wait(pending, return_when=return_when)
+            for task in done:
+                await asyncio.to_thread(self._store_results, task.result())
+
+        async def submit(rows):
+            missing = await asyncio.to_thread(self._missing, rows)
+            self.counts["skipped"] += len(rows) - len(missing)
+            if any(spec.name == THUMBNAIL.name for spec in self.specs):
+                # Thumbnails built before the flag existed
+                missing_ids = {str(row["id"]) for row in missing}
+                await asyncio.to_thread(self._mark_thumbnails, [
+                    str(row["id"]) for row in rows if str(row["id"]) not in missing_ids and not row.get("has_thumbnail")])
+            batch = await self._fetch(missing, download_slots)
+            if batch:
+                if executor is None:
+                    future = asyncio.to_thread(render_batch, batch, self.specs)
+                else:
+                    future = loop.run_in_executor(executor, render_batch, batch, self.specs)
+                pending.add(asyncio.ensure_future(future))
+            while len(pending) >= max_pending:
+                await drain(asyncio.FIRST_COMPLETED)
+
+        try:
+            rows: List[Dict[str, Any]] = []
+            async for row in image_search.iter_rows(self.supabase, self.search, columns=IMAGE_COLUMNS):
+                if self.limit is not None and submitted >= self.limit:
+                    break
+                rows.append(row)
+                submitted += 1
+                if len(rows) >= self.batch_size:
+                    await submit(rows)
+                    rows = []
+            if rows:
+                await submit(rows)
+            if pending:
+                await drain(asyncio.ALL_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - started
+        summary = dict(self.counts, elapsed_seconds=round(elapsed, 2),
+                       images_per_second=round(self.counts["built"] / elapsed, 2) if elapsed else None)
+        print(f"Derivatives finished: {summary}")
+        return summary
+
+
+if __name__ == "__main__":
+    from api.model_runner import _create_supabase
+
+    parser = argparse.ArgumentParser(description="Build thumbnails and model-input derivatives.")
+    parser.add_argument("--spec", action="append", help="'thumb' or 'model:<model_id>' (repeatable; default thumb)")
+    parser.add_argument("--keyword", help="Only images matching this keyword/tag")
+    parser.add_argument("--source")
+    parser.add_argument("--format")
+    parser.add_argument("--limit", type=int, help="Look at most at this many images")
+    parser.add_argument("--rebuild", action="store_true", help="Re-render images that already have derivatives")
+    parser.add_argument("--batch-size", type=int, default=config.MODEL_TEST_BATCH_SIZE)
+    parser.add_argument("--processes", type=int, default=config.MODEL_TEST_PROCESSES,
+                        help="Pool processes for decoding and resizing (0 runs in this process)")
+    parser.add_argument("--stats", action="store_true", help="Print what the store holds and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        for spec_name, spec_stats in DerivativeStore().stats().items():
+            print(f"{spec_name}\t{spec_stats}")
+    else:
+        builder = DerivativeBuilder(
+            _create_supabase(), image_search.ImageSearch(args.keyword, source=args.source, format=args.format),
+            [get_spec(name) for name in (args.spec or [THUMBNAIL.name])], batch_size=args.batch_size,
+            processes=args.processes, limit=args.limit, rebuild=args.rebuild)
+
+        async def main():
+            try:
+                await builder.run()
+            finally:
+                await http_client.close_async_session()
+
+        asyncio.run(main())
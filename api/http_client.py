@@ -0,0 +1,235 @@
+import asyncio
+import json
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from api import metrics
+from lib.shared import config
+
+# Status codes that are retried with exponential backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "sync_requests": 0,
+    "sync_retries": 0,
+    "async_requests": 0,
+    "async_retries": 0,
+    "async_new_connections": 0,
+    "async_reused_connections": 0,
+}
+
+
+def _incr(key: str, amount: int = 1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _count_response(client: str):
+    _incr(f"{client}_requests")
+    metrics.HTTP_REQUESTS.inc(client=client)
+
+
+# --- Sync client (requests.Session shared by all threads) ---
+# requests and urllib3 are imported with the first session, so importing this module stays cheap
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _create_session() -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class _CountingRetry(Retry):
+        """urllib3 Retry that records every retry attempt in the client stats."""
+
+        def increment(self, *args, **kwargs):
+            new_retry = super().increment(*args, **kwargs)
+            _incr("sync_retries")
+            metrics.HTTP_RETRIES.inc(client="sync")
+            return new_retry
+
+    retry = _CountingRetry(
+        total=config.HTTP_MAX_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False, # Hand the final 429/5xx response back so callers can raise_for_status()
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+        pool_block=False,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(lambda response, *args, **kwargs: _count_response("sync"))
+    return session
+
+
+def get_session() -> "requests.Session":
+    """Returns the process-wide pooled requests.Session (keep-alive, retries with backoff)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+    return _session
+
+
+def get(url: str, timeout: Optional[float] = None, **kwargs) -> "requests.Response":
+    """Drop-in replacement for requests.get that goes through the shared connection pool."""
+    return get_session().get(url, timeout=timeout or config.HTTP_TIMEOUT, **kwargs)
+
+
+# --- Async client (aiohttp.ClientSession, one per event loop) ---
+
+# Event loop -> (session, shutdown guard); a session's connections belong to the loop it was made on
+_async_sessions: Dict[asyncio.AbstractEventLoop, Tuple[Any, Any]] = {}
+
+
+class AsyncResponse:
+    """Fully-read aiohttp response with a requests-like surface."""
+
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+def _trace_config():
+    import aiohttp
+
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_connection_create_end(session, context, params):
+        _incr("async_new_connections")
+
+    async def on_connection_reuseconn(session, context, params):
+        _incr("async_reused_connections")
+
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+
+async def _close_at_shutdown(session):
+    """
+    Async generator that closes `session` when finalized. The loop's shutdown_asyncgens()
+    (run by asyncio.run before it closes the loop) finalizes it, so a loop that ends without
+    close_async_session() still closes its pool.
+    """
+    try:
+        yield
+    finally:
+        if not session.closed:
+            await session.close()
+
+
+async def get_async_session():
+    """Returns the pooled aiohttp.ClientSession for the running event loop, creating it on first use."""
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    entry = _async_sessions.get(loop)
+    if entry is None or entry[0].closed:
+        # Forget the pools of loops that have ended (their sessions were closed at shutdown)
+        for other in [other for other in _async_sessions if other.is_closed()]:
+            del _async_sessions[other]
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_POOL_CONNECTIONS * config.HTTP_POOL_MAXSIZE,
+            limit_per_host=config.HTTP_POOL_MAXSIZE,
+            keepalive_timeout=30,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config.HTTP_TIMEOUT),
+            trace_configs=[_trace_config()],
+        )
+        guard = _close_at_shutdown(session)
+        await guard.__anext__() # Registers the guard with the loop
+        entry = _async_sessions[loop] = (session, guard)
+    return entry[0]
+
+
+async def async_get(url: str, params: Optional[Dict[str, Any]] = None,
+                    headers: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None) -> AsyncResponse:
+    """
+    GET through the shared aiohttp pool, retrying connection errors, 429 and 5xx with exponential backoff.
+    A numeric Retry-After header takes precedence over the computed backoff.
+    """
+    import aiohttp
+
+    session = await get_async_session()
+    request_timeout = aiohttp.ClientTimeout(total=timeout or config.HTTP_TIMEOUT)
+    attempt = 0
+    while True:
+        retry_after = None
+        try:
+            async with session.get(url, params=params, headers=headers, timeout=request_timeout) as response:
+                _count_response("async")
+                content = await response.read()
+                result = AsyncResponse(str(response.url), response.status, dict(response.headers), content)
+            if result.status_code not in RETRY_STATUSES or attempt >= config.HTTP_MAX_RETRIES:
+                return result
+            retry_after = result.headers.get("Retry-After")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= config.HTTP_MAX_RETRIES:
+                raise
+
+        delay = config.HTTP_BACKOFF_FACTOR * (2 ** attempt)
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        attempt += 1
+        _incr("async_retries")
+        metrics.HTTP_RETRIES.inc(client="async")
+        await asyncio.sleep(delay)
+
+
+async def close_async_session():
+    """Closes the running event loop's aiohttp pool (call on application shutdown)."""
+    entry = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+
+
+# --- Metrics ---
+
+def get_connection_stats() -> Dict[str, Any]:
+    """
+    Connection-reuse metrics for both clients.
+    For the sync pool, `reused_connections` is requests served minus connections opened.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+
+    opened = served = 0
+    if _session is not None:
+        # The same adapter is mounted for http:// and https://, count each pool once
+        for adapter in {id(a): a for a in _session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                opened += pool.num_connections
+                served += pool.num_requests
+    stats["sync_new_connections"] = opened
+    stats["sync_reused_connections"] = max(0, served - opened)
+    return stats
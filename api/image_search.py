@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import json
+from typing import List, Dict, Any, AsyncIterator, Optional
+
+# Rows returned to image listings and exports
+LISTING_COLUMNS = ["id", "url", "source", "source_url", "alt_text", "keyword", "tags",
+                   "width", "height", "size", "format", "content_hash", "crawl_date"]
+# Upper bound enforced by the search_images function as well
+MAX_PAGE_SIZE = 1000
+ORDERINGS = ("id", "crawl_date")
+
+
+class InvalidCursor(ValueError):
+    """Raised for a pagination cursor that was not produced by encode_cursor()."""
+
+
+class ImageSearch:
+    """
+    Filters for the indexed image search (the search_images database function).
+
+    `query` matches a keyword or alt_text substring (trigram indexes) or an exact tag (GIN index);
+    the other filters narrow by provider, file format and minimum dimensions. Everything is sent
+    as function arguments, so user input never ends up inside a filter string. Results are
+    ordered by id or by crawl_date (ties broken by id) and paginated with a keyset cursor: the
+    `cursor_key()` of the last row seen.
+    """
+
+    def __init__(self, query: Optional[str] = None, source: Optional[str] = None, format: Optional[str] = None,
+                 min_width: Optional[int] = None, min_height: Optional[int] = None, descending: bool = False,
+                 order_by: str = "id"):
+        if order_by not in ORDERINGS:
+            raise ValueError(f"order_by must be one of {ORDERINGS}")
+        self.query = query.strip() if query and query.strip() else None
+        self.source = source
+        self.format = format
+        self.min_width = min_width
+        self.min_height = min_height
+        self.descending = descending
+        self.order_by = order_by
+
+    def cursor_key(self, row: Dict[str, Any]) -> List[Any]:
+        """Sort key of a row: [id], or [id, crawl_date] when ordered by crawl date."""
+        return [row["id"], row.get("crawl_date")] if self.order_by == "crawl_date" else [row["id"]]
+
+    def params(self, after: Optional[List[Any]] = None, limit: int = 100) -> Dict[str, Any]:
+        params = {
+            "p_query": self.query,
+            "p_source": self.source,
+            "p_format": self.format,
+            "p_min_width": self.min_width,
+            "p_min_height": self.min_height,
+            "p_after_id": str(after[0]) if after is not None else None,
+            "p_limit": max(1, min(limit, MAX_PAGE_SIZE)),
+            "p_descending": self.descending,
+        }
+        if self.order_by == "crawl_date":
+            params["p_order_by"] = "crawl_date"
+            params["p_after_date"] = after[1] if after is not None else None
+        # Unset filters fall back to the function's NULL defaults
+        return {name: value for name, value in params.items() if value is not None}
+
+
+def fetch_page(supabase, search: ImageSearch, after: Optional[List[Any]] = None, limit: int = 100,
+               columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """One page of matching rows after the cursor key `after` (blocking; run it in a thread from async code)."""
+    columns = list(columns or LISTING_COLUMNS)
+    if search.order_by == "crawl_date" and "crawl_date" not in columns:
+        columns.append("crawl_date") # Needed for the next cursor key
+    query = supabase.rpc("search_images", search.params(after, limit))
+    return query.select(", ".join(columns)).execute().data or []
+
+
+async def iter_rows(supabase, search: ImageSearch, page_size: int = 500,
+                    first_page: Optional[List[Dict[str, Any]]] = None,
+                    columns: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields every matching row, one keyset page at a time, so exports over millions of rows
+    never hold more than a page and never pay for a large OFFSET.
+    """
+    page = first_page
+    after = None
+    while True:
+        if page is None:
+            page = await asyncio.to_thread(fetch_page, supabase, search, after, page_size, columns)
+        for row in page:
+            yield row
+        if len(page) < page_size:
+            return
+        after = search.cursor_key(page[-1])
+        page = None
+
+
+def encode_cursor(search: ImageSearch, row: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(search.cursor_key(row)).encode()).decode()
+
+
+def decode_cursor(search: ImageSearch, cursor: str) -> List[Any]:
+    """Cursor key encoded by encode_cursor() for the same ordering."""
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        after = None
+    if not isinstance(after, list) or len(after) != (2 if search.order_by == "crawl_date" else 1):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return after
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import time
+from typing import List, Dict, Any, Optional
+
+from api import http_client, metrics
+from lib.shared import config
+
+# Pillow format names mapped to the file extensions stored in image_metadata.format
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp", "BMP": "bmp", "TIFF": "tiff"}
+
+
+class InvalidImage(Exception):
+    """Raised when downloaded bytes are not a decodable image."""
+
+
+def content_path(content_hash: str, extension: str, root: Optional[str] = None) -> str:
+    """Sharded location of an image in the content-addressed store: <root>/ab/cd/<sha256>.<ext>"""
+    root = root or config.IMAGE_STORAGE_PATH
+    return os.path.join(root, content_hash[:2], content_hash[2:4], f"{content_hash}.{extension}")
+
+
+def inspect_image(content: bytes) -> Dict[str, Any]:
+    """Verifies image bytes with Pillow and returns width, height, format and size."""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            width, height = image.size
+            image_format = image.format
+            image.verify() # Checks the file structure without a full decode
+    except Exception as e:
+        raise InvalidImage(str(e))
+    return {
+        "width": width,
+        "height": height,
+        "format": FORMAT_EXTENSIONS.get(image_format, (image_format or "bin").lower()),
+        "size": len(content),
+    }
+
+
+def store_bytes(content: bytes, extension: str, root: Optional[str] = None) -> str:
+    """
+    Writes bytes to the store (if not already present) and returns their SHA-256.
+    Files are written to a temp file and renamed, so readers never see partial images.
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+    path = content_path(content_hash, extension, root)
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return content_hash
+
+
+def local_path(img_data: Dict[str, Any], root: Optional[str] = None) -> Optional[str]:
+    """Path of a stored image for an image_metadata row, or None if it is not in the local store."""
+    content_hash = img_data.get("content_hash")
+    if not content_hash:
+        return None
+    path = content_path(content_hash, img_data.get("format") or "jpg", root)
+    return path if os.path.exists(path) else None
+
+
+def read_local(img_data: Dict[str, Any]) -> Optional[bytes]:
+    path = local_path(img_data)
+    if path is None:
+        return None
+    with open(path, "rb") as image_file:
+        return image_file.read()
+
+
+def _verify_and_store(img_data: Dict[str, Any], content: bytes) -> bytes:
+    info = inspect_image(content)
+    content_hash = store_bytes(content, info["format"])
+    img_data.update(info)
+    img_data["content_hash"] = content_hash
+    return content
+
+
+async def fetch_and_store(img_data: Dict[str, Any]) -> bytes:
+    """
+    Downloads one image, verifies it, stores it and fills in size/format/width/height/content_hash.
+    Returns the image bytes so other stages (e.g. perceptual dedup) can reuse them.
+    """
+    if img_data.get("content_hash"):
+        content = await asyncio.to_thread(read_local, img_data)
+        if content is not None:
+            return content
+    response = await http_client.async_get(img_data["url"])
+    response.raise_for_status()
+    return await asyncio.to_thread(_verify_and_store, img_data, response.content)
+
+
+async def store_images(images: List[Dict[str, Any]], concurrency: Optional[int] = None,
+                       errors: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Downloads and stores images concurrently (at most `concurrency` at a time).
+    Returns the images that verified; images that fail to download or decode are dropped
+    and reported in `errors`. Images already carrying a content_hash are kept as they are.
+    """
+    slots = asyncio.Semaphore(concurrency or config.IMAGE_DOWNLOAD_CONCURRENCY)
+
+    async def download(img_data: Dict[str, Any]) -> bool:
+        if img_data.get("content_hash"):
+            return True
+        async with slots:
+            started = time.perf_counter()
+            try:
+                with metrics.IMAGE_DOWNLOADS_IN_FLIGHT.track_inflight(), metrics.span("image.download"):
+                    await fetch_and_store(img_data)
+                metrics.IMAGE_DOWNLOAD_SECONDS.observe(time.perf_counter() - started, outcome="stored")
+                return True
+            except Exception as e:
+                outcome = "invalid" if isinstance(e, InvalidImage) else "error"
+                metrics.IMAGE_DOWNLOAD_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+                message = f"Image download/verification failed for {img_data.get('url')}: {e}"
+                print(message)
+                if errors is not None:
+                    errors.append(message)
+                return False
+
+    keep = await asyncio.gather(*(download(img) for img in images))
+    return [img for img, ok in zip(images, keep) if ok]
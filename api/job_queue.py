@@ -0,0 +1,255 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Tuple
+
+from lib.shared import config
+
+# Queue states. Supabase's crawl_jobs row stays the user-facing record; this table drives execution.
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobQueue:
+    """
+    Durable crawl job queue backed by a local SQLite file.
+
+    Jobs are leased atomically (highest priority first, then oldest) by worker processes,
+    which heartbeat while they run. Jobs whose heartbeat goes stale, e.g. because the worker
+    crashed or the machine restarted, are put back in the queue by `recover_stale()` until
+    they run out of attempts. Cancellation is cooperative: queued jobs are cancelled at once,
+    running jobs see `is_cancel_requested()` and stop at their next checkpoint.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.JOB_QUEUE_PATH
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    keyword TEXT NOT NULL,
+                    crawl_limit INTEGER NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    error TEXT,
+                    payload TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_lease_idx ON jobs (status, priority DESC, created_at)")
+            # Columns added after the first release of the queue
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "progress" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the queue safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, job_id: str, keyword: str, limit: int, priority: int = 0,
+                payload: Optional[Dict[str, Any]] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, keyword, crawl_limit, priority, status, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, keyword, limit, priority, QUEUED, json.dumps(payload or {}), time.time()))
+
+    def enqueue_many(self, jobs: List[Tuple[str, str, int]], priority: int = 0,
+                     payload: Optional[Dict[str, Any]] = None, payloads: Optional[List[Dict[str, Any]]] = None):
+        """
+        Enqueues (job id, keyword, limit) jobs in one transaction; they are leased in list order.
+        `payload` is shared by every job; `payloads` adds each job's own entries to it.
+        """
+        now = time.time()
+        encoded = [json.dumps(dict(payload or {}, **(payloads[index] if payloads else {})))
+                   for index in range(len(jobs))]
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO jobs (id, keyword, crawl_limit, priority, status, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    # Distinct creation times keep the lease order stable within the batch
+                    [(job_id, keyword, limit, priority, QUEUED, encoded[index], now + index * 1e-6)
+                     for index, (job_id, keyword, limit) in enumerate(jobs)])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def requeue(self, job_id: str, keyword: str, limit: int, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Puts a finished job back in the queue with fresh attempts, merging `payload` into the one it
+        was enqueued with (used to retry failed jobs). Jobs unknown to this queue are enqueued anew.
+        Returns False if the job is still queued or running.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT status, priority, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO jobs (id, keyword, crawl_limit, priority, status, payload, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, keyword, limit, 0, QUEUED, json.dumps(payload or {}), time.time()))
+                elif row["status"] in (QUEUED, RUNNING):
+                    conn.execute("COMMIT")
+                    return False
+                else:
+                    merged = dict(json.loads(row["payload"] or "{}"), **(payload or {}))
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, payload = ?, attempts = 0, cancel_requested = 0, worker = NULL, "
+                        "error = NULL, progress = NULL, started_at = NULL, heartbeat_at = NULL, finished_at = NULL "
+                        "WHERE id = ?", (QUEUED, json.dumps(merged), job_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def lease(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Claims the next queued job for `worker`, or returns None if the queue is empty."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND cancel_requested = 0 "
+                    "ORDER BY priority DESC, created_at LIMIT 1", (QUEUED,)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, worker, now, now, row["id"]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"] or "{}")
+        return job
+
+    def heartbeat(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                         (time.time(), job_id, RUNNING))
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                         (status, error, time.time(), job_id))
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """
+        Flags a job for cancellation. Returns the job's resulting status
+        (cancelled for queued jobs, running for jobs that will stop cooperatively), or None if unknown.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            status = row["status"]
+            if status == QUEUED:
+                conn.execute("UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ?",
+                             (CANCELLED, time.time(), job_id))
+                status = CANCELLED
+            elif status == RUNNING:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+            return status
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return bool(row and row["cancel_requested"])
+
+    def recover_stale(self, lease_timeout: Optional[float] = None) -> Tuple[List[str], List[Tuple[str, str, Optional[str]]]]:
+        """
+        Requeues running jobs whose heartbeat is older than `lease_timeout` seconds.
+        Jobs that already used JOB_MAX_ATTEMPTS attempts are marked failed instead, and jobs with
+        a pending cancel request are marked cancelled.
+        Returns the requeued job ids and the closed jobs as (job id, status, error); nobody is left
+        to update the crawl_jobs rows of closed jobs, so the caller has to.
+        """
+        lease_timeout = config.JOB_LEASE_TIMEOUT if lease_timeout is None else lease_timeout
+        cutoff = time.time() - lease_timeout
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id, attempts, cancel_requested FROM jobs WHERE status = ? AND heartbeat_at < ?",
+                                (RUNNING, cutoff)).fetchall()
+            recovered, closed = [], []
+            for row in rows:
+                if row["cancel_requested"]:
+                    conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+                                 (CANCELLED, time.time(), row["id"]))
+                    closed.append((row["id"], CANCELLED, None))
+                elif row["attempts"] >= config.JOB_MAX_ATTEMPTS:
+                    error = "Worker lost too many times"
+                    conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                                 (FAILED, error, time.time(), row["id"]))
+                    closed.append((row["id"], FAILED, error))
+                else:
+                    conn.execute("UPDATE jobs SET status = ?, worker = NULL WHERE id = ?", (QUEUED, row["id"]))
+                    recovered.append(row["id"])
+            conn.execute("COMMIT")
+        return recovered, closed
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]):
+        """Stores the latest progress snapshot so other processes (the API) can stream it."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+    def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the job's queue status and latest progress snapshot, or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        progress = json.loads(row["progress"]) if row["progress"] else {}
+        progress["queue_status"] = row["status"]
+        return progress
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_queue() -> JobQueue:
+    """Returns the process-wide queue handle (the SQLite file is shared by the API and the workers)."""
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
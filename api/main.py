@@ -1,166 +1,221 @@
 import os
-import uvicorn
 import sys
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse # Import StreamingResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse, RedirectResponse # Import StreamingResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv, find_dotenv
 import uuid
+import base64
+import json
+import time
 from datetime import datetime
 import asyncio
-import requests # For downloading images if needed, and for API calls
-import io
-import zipfile
+from contextlib import aclosing
+from typing import Any, Callable, Dict, List, Optional, Union
 
-from supabase import create_client, Client
+# Concurrent image search across all API sources, sharing one pooled HTTP client
+# (environment and .env are loaded once by lib.shared.config; Supabase and the source
+# modules are only initialized on first use, which keeps serverless cold starts short)
+from api import source_engine, http_client, rate_limit, search_cache, job_queue, progress, metrics, image_search
+from api import query_expansion, sources, supabase_client
+from api.checkpoint import JobCheckpoint
+from api.collector import ImageCollector
+from lib.shared import config
 
-# Import API source clients
-from api.api_sources import pixabay, pexels, unsplash, google_images
+# Set directly by tests and the benchmark harness; otherwise created by get_supabase() on first use
+supabase = None
 
-# Load environment variables from the .env file found by traversing up the directory tree
-load_dotenv(find_dotenv())
-
-# Initialize Supabase client
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
-supabase: Client = None
-
-print("--- Environment Variable Debugging ---")
-print("SUPABASE_URL:", os.getenv("SUPABASE_URL"))
-print("SUPABASE_KEY:", os.getenv("SUPABASE_KEY"))
-print("Current working directory:", os.getcwd())
-print("------------------------------------")
-
-if supabase_url and supabase_key:
-    try:
-        supabase = create_client(supabase_url, supabase_key)
-        print("Supabase client initialized successfully in main.py.")
-    except Exception as e:
-        print(f"Failed to initialize Supabase client in main.py: {e}")
-else:
-    print("Supabase URL or Key not found in environment variables for main.py. Check .env file and environment setup.")
+def get_supabase():
+    global supabase
+    if supabase is None:
+        supabase = supabase_client.get_client()
+    return supabase
 
 app = FastAPI()
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "http": http_client.get_connection_stats(),
+        "rate_limits": rate_limit.get_rate_limit_stats(),
+        "search_cache": search_cache.get_cache().stats(),
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of this process's metrics plus those exported by the crawl workers."""
+    return PlainTextResponse(await asyncio.to_thread(metrics.collect), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def eager_init():
+    if config.EAGER_INIT:
+        # Long-running servers can pay for initialization before the first request instead
+        await asyncio.to_thread(get_supabase)
+        await asyncio.to_thread(sources.discover)
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await http_client.close_async_session()
 
 class CrawlRequest(BaseModel):
     keyword: str
     limit: int = 10 # Number of images to collect
+    priority: int = 0 # Higher priority jobs are leased first by the worker pool
+    expand: Optional[bool] = None # Search related queries if the keyword alone cannot fill `limit` (default QUERY_EXPANSION_ENABLED)
+    variants: Optional[List[str]] = None # Related queries to try first when expanding
+
+class BatchCrawlItem(BaseModel):
+    keyword: str
+    limit: Optional[int] = None # Defaults to the batch's `limit`
+    variants: Optional[List[str]] = None # Related queries to try first when expanding
+
+class BatchCrawlRequest(BaseModel):
+    keywords: List[Union[str, BatchCrawlItem]] # Plain keywords use the batch's `limit`
+    limit: int = 10 # Images per keyword unless the item sets its own
+    priority: int = 0
+    expand: Optional[bool] = None
 
-async def run_image_search_in_background(keyword: str, limit: int, job_id: str):
+async def run_image_search_in_background(keyword: str, limit: int, job_id: str,
+                                         should_cancel: Optional[Callable[[], bool]] = None,
+                                         expand: Optional[bool] = None,
+                                         variants: Optional[List[str]] = None,
+                                         resume: bool = False) -> Optional[str]:
     """
     Searches for images using various APIs and stores metadata in Supabase.
     Handles API priority and fallback to web crawling if needed.
+    With `expand`, related queries (`variants`, synonyms, result tags) are searched before the
+    backup crawl when the keyword alone does not fill `limit`.
+    `should_cancel` is polled between result pages; when it returns True the job stops early.
+    Every accepted page is checkpointed (api/checkpoint.py); with `resume`, the job continues
+    from the checkpoints of its earlier attempts instead of starting over.
+    Returns the final job status.
     """
+    expand = config.QUERY_EXPANSION_ENABLED if expand is None else expand
+    supabase = get_supabase()
     if not supabase:
         print("Supabase client not available for background task.")
-        return
+        return None
 
-    collected_images = []
     errors = []
+    cancelled = False
+    tracker = None
+    collector = None
+    checkpoint = None
     
     try:
-        # Update job status to running and store PID
-        # Note: PID is for the 'scrapy' command itself, not the Python process running FastAPI
-        # For robust process management, consider a dedicated process manager or task queue.
-        response_update_running = supabase.table("crawl_jobs").update({"status": "running"}).eq("id", job_id).execute()
+        # Update job status to running and store the PID of the process running the job
+        response_update_running = supabase.table("crawl_jobs").update({
+            "status": "running",
+            "pid": os.getpid(),
+        }).eq("id", job_id).execute()
         if not response_update_running.data:
             raise Exception(f"Supabase update failed for job {job_id} status to running.")
         print(f"Started image search for job {job_id} with keyword '{keyword}'")
 
+        # Dedup, local storage and bulk writes shared by the API sources and the backup crawler
+        collector = ImageCollector(supabase, keyword, limit, errors, job_id=job_id)
+        collected_images = collector.collected
+        checkpoint = JobCheckpoint(supabase, job_id)
+        # Live progress for GET /api/crawl/jobs/{job_id}/events
+        sink = job_queue.get_queue().update_progress if config.JOB_QUEUE_BACKEND != "inline" else None
+        tracker = progress.start(job_id, keyword, limit, errors, supabase=supabase, sink=sink)
+        if resume:
+            # Images committed by earlier attempts count again; their pages are not fetched again
+            tracker.phase = "resuming"
+            await asyncio.to_thread(checkpoint.load)
+            await collector.restore(checkpoint.images)
+            tracker.record(collected_images, restored=True)
+            print(f"Resuming job {job_id} from {len(checkpoint.rows)} checkpointed pages "
+                  f"with {len(collected_images)}/{limit} images.")
+            expanded_queries = checkpoint.queries("query_expansion")
+            if expanded_queries:
+                # The interrupted attempt was already expanding: its related queries continue first
+                expand = True
+                variants = expanded_queries + (variants or [])
+        tracker.phase = "api_sources"
+        await tracker.publish(force=True)
+
         # --- API Based Search (Priority) ---
-        api_sources = [
-            (pixabay.search_pixabay_images, "Pixabay"),
-            (pexels.search_pexels_images, "Pexels"),
-            (unsplash.search_unsplash_images, "Unsplash"),
-            (google_images.search_google_images, "Google Custom Search"), # New API
-        ]
-
-        for search_func, source_name in api_sources:
-            if len(collected_images) >= limit:
-                break
-            
-            print(f"Attempting to search {source_name} for '{keyword}'...")
-            try:
-                # Calculate remaining limit for current API call
-                remaining_limit = limit - len(collected_images)
-                if remaining_limit <= 0:
-                    break
-                
-                # Each API has its own per_page limit
-                per_page_limit = {
-                    "Pixabay": 200,
-                    "Pexels": 80,
-                    "Unsplash": 30,
-                    "Google Custom Search": 10, # Google Custom Search API limit
-                }.get(source_name, 30) # Default to 30 if not found
-
-                current_batch_limit = min(remaining_limit, per_page_limit)
-                
-                # Google Custom Search API uses 'num' instead of 'per_page'
-                if source_name == "Google Custom Search":
-                    images_from_api = search_func(keyword, num=current_batch_limit)
-                else:
-                    images_from_api = search_func(keyword, per_page=current_batch_limit)
-                
-                if images_from_api:
-                    print(f"Found {len(images_from_api)} images from {source_name}.")
-                    for img_data in images_from_api:
-                        # Ensure all required fields are present and handle None
-                        img_data['crawl_date'] = datetime.now().isoformat()
-                        img_data['source_url'] = img_data.get('source_url', 'N/A')
-                        img_data['alt_text'] = img_data.get('alt_text', '')
-                        img_data['tags'] = img_data.get('tags', [])
-                        img_data['url'] = img_data.get('url') # Ensure URL is present
-                        img_data['source'] = img_data.get('source', source_name) # Ensure source is present
-
-                        if img_data['url']: # Only store if URL is valid
-                            img_data['keyword'] = keyword # Add the keyword to image metadata
-                            collected_images.append(img_data)
-                            if len(collected_images) >= limit:
-                                break
-                else:
-                    print(f"No images found or API error from {source_name}.")
-            except Exception as e:
-                errors.append(f"API Error from {source_name}: {e}")
-                print(f"API Error from {source_name}: {e}")
+        # All sources are paged concurrently until limit is met; results arrive in Pixabay -> Pexels -> Unsplash -> Google order.
+        expander = query_expansion.QueryExpander(keyword, variants) if expand else None
+        if expander:
+            expander.observe(collected_images)
+        positions = checkpoint.positions(keyword)
+        if not collector.full:
+            async with aclosing(source_engine.iter_source_pages(keyword, limit, errors=errors,
+                                                                positions=positions)) as pages:
+                async for source_name, page in pages:
+                    if should_cancel and await asyncio.to_thread(should_cancel):
+                        cancelled = True
+                        break
+                    if expander:
+                        expander.observe(page) # Tags of the keyword's own results seed related queries
+                    accepted = await collector.accept_page(page)
+                    tracker.record(accepted)
+                    await checkpoint.record("api_sources", keyword, source_name, accepted, positions)
+                    await tracker.publish()
+                    if collector.full:
+                        break
+
+        # --- Adaptive Query Expansion (related queries through the same sources) ---
+        if expander and not collector.full and not cancelled:
+            print(f"Keyword alone gave {len(collected_images)}/{limit} images. Searching related queries...")
+            tracker.phase = "query_expansion"
+            # Duplicates across queries are dropped by the collector's dedup like any other page
+            async with aclosing(query_expansion.iter_expanded_pages(
+                    expander, limit, errors=errors, positions_for=checkpoint.positions)) as pages:
+                async for query, source_name, page, page_positions in pages:
+                    if should_cancel and await asyncio.to_thread(should_cancel):
+                        cancelled = True
+                        break
+                    accepted = await collector.accept_page(page)
+                    tracker.record(accepted)
+                    await checkpoint.record("query_expansion", query, source_name, accepted, page_positions)
+                    await tracker.publish()
+                    if collector.full:
+                        break
+            if expander.used:
+                print(f"Related queries used for '{keyword}': {', '.join(expander.used)}")
 
         # --- Backup Web Crawling (if needed and not enough images collected) ---
-        # This part would involve Scrapy or BeautifulSoup4/requests for direct crawling
-        # For now, we'll just add a placeholder.
-        if len(collected_images) < limit:
-            print(f"Not enough images collected from APIs ({len(collected_images)}/{limit}). Considering backup crawling...")
-            # Here you would integrate Scrapy or BeautifulSoup4/requests
-            # For example:
-            # from api.spiders.web_crawler import WebCrawlerSpider
-            # process = CrawlerProcess(get_project_settings())
-            # process.crawl(WebCrawlerSpider, start_url=f"https://www.example.com/search?q={keyword}", ...)
-            # process.start() # This would block, so needs careful handling in FastAPI context
-            errors.append("Backup crawling not yet implemented.")
-
-        # Store collected images in Supabase
-        if collected_images:
-            try:
-                # Insert images in batches if there are many
-                for img_data in collected_images:
-                    # Remove 'source' field as it's not in image_metadata table, but useful for debugging
-                    # Or add a 'source' column to image_metadata table
-                    img_data_to_insert = {k: v for k, v in img_data.items() if k != 'source'}
-                    response_insert_image = supabase.table("image_metadata").insert(img_data_to_insert).execute()
-                    if not response_insert_image.data:
-                        errors.append(f"Supabase insert error for image {img_data.get('url')}: {response_insert_image.data}")
-                        print(f"Supabase insert error for image {img_data.get('url')}: {response_insert_image.data}")
-            except Exception as e:
-                errors.append(f"Supabase batch insert exception: {e}")
-                print(f"Supabase batch insert exception: {e}")
-        else:
+        if not collector.full and not cancelled and config.BACKUP_CRAWL_ENABLED and config.BACKUP_CRAWL_START_URLS:
+            print(f"Not enough images collected from APIs ({len(collected_images)}/{limit}). Starting backup crawling...")
+            tracker.phase = "backup_crawl"
+            from api.spiders.async_crawler import AsyncImageCrawler, start_urls_for # Only needed on fallback
+            crawler = AsyncImageCrawler(start_urls_for(keyword))
+            async with aclosing(crawler.iter_pages()) as pages:
+                async for page in pages:
+                    if should_cancel and await asyncio.to_thread(should_cancel):
+                        cancelled = True
+                        break
+                    accepted = await collector.accept_page(page)
+                    tracker.record(accepted)
+                    if accepted:
+                        await checkpoint.record("backup_crawl", keyword, "crawler", accepted)
+                    await tracker.publish()
+                    if collector.full: # Stop crawling as soon as the job's limit is filled
+                        break
+            errors.extend(crawler.errors[:20]) # Keep the job record readable on noisy crawls
+            print(f"Backup crawling visited {crawler.pages_crawled} pages.")
+
+        if cancelled:
+            errors.append("Job cancelled by request.")
+        if collector.duplicates_skipped:
+            print(f"Skipped {collector.duplicates_skipped} duplicate images for job {job_id}.")
+
+        tracker.phase = "writing"
+        await tracker.publish(force=True)
+        await collector.flush()
+        await checkpoint.flush()
+        errors.extend(checkpoint.writer.errors)
+        if not collected_images:
             errors.append("No images collected.")
 
         # Update final crawl job status
-        final_status = "completed" if len(collected_images) > 0 else "failed"
+        if cancelled:
+            final_status = "cancelled"
+        else:
+            final_status = "completed" if len(collected_images) > 0 else "failed"
         response_final_update = supabase.table("crawl_jobs").update({
             "status": final_status,
             "end_time": datetime.now().isoformat(),
@@ -171,99 +226,279 @@ async def run_image_search_in_background(keyword: str, limit: int, job_id: str):
         if not response_final_update.data:
             errors.append(f"Supabase final update failed for job {job_id}.")
             print(f"Supabase final update failed for job {job_id}.")
+        elif final_status == "completed":
+            collector.disown()
+            try:
+                await asyncio.to_thread(checkpoint.clear)
+            except Exception as e:
+                print(f"Could not delete checkpoints of job {job_id}: {e}")
         print(f"Crawl job {job_id} finished with status: {final_status}, images: {len(collected_images)}")
+        await tracker.finish(final_status)
+        return final_status
 
     except Exception as e:
         error_message = f"Overall exception in image search for job {job_id}: {e}"
         print(error_message)
+        errors.append(error_message)
+        failed_update = {
+            "status": "failed",
+            "end_time": datetime.now().isoformat(),
+            "errors": [error_message],
+            "pid": None
+        }
+        if collector is not None:
+            try:
+                # Commit what was collected so far; POST /api/crawl/jobs/{job_id}/retry resumes from here
+                await collector.flush()
+                await checkpoint.flush()
+                failed_update["image_count"] = len(collector.collected)
+            except Exception as flush_error:
+                print(f"Could not commit partial results of job {job_id}: {flush_error}")
+        if tracker is not None:
+            await tracker.finish("failed")
         if supabase:
-            supabase.table("crawl_jobs").update({
-                "status": "failed",
-                "end_time": datetime.now().isoformat(),
-                "errors": [error_message],
-                "pid": None
-            }).eq("id", job_id).execute()
+            supabase.table("crawl_jobs").update(failed_update).eq("id", job_id).execute()
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.get("/api/images")
+async def list_images(response: Response, q: Optional[str] = None, source: Optional[str] = None,
+                      format: Optional[str] = None, min_width: Optional[int] = None,
+                      min_height: Optional[int] = None, order: str = "desc", order_by: str = "id",
+                      limit: int = 100, cursor: Optional[str] = None):
+    """
+    Searches stored images (keyword/alt_text substring or exact tag) with optional filters.
+    Newest first by default, by id or (`order_by=crawl_date`) by crawl date; pass the
+    X-Next-Cursor header of the previous response as `cursor`.
+    """
+    supabase = get_supabase()
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase client not initialized.")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'.")
+    if order_by not in image_search.ORDERINGS:
+        raise HTTPException(status_code=400, detail="order_by must be 'id' or 'crawl_date'.")
+
+    search = image_search.ImageSearch(q, source=source, format=format, min_width=min_width,
+                                      min_height=min_height, descending=order == "desc", order_by=order_by)
+    try:
+        after = image_search.decode_cursor(search, cursor) if cursor else None
+    except image_search.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    limit = max(1, min(limit, image_search.MAX_PAGE_SIZE))
+
+    try:
+        images = await asyncio.to_thread(image_search.fetch_page, supabase, search, after, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Exception searching images: {e}")
+    if len(images) == limit:
+        response.headers["X-Next-Cursor"] = image_search.encode_cursor(search, images[-1])
+    return images
+
 @app.get("/api/images/download")
-async def download_images(keyword: str = None):
+async def download_images(keyword: str = None, source: Optional[str] = None, format: Optional[str] = None,
+                          min_width: Optional[int] = None, min_height: Optional[int] = None, layout: str = "zip"):
+    """
+    Streams the matching images as one ZIP (`layout=zip`) or as a WebDataset tar of image + JSON
+    metadata per sample (`layout=webdataset`). Multi-shard exports: python -m api.dataset_export.
+    """
+    from api import zip_stream # zipfile and the export pipeline load with the first export
+
+    if layout not in ("zip", "webdataset"):
+        raise HTTPException(status_code=400, detail="layout must be 'zip' or 'webdataset'.")
+    supabase = get_supabase()
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase client not initialized.")
 
-    query = supabase.table("image_metadata").select("url, alt_text, keyword")
-    if keyword:
-        query = query.or_(f"alt_text.ilike.%{keyword}%,tags.cs.{{\"{keyword}\"}},keyword.ilike.%{keyword}%")
+    # Indexed search with bound parameters, paged by id
+    search = image_search.ImageSearch(keyword, source=source, format=format,
+                                      min_width=min_width, min_height=min_height)
+    columns = ["id", "url", "alt_text", "keyword", "content_hash", "format"]
+    if layout == "webdataset":
+        columns = image_search.LISTING_COLUMNS # Every sample carries its full metadata row
 
     try:
-        response = query.execute()
-        if not response.data:
-            raise HTTPException(status_code=404, detail="No images found for the given keyword.")
-        
-        images_to_download = response.data
-
-        # Create a in-memory zip file
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-            for img_data in images_to_download:
-                img_url = img_data.get("url")
-                if not img_url:
-                    continue
-                
-                try:
-                    img_response = requests.get(img_url, stream=True)
-                    img_response.raise_for_status()
-                    
-                    # Determine filename
-                    filename = os.path.basename(img_url).split('?')[0] # Remove query params
-                    if not filename or '.' not in filename:
-                        # Fallback if filename is not clear from URL
-                        filename = f"{img_data.get('keyword', 'image')}_{img_data['id']}.jpg"
-                    
-                    zip_file.writestr(filename, img_response.content)
-                except requests.exceptions.RequestException as e:
-                    print(f"Error downloading image {img_url}: {e}")
-                except Exception as e:
-                    print(f"An unexpected error occurred while processing image {img_url}: {e}")
-        
-        zip_buffer.seek(0)
-        return StreamingResponse(zip_buffer, media_type="application/zip", headers={
-            "Content-Disposition": "attachment; filename=filtered_images.zip"
+        # Fetch the first page up front so an empty result can still be reported as 404
+        first_page = await asyncio.to_thread(
+            image_search.fetch_page, supabase, search, None, zip_stream.ROWS_PAGE_SIZE, columns)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating zip file: {e}")
+    if not first_page:
+        raise HTTPException(status_code=404, detail="No images found for the given keyword.")
+
+    # Images are read from the local store (or downloaded concurrently) and streamed out as ZIP entries as they finish
+    rows = image_search.iter_rows(supabase, search, page_size=zip_stream.ROWS_PAGE_SIZE,
+                                  first_page=first_page, columns=columns)
+    if layout == "webdataset":
+        from api import dataset_export
+
+        return StreamingResponse(dataset_export.stream_webdataset(rows), media_type="application/x-tar", headers={
+            "Content-Disposition": "attachment; filename=filtered_images.tar"
         })
+    return StreamingResponse(zip_stream.stream_zip(rows), media_type="application/zip", headers={
+        "Content-Disposition": "attachment; filename=filtered_images.zip"
+    })
+
+@app.get("/api/images/{image_id}/thumbnail")
+async def image_thumbnail(image_id: str):
+    """
+    Serves the stored thumbnail (python -m api.derivatives) straight from the memory-mapped shard.
+    Images without one are redirected to their original URL.
+    """
+    from api import derivatives
+
+    store = await asyncio.to_thread(derivatives.get_store, False)
+    thumbnail = await asyncio.to_thread(store.get, derivatives.THUMBNAIL.name, image_id) if store else None
+    if thumbnail is not None:
+        return Response(content=bytes(thumbnail.data), media_type="image/jpeg",
+                        headers={"Cache-Control": "public, max-age=86400"})
 
+    supabase = get_supabase()
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase client not initialized.")
+    try:
+        rows = await asyncio.to_thread(
+            lambda: supabase.table("image_metadata").select("url").eq("id", image_id).limit(1).execute().data)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating zip file: {e}")
+        raise HTTPException(status_code=500, detail=f"Exception fetching image: {e}")
+    if not rows:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    return RedirectResponse(rows[0]["url"])
+
+# Columns the job list may project; the default leaves out nothing the dashboard shows
+CRAWL_JOB_COLUMNS = ["id", "status", "start_time", "end_time", "target_url", "crawl_depth", "image_count", "errors", "pid",
+                     "batch_id", "options"]
+
+def _encode_job_cursor(job: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps([job["start_time"], job["id"]]).encode()).decode()
+
+def _decode_job_cursor(cursor: str):
+    try:
+        start_time, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(start_time), str(job_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
 
 @app.get("/api/crawl/jobs")
-async def get_crawl_jobs():
+async def get_crawl_jobs(response: Response, limit: int = 50, cursor: Optional[str] = None,
+                         fields: Optional[str] = None):
+    """
+    Lists crawl jobs newest first, one page at a time.
+    Pages are keyset-paginated on (start_time, id): pass the X-Next-Cursor header of the
+    previous response as `cursor`. `fields` is a comma-separated column projection.
+    """
+    supabase = get_supabase()
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase client not initialized.")
-    
+
+    columns = CRAWL_JOB_COLUMNS
+    if fields:
+        columns = [column.strip() for column in fields.split(",") if column.strip()]
+        unknown = set(columns) - set(CRAWL_JOB_COLUMNS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # The cursor columns are always needed to build the next cursor
+    selected = list(dict.fromkeys(columns + ["start_time", "id"]))
+    limit = max(1, min(limit, 200))
+
+    def run_query():
+        query = supabase.table("crawl_jobs").select(", ".join(selected))
+        if cursor:
+            start_time, job_id = _decode_job_cursor(cursor)
+            query = query.or_(f'start_time.lt."{start_time}",and(start_time.eq."{start_time}",id.lt."{job_id}")')
+        return query.order("start_time", desc=True).order("id", desc=True).limit(limit).execute()
+
     try:
-        response = supabase.table("crawl_jobs").select("*").order("start_time", desc=True).execute()
-        if not response.data: # Check if data is returned
-            raise HTTPException(status_code=500, detail=f"Failed to fetch crawl jobs: No data returned.")
-        return response.data
+        result = await asyncio.to_thread(run_query)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Exception fetching crawl jobs: {e}")
 
+    jobs = result.data or []
+    if len(jobs) == limit:
+        response.headers["X-Next-Cursor"] = _encode_job_cursor(jobs[-1])
+    return [{column: job.get(column) for column in columns} for job in jobs]
+
+@app.get("/api/crawl/jobs/{job_id}/events")
+async def stream_crawl_job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of a job's progress (per-source counts, throughput, errors, ETA).
+    Emits `progress` events while the job runs and a final `done` event.
+    """
+    supabase = get_supabase()
+
+    def read_progress():
+        snapshot = progress.get_local(job_id)
+        if snapshot is None and config.JOB_QUEUE_BACKEND != "inline":
+            snapshot = job_queue.get_queue().get_progress(job_id)
+        if not snapshot and supabase:
+            # Not running here and nothing published yet: fall back to the crawl_jobs row
+            result = supabase.table("crawl_jobs").select("id, status, image_count").eq("id", job_id).execute()
+            if result.data:
+                row = result.data[0]
+                snapshot = {"job_id": job_id, "status": row["status"], "collected": row.get("image_count") or 0}
+        return snapshot
+
+    if not await asyncio.to_thread(read_progress):
+        raise HTTPException(status_code=404, detail=f"Crawl job {job_id} not found.")
+
+    async def events():
+        last_sent = None
+        idle_since = time.monotonic()
+        while not await request.is_disconnected():
+            snapshot = await asyncio.to_thread(read_progress) or {"job_id": job_id, "status": "pending"}
+            status = snapshot.get("queue_status") if snapshot.get("queue_status") in progress.TERMINAL_STATUSES else snapshot.get("status")
+            payload = json.dumps(snapshot)
+            if payload != last_sent:
+                yield f"event: progress\ndata: {payload}\n\n"
+                last_sent = payload
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since > 15:
+                yield ": keep-alive\n\n" # Stops proxies from closing an idle stream
+                idle_since = time.monotonic()
+            if status in progress.TERMINAL_STATUSES:
+                yield f"event: done\ndata: {json.dumps({'job_id': job_id, 'status': status})}\n\n"
+                return
+            await asyncio.sleep(config.PROGRESS_PUBLISH_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+def _crawl_options(expand: Optional[bool], variants: Optional[List[str]]) -> Dict[str, Any]:
+    """Options a job was started with; stored on its row and queue payload so a retry runs it the same way."""
+    return {"expand": expand, "variants": variants}
+
+def _new_crawl_job(job_id: str, keyword: str, limit: int, batch_id: Optional[str] = None,
+                   options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    job = {
+        "id": job_id,
+        "status": "pending", # Set to pending initially
+        "start_time": datetime.now().isoformat(),
+        "target_url": keyword, # Use keyword as target_url for consistency
+        "crawl_depth": limit, # Use limit as crawl_depth for consistency
+        "image_count": 0,
+        "errors": [],
+        "pid": None # PID will be updated once a worker picks the job up
+    }
+    if batch_id:
+        job["batch_id"] = batch_id
+    if options:
+        job["options"] = options
+    return job
+
 @app.post("/api/crawl")
 async def start_crawl_endpoint(request: CrawlRequest, background_tasks: BackgroundTasks):
+    supabase = get_supabase()
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase client not initialized.")
 
     job_id = str(uuid.uuid4())
     
     # Insert initial pending job status
-    crawl_job_data = {
-        "id": job_id,
-        "status": "pending", # Set to pending initially
-        "start_time": datetime.now().isoformat(),
-        "target_url": request.keyword, # Use keyword as target_url for consistency
-        "crawl_depth": request.limit, # Use limit as crawl_depth for consistency
-        "image_count": 0,
-        "errors": [],
-        "pid": None # PID will be updated once subprocess starts
-    }
+    options = _crawl_options(request.expand, request.variants)
+    crawl_job_data = _new_crawl_job(job_id, request.keyword, request.limit, options=options)
     try:
         response_insert_job = supabase.table("crawl_jobs").insert(crawl_job_data).execute()
         if not response_insert_job.data:
@@ -273,10 +508,215 @@ async def start_crawl_endpoint(request: CrawlRequest, background_tasks: Backgrou
         print(f"Exception inserting initial crawl job: {e}")
         raise HTTPException(status_code=500, detail=f"Exception creating crawl job: {e}")
 
-    # Add the image search run to background tasks
-    background_tasks.add_task(run_image_search_in_background, request.keyword, request.limit, job_id)
+    if config.JOB_QUEUE_BACKEND == "inline":
+        # Run in this process (e.g. serverless deployments without a worker pool)
+        background_tasks.add_task(run_image_search_in_background, request.keyword, request.limit, job_id,
+                                  expand=request.expand, variants=request.variants)
+    else:
+        # Hand the job to the worker pool (python -m api.worker)
+        try:
+            await asyncio.to_thread(job_queue.get_queue().enqueue, job_id, request.keyword, request.limit,
+                                    request.priority, options)
+        except Exception as e:
+            print(f"Exception enqueuing crawl job {job_id}: {e}")
+            raise HTTPException(status_code=500, detail=f"Exception queuing crawl job: {e}")
 
     return {"message": "Image search job initiated", "job_id": job_id}
 
+async def run_crawl_batch(jobs: List[Dict[str, Any]]):
+    """
+    Runs a batch's jobs in this process (inline backend), BATCH_INLINE_CONCURRENCY at a time.
+    The jobs share the process's HTTP pool, rate-limit buckets, search cache and dedup index.
+    """
+    slots = asyncio.Semaphore(config.BATCH_INLINE_CONCURRENCY)
+
+    async def run(job: Dict[str, Any]):
+        options = job.get("options") or {}
+        async with slots:
+            try:
+                await run_image_search_in_background(job["target_url"], job["crawl_depth"], job["id"],
+                                                     expand=options.get("expand"), variants=options.get("variants"))
+            except Exception as e:
+                # The job's row is already marked failed; keep the rest of the batch going
+                print(f"Batch job {job['id']} ('{job['target_url']}') failed: {e}")
+
+    await asyncio.gather(*(run(job) for job in jobs))
+
+@app.post("/api/crawl/batch")
+async def start_crawl_batch(request: BatchCrawlRequest, background_tasks: BackgroundTasks):
+    """
+    Starts one crawl job per keyword in a single request, e.g. one per class of a dataset.
+    The job rows are created with one insert and queued in one transaction; the worker pool
+    then spreads them over its processes, where concurrent jobs share connections, provider
+    rate-limit buckets, the search cache and the dedup index. Repeated keywords are crawled once.
+    Progress of the whole batch is at GET /api/crawl/batches/{batch_id}.
+    """
+    supabase = get_supabase()
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase client not initialized.")
+
+    items = {}
+    for item in request.keywords:
+        if isinstance(item, str):
+            item = BatchCrawlItem(keyword=item)
+        keyword = item.keyword.strip()
+        limit = request.limit if item.limit is None else item.limit
+        if keyword and keyword.lower() not in items:
+            items[keyword.lower()] = (keyword, limit, item.variants)
+    if not items:
+        raise HTTPException(status_code=400, detail="No keywords given.")
+    if len(items) > config.BATCH_MAX_KEYWORDS:
+        raise HTTPException(status_code=400, detail=f"At most {config.BATCH_MAX_KEYWORDS} keywords per batch.")
+    if any(limit <= 0 for _, limit, _ in items.values()):
+        raise HTTPException(status_code=400, detail="Limits must be positive.")
+
+    batch_id = str(uuid.uuid4())
+    jobs = [_new_crawl_job(str(uuid.uuid4()), keyword, limit, batch_id, _crawl_options(request.expand, variants))
+            for keyword, limit, variants in items.values()]
+    try:
+        response_insert_jobs = await asyncio.to_thread(lambda: supabase.table("crawl_jobs").insert(jobs).execute())
+        if not response_insert_jobs.data:
+            raise HTTPException(status_code=500, detail="Failed to create crawl jobs: No data returned.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Exception inserting crawl jobs for batch {batch_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Exception creating crawl jobs: {e}")
+
+    if config.JOB_QUEUE_BACKEND == "inline":
+        background_tasks.add_task(run_crawl_batch, jobs)
+    else:
+        try:
+            await asyncio.to_thread(job_queue.get_queue().enqueue_many,
+                                    [(job["id"], job["target_url"], job["crawl_depth"]) for job in jobs],
+                                    request.priority, {"batch_id": batch_id},
+                                    [job["options"] for job in jobs])
+        except Exception as e:
+            print(f"Exception enqueuing crawl batch {batch_id}: {e}")
+            raise HTTPException(status_code=500, detail=f"Exception queuing crawl batch: {e}")
+
+    print(f"Crawl batch {batch_id} started with {len(jobs)} keywords.")
+    return {"message": "Batch crawl initiated", "batch_id": batch_id,
+            "jobs": [{"job_id": job["id"], "keyword": job["target_url"], "limit": job["crawl_depth"]} for job in jobs]}
+
+@app.get("/api/crawl/batches/{batch_id}")
+async def get_crawl_batch(batch_id: str):
+    """
+    Aggregate progress of a batch: jobs per status, images collected against the summed limits,
+    and the state of every keyword. Image counts follow the running jobs' progress updates.
+    """
+    supabase = get_supabase()
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase client not initialized.")
+
+    def read_jobs(page_size: int = 1000):
+        rows, offset = [], 0
+        while True:
+            page = (supabase.table("crawl_jobs").select("id, status, target_url, crawl_depth, image_count, errors")
+                    .eq("batch_id", batch_id).order("id").range(offset, offset + page_size - 1).execute().data or [])
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            offset += page_size
+
+    try:
+        jobs = await asyncio.to_thread(read_jobs)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Exception fetching crawl batch: {e}")
+    if not jobs:
+        raise HTTPException(status_code=404, detail=f"Crawl batch {batch_id} not found.")
+
+    statuses: Dict[str, int] = {}
+    for job in jobs:
+        statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+    collected = sum(job.get("image_count") or 0 for job in jobs)
+    # A job never counts more than its own limit towards the batch
+    target = sum(job.get("crawl_depth") or 0 for job in jobs)
+    filled = sum(min(job.get("image_count") or 0, job.get("crawl_depth") or 0) for job in jobs)
+    active = statuses.get("pending", 0) + statuses.get("running", 0)
+    return {
+        "batch_id": batch_id,
+        "status": "running" if active else "done",
+        "jobs": len(jobs),
+        "statuses": statuses,
+        "image_count": collected,
+        "limit": target,
+        "progress": round(filled / target, 4) if target else 1.0,
+        "keywords": [{
+            "job_id": job["id"],
+            "keyword": job["target_url"],
+            "status": job["status"],
+            "image_count": job.get("image_count") or 0,
+            "limit": job["crawl_depth"],
+            "error_count": len(job.get("errors") or []),
+        } for job in jobs],
+    }
+
+@app.post("/api/crawl/jobs/{job_id}/cancel")
+async def cancel_crawl_job(job_id: str):
+    if config.JOB_QUEUE_BACKEND == "inline":
+        raise HTTPException(status_code=400, detail="Cancellation requires the job queue backend.")
+
+    status = await asyncio.to_thread(job_queue.get_queue().request_cancel, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Crawl job {job_id} not found in queue.")
+    supabase = get_supabase()
+    if status == job_queue.CANCELLED and supabase:
+        # Never started: close the crawl_jobs row here; running jobs close it themselves
+        await asyncio.to_thread(lambda: supabase.table("crawl_jobs").update({
+            "status": "cancelled",
+            "end_time": datetime.now().isoformat(),
+        }).eq("id", job_id).execute())
+    return {"message": "Cancellation requested", "job_id": job_id, "status": status}
+
+@app.post("/api/crawl/jobs/{job_id}/retry")
+async def retry_crawl_job(job_id: str, background_tasks: BackgroundTasks):
+    """
+    Restarts a failed or cancelled job from its checkpoints: images it already collected are kept
+    and pages it already fetched are not requested from the providers again. The job runs with
+    the options (expand, variants) it was started with.
+    """
+    supabase = get_supabase()
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Supabase client not initialized.")
+
+    result = await asyncio.to_thread(lambda: supabase.table("crawl_jobs").select(
+        "id, status, target_url, crawl_depth, options").eq("id", job_id).execute())
+    if not result.data:
+        raise HTTPException(status_code=404, detail=f"Crawl job {job_id} not found.")
+    job = result.data[0]
+    if job["status"] not in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Crawl job {job_id} is {job['status']}; only failed or cancelled jobs can be retried.")
+    keyword, limit = job["target_url"], job["crawl_depth"]
+    options = job.get("options") or {}
+
+    if config.JOB_QUEUE_BACKEND != "inline":
+        queued = await asyncio.to_thread(job_queue.get_queue().get, job_id)
+        if queued and queued["status"] in (job_queue.QUEUED, job_queue.RUNNING):
+            raise HTTPException(status_code=409, detail=f"Crawl job {job_id} is still {queued['status']} in the queue.")
+
+    await asyncio.to_thread(lambda: supabase.table("crawl_jobs").update({
+        "status": "pending",
+        "end_time": None,
+        "errors": [],
+        "pid": None
+    }).eq("id", job_id).execute())
+
+    if config.JOB_QUEUE_BACKEND == "inline":
+        background_tasks.add_task(run_image_search_in_background, keyword, limit, job_id,
+                                  expand=options.get("expand"), variants=options.get("variants"), resume=True)
+    else:
+        # Tells the worker to resume with the job's original options, even if the queue no longer knows the job
+        try:
+            await asyncio.to_thread(job_queue.get_queue().requeue, job_id, keyword, limit,
+                                    dict(options, resume=True))
+        except Exception as e:
+            print(f"Exception requeuing crawl job {job_id}: {e}")
+            raise HTTPException(status_code=500, detail=f"Exception queuing crawl job: {e}")
+
+    return {"message": "Crawl job restarted from its checkpoint", "job_id": job_id}
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,466 @@
+import asyncio
+import contextvars
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
+
+from lib.shared import config
+
+# Latency buckets (seconds) shared by the timing histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            return [(key, self._copy(value)) for key, value in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (requests, errors, retries)."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (work in flight)."""
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inflight(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, plus their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def _copy(self, value):
+        return {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Registry:
+    """Holds the process's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly copy of every metric, used to share metrics between processes."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                "type": metric.kind,
+                "help": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "samples": [[list(key), value] for key, value in metric.samples()],
+            }
+            for metric in metrics
+        }
+
+
+def _merge(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Adds up the samples of several process snapshots, metric by metric and label set by label set."""
+    merged: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for key, value in metric["samples"]:
+                key = tuple(key)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value if not isinstance(value, dict) else {
+                        "buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                elif isinstance(value, dict):
+                    current["buckets"] = [a + b for a, b in zip(current["buckets"], value["buckets"])]
+                    current["sum"] += value["sum"]
+                    current["count"] += value["count"]
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+
+def render(snapshot: Dict[str, Any]) -> str:
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        labelnames = tuple(metric["labelnames"])
+        samples = metric["samples"]
+        if isinstance(samples, list):
+            samples = {tuple(key): value for key, value in samples}
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key, value in sorted(samples.items()):
+            if metric["type"] == "histogram":
+                for bound, count in zip(list(metric["buckets"]) + [float("inf")],
+                                        value["buckets"] + [value["count"]]):
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labelnames, key)} {value['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Hot-path metrics ---
+
+PROVIDER_REQUEST_SECONDS = histogram(
+    "provider_request_seconds", "Latency of one provider search page.", ("source", "cached"))
+PROVIDER_ERRORS = counter(
+    "provider_errors_total", "Provider search pages that failed.", ("source", "reason"))
+PROVIDER_IN_FLIGHT = gauge(
+    "provider_requests_in_flight", "Provider search pages being fetched.", ("source",))
+RATE_LIMIT_WAIT_SECONDS = histogram(
+    "rate_limit_wait_seconds", "Time spent waiting for a provider rate-limit token.", ("source",))
+HTTP_REQUESTS = counter(
+    "http_requests_total", "HTTP responses received by the shared clients.", ("client",))
+HTTP_RETRIES = counter(
+    "http_retries_total", "HTTP retries (429, 5xx, connection errors) by the shared clients.", ("client",))
+DB_WRITE_SECONDS = histogram(
+    "db_write_seconds", "Latency of one Supabase bulk write statement.", ("table",))
+DB_WRITE_ROWS = counter(
+    "db_write_rows_total", "Rows handed to Supabase bulk writes.", ("table", "outcome"))
+DB_WRITES_IN_FLIGHT = gauge(
+    "db_writes_in_flight", "Supabase chunk writes in flight.", ("table",))
+IMAGE_DOWNLOAD_SECONDS = histogram(
+    "image_download_seconds", "Time to download, verify and store one image.", ("outcome",))
+IMAGE_DOWNLOADS_IN_FLIGHT = gauge(
+    "image_downloads_in_flight", "Image downloads in flight.")
+JOB_PHASE_SECONDS = histogram(
+    "job_phase_seconds", "Time crawl jobs spend in each phase.", ("phase",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+JOBS = counter(
+    "crawl_jobs_total", "Crawl jobs finished, by final status.", ("status",))
+JOBS_IN_FLIGHT = gauge(
+    "crawl_jobs_in_flight", "Crawl jobs running.")
+JOB_IMAGES = counter(
+    "crawl_job_images_total", "Images accepted by crawl jobs, by source.", ("source",))
+ZIP_ENTRIES = counter(
+    "zip_export_entries_total", "Images handled by ZIP exports.", ("outcome",))
+ZIP_EXPORT_SECONDS = histogram(
+    "zip_export_seconds", "Time to stream one ZIP export.")
+DATASET_SAMPLES = counter(
+    "dataset_export_samples_total", "Images handled by WebDataset exports.", ("outcome",))
+MODEL_TEST_IMAGES = counter(
+    "model_test_images_total", "Images run through model plugins, by result.", ("model", "result"))
+MODEL_BATCH_SECONDS = histogram(
+    "model_batch_seconds", "Time to decode, resize and run one batch through a model.", ("model",))
+
+
+# --- Per-job trace spans ---
+
+_trace: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def start_trace() -> List[Dict[str, Any]]:
+    """
+    Starts collecting spans for the current task (a crawl job).
+    Tasks and worker threads started from it inherit the trace through contextvars.
+    """
+    spans: List[Dict[str, Any]] = []
+    _trace.set(spans)
+    return spans
+
+
+@contextmanager
+def span(name: str, histogram: Optional[Histogram] = None, **labels):
+    """
+    Times a block: the duration is observed on `histogram` (with `labels`) and, when a trace
+    is active, recorded as a span. At most METRICS_TRACE_MAX_SPANS spans are kept per trace.
+    """
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        if histogram is not None:
+            histogram.observe(duration, **labels)
+        spans = _trace.get()
+        if spans is not None and len(spans) < config.METRICS_TRACE_MAX_SPANS:
+            record = {"name": name, "start": round(started_at, 3), "seconds": round(duration, 4), **labels}
+            if error:
+                record["error"] = error
+            spans.append(record)
+
+
+# --- Multi-process export ---
+# Worker processes periodically write their snapshot to METRICS_DIR; the API's /metrics adds
+# them to its own. Snapshots are named after the process's pid and start time, so a new process
+# that reuses a pid never overwrites an old one. Counters and histograms of exited processes are
+# folded into one cumulative file before their snapshot is deleted, so totals never go backwards;
+# gauges are only taken from processes that are still alive.
+
+EXITED_SNAPSHOT = "exited-metrics.json"
+_process: Optional[Tuple[int, int]] = None
+
+
+def _process_id() -> Tuple[int, int]:
+    """(pid, start time in ms) of this process; recomputed after a fork."""
+    global _process
+    if _process is None or _process[0] != os.getpid():
+        _process = (os.getpid(), int(time.time() * 1000))
+    return _process
+
+
+def _snapshot_path(pid: int, started: int) -> str:
+    return os.path.join(config.METRICS_DIR, f"metrics-{pid}-{started}.json")
+
+
+def _write_json(path: str, data: Any):
+    """Writes `data` to `path` atomically, via a temp file in the same directory."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_snapshot():
+    """Writes this process's metrics to METRICS_DIR."""
+    if not config.METRICS_DIR:
+        return
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    _write_json(_snapshot_path(*_process_id()), REGISTRY.snapshot())
+
+
+async def export_loop():
+    """Keeps this process's snapshot in METRICS_DIR fresh (run as a task in worker processes)."""
+    while True:
+        try:
+            await asyncio.to_thread(write_snapshot)
+        except Exception as e:
+            print(f"Could not export metrics: {e}")
+        await asyncio.sleep(config.METRICS_EXPORT_INTERVAL)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshot_files() -> Tuple[Dict[str, Tuple[int, int]], Dict[str, Tuple[int, int]]]:
+    """
+    Splits the snapshots in METRICS_DIR into (live, exited) {path: (pid, started)}. Only one process
+    can hold a pid at a time, so of several snapshots with the same pid all but the newest are
+    from exited processes (this process's own pid only counts for itself).
+    """
+    by_pid: Dict[int, List[Tuple[int, str]]] = {}
+    for path in glob.glob(os.path.join(config.METRICS_DIR, "metrics-*.json")):
+        try:
+            # metrics-<pid>-<started>.json; snapshots written before the start time was added lack it
+            parts = os.path.basename(path)[len("metrics-"):-len(".json")].split("-")
+            pid, started = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
+        except ValueError:
+            continue
+        by_pid.setdefault(pid, []).append((started, path))
+    own_pid, own_started = _process_id()
+    live, exited = {}, {}
+    for pid, files in by_pid.items():
+        if pid == own_pid:
+            current = own_started
+        else:
+            current = max(started for started, _ in files) if _pid_alive(pid) else None
+        for started, path in files:
+            (live if started == current else exited)[path] = (pid, started)
+    return live, exited
+
+
+def _fold_exited(exited: List[str]) -> Dict[str, Any]:
+    """
+    Adds the counters and histograms of exited processes' snapshots to EXITED_SNAPSHOT, deletes
+    those snapshots and returns the cumulative snapshot. Runs under an exclusive lock so API
+    processes collecting at the same time fold each file once; a file that was folded but not yet
+    deleted (a crash in between) is listed in `folded` and only deleted.
+    """
+    path = os.path.join(config.METRICS_DIR, EXITED_SNAPSHOT)
+    if not exited:
+        try:
+            with open(path) as exited_file:
+                return json.load(exited_file)["snapshot"]
+        except FileNotFoundError:
+            return {}
+    import fcntl # Unix only, like the os.kill liveness check
+
+    with open(os.path.join(config.METRICS_DIR, ".exited.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(path) as exited_file:
+                state = json.load(exited_file)
+        except FileNotFoundError:
+            state = {"snapshot": {}, "folded": []}
+        folded = set(state["folded"])
+        snapshots = [state["snapshot"]]
+        for snapshot_path in exited:
+            name = os.path.basename(snapshot_path)
+            if name in folded:
+                continue
+            try:
+                with open(snapshot_path) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except FileNotFoundError:
+                continue # Folded and deleted by another process since it was listed
+            except (ValueError, OSError) as e:
+                print(f"Skipping metrics snapshot {snapshot_path}: {e}")
+                continue
+            snapshots.append({name: metric for name, metric in snapshot.items() if metric["type"] != "gauge"})
+            folded.add(name)
+        if len(snapshots) > 1:
+            merged = _merge(snapshots)
+            state["snapshot"] = {name: dict(metric, samples=[[list(key), value] for key, value in metric["samples"].items()])
+                                 for name, metric in merged.items()}
+        state["folded"] = sorted(folded)
+        _write_json(path, state)
+        for snapshot_path in exited:
+            if os.path.basename(snapshot_path) in folded:
+                try:
+                    os.remove(snapshot_path)
+                except FileNotFoundError:
+                    pass
+        # Deleted snapshots no longer need to be remembered
+        state["folded"] = sorted(name for name in folded
+                                 if os.path.exists(os.path.join(config.METRICS_DIR, name)))
+        _write_json(path, state)
+    return state["snapshot"]
+
+
+def collect() -> str:
+    """Prometheus text for this process plus every worker process that exported a snapshot."""
+    snapshots = [REGISTRY.snapshot()]
+    if config.METRICS_DIR and os.path.isdir(config.METRICS_DIR):
+        live, exited = _snapshot_files()
+        snapshots.append(_fold_exited(list(exited)))
+        own_path = _snapshot_path(*_process_id())
+        for path in live:
+            if path == own_path:
+                continue
+            try:
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (ValueError, OSError) as e:
+                print(f"Skipping metrics snapshot {path}: {e}")
+    return render(_merge(snapshots))
@@ -0,0 +1,116 @@
+import importlib
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from lib.shared import config
+
+
+def content_box(original_size: Tuple[int, int], size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    (left, top, width, height) of an `original_size` image letterboxed into `size`: shrunk to fit
+    with its aspect ratio kept (never enlarged) and centred.
+    """
+    scale = min(1.0, size[0] / original_size[0], size[1] / original_size[1])
+    width = min(size[0], max(1, round(original_size[0] * scale)))
+    height = min(size[1], max(1, round(original_size[1] * scale)))
+    return (size[0] - width) // 2, (size[1] - height) // 2, width, height
+
+
+class PreparedImage:
+    """
+    A decoded image letterboxed for a model: raw pixel bytes in `mode` ("L" or "RGB"), row-major,
+    always the plugin's `input_size`. `content_box` is the (left, top, width, height) region that
+    holds the image; the rest is padding.
+    """
+
+    def __init__(self, image_id: str, mode: str, size: Tuple[int, int], pixels: bytes,
+                 original_size: Tuple[int, int], content_box: Optional[Tuple[int, int, int, int]] = None):
+        self.image_id = image_id
+        self.mode = mode
+        self.size = size
+        self.pixels = pixels
+        self.original_size = original_size
+        self.content_box = content_box or (0, 0, size[0], size[1])
+
+    def to_pil(self):
+        from PIL import Image
+
+        return Image.frombytes(self.mode, self.size, self.pixels)
+
+    def cropped(self) -> "PreparedImage":
+        """The image without its padding, for models that work on the content at any size."""
+        left, top, width, height = self.content_box
+        if (width, height) == tuple(self.size):
+            return self
+        bands = len(self.pixels) // (self.size[0] * self.size[1])
+        stride = self.size[0] * bands
+        pixels = b"".join(self.pixels[row * stride + left * bands:row * stride + (left + width) * bands]
+                          for row in range(top, top + height))
+        return PreparedImage(self.image_id, self.mode, (width, height), pixels, self.original_size)
+
+
+class ModelPlugin:
+    """
+    Interface for models tested against the collected images.
+
+    A plugin declares its id, display name and version (results are keyed on id and version,
+    so bumping the version re-tests every image) and the input it wants: `input_mode` and
+    `input_size`. Images are letterboxed to exactly `input_size` (shrunk with the aspect ratio kept,
+    padded with `input_fill`) so batches have one shape; PreparedImage.content_box says where the
+    image is and `cropped()` drops the padding. `load()` runs once in every
+    process that executes the model; `predict_batch()` gets a batch of PreparedImage and returns
+    one prediction per image, each a dict with `positive` (bool), `score` (float) and optional
+    `details`.
+    """
+
+    model_id: str = ""
+    name: str = ""
+    version: str = "1"
+    input_mode: str = "RGB"
+    input_size: Tuple[int, int] = (224, 224)
+    input_fill: int = 0 # Padding value of every band
+
+    def load(self):
+        pass
+
+    def predict_batch(self, images: List[PreparedImage]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+_registry: Dict[str, ModelPlugin] = {}
+_discovered = False
+_discover_lock = threading.Lock()
+
+
+def register(plugin: ModelPlugin) -> ModelPlugin:
+    if not plugin.model_id:
+        raise ValueError("Model plugins need a model_id")
+    _registry[plugin.model_id] = plugin
+    return plugin
+
+
+def discover():
+    """Imports the modules listed in MODEL_PLUGIN_MODULES once; each registers its plugins on import."""
+    global _discovered
+    with _discover_lock:
+        if _discovered:
+            return
+        for module_name in config.MODEL_PLUGIN_MODULES:
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                print(f"Could not load model plugin module {module_name}: {e}")
+        _discovered = True
+
+
+def get_plugin(model_id: str) -> ModelPlugin:
+    discover()
+    try:
+        return _registry[model_id]
+    except KeyError:
+        raise KeyError(f"Unknown model plugin {model_id!r}; known: {', '.join(sorted(_registry)) or 'none'}")
+
+
+def get_plugins() -> List[ModelPlugin]:
+    discover()
+    return list(_registry.values())
@@ -0,0 +1,298 @@
+"""
+Batched model-test runner.
+
+Runs a model plugin (see api/model_plugins.py) over collected images and stores one
+model_test_results row per image:
+
+    python -m api.model_runner --model qr_detector --keyword pattern --expect negative
+
+Images are paged from image_metadata with the indexed search. Images with a model-input
+derivative (see api/derivatives.py) are used as stored; the rest are read from the local store
+(or downloaded), then decoded, resized and run through the model in batches in a process pool.
+Results are bulk-upserted on (image_id, model_id, version), and images that already have a
+pass/fail result for the same model version are skipped, so an interrupted run resumes where it
+stopped and images that failed to decode or run are tested again.
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from api import db_writer, derivatives, http_client, image_search, metrics, model_plugins, supabase_client, zip_stream
+from lib.shared import config
+
+EXPECTATIONS = ("negative", "positive", "none")
+IMAGE_COLUMNS = ["id", "url", "content_hash", "format"]
+
+# --- Process pool side ---
+
+_worker_plugin: Optional[model_plugins.ModelPlugin] = None
+
+
+def _init_worker(model_id: str):
+    """Loads the plugin once per pool process."""
+    global _worker_plugin
+    _worker_plugin = model_plugins.get_plugin(model_id)
+    _worker_plugin.load()
+
+
+def prepare_image(image_id: str, content: bytes, mode: str, size: Tuple[int, int],
+                  fill: int = 0) -> model_plugins.PreparedImage:
+    """Decodes image bytes and letterboxes them to `size` (see derivatives.letterbox_image)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(content)) as image:
+        original_size = image.size
+        converted = derivatives.letterbox_image(image, mode, size, original_size, fill)
+    return model_plugins.PreparedImage(image_id, mode, converted.size, converted.tobytes(), original_size,
+                                       model_plugins.content_box(original_size, size))
+
+
+def run_batch(batch: List[Tuple[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Decodes and runs one batch of (image_id, image bytes or PreparedImage from the derivative store);
+    returns (image_id, prediction or {'error': ...}) in batch order.
+    Raises ValueError when the plugin does not return one prediction per image.
+    """
+    plugin = _worker_plugin
+    outputs: Dict[str, Dict[str, Any]] = {}
+    prepared = []
+    for image_id, content in batch:
+        if isinstance(content, model_plugins.PreparedImage):
+            prepared.append(content)
+            continue
+        try:
+            prepared.append(prepare_image(image_id, content, plugin.input_mode, plugin.input_size,
+                                              plugin.input_fill))
+        except Exception as e:
+            outputs[image_id] = {"error": f"Could not decode image: {e}"}
+    if prepared:
+        try:
+            predictions = list(plugin.predict_batch(prepared))
+        except Exception as e:
+            predictions = [{"error": f"Model failed on batch: {e}"}] * len(prepared)
+        if len(predictions) != len(prepared):
+            raise ValueError(f"Model plugin {plugin.model_id} returned {len(predictions)} predictions "
+                             f"for a batch of {len(prepared)} images")
+        for image, prediction in zip(prepared, predictions):
+            outputs[image.image_id] = prediction
+    return [(image_id, outputs[image_id]) for image_id, _ in batch]
+
+
+# --- Orchestration ---
+
+def result_label(prediction: Dict[str, Any], expect: str) -> str:
+    if "error" in prediction:
+        return "error"
+    if expect == "none":
+        return "pass"
+    return "pass" if bool(prediction.get("positive")) == (expect == "positive") else "fail"
+
+
+class ModelTestRunner:
+    """
+    Runs one model plugin over the images matching `search`.
+
+    Downloads for the next batches overlap with inference on the current ones; at most
+    `processes * 2` batches are queued on the pool. `processes=0` runs the model in a thread
+    of this process instead (for models that must stay in one process, e.g. on a GPU).
+    `expect` is what the test expects the model to say for these images: "negative" (e.g. no
+    QR code, for false-positive testing), "positive", or "none" to only record predictions.
+    Download failures are reported but not stored, so a rerun retries those images. Decode and
+    model errors are stored with result "error" but do not count as tested: a rerun tests those
+    images again and overwrites their rows.
+    Pass `store=None` with `use_derivatives=False` to always decode the original images.
+    """
+
+    def __init__(self, supabase, model_id: str, search: image_search.ImageSearch, expect: str = "negative",
+                 batch_size: Optional[int] = None, processes: Optional[int] = None, limit: Optional[int] = None,
+                 store: Optional[derivatives.DerivativeStore] = None, use_derivatives: bool = True):
+        if expect not in EXPECTATIONS:
+            raise ValueError(f"expect must be one of {EXPECTATIONS}")
+        self.supabase = supabase
+        self.plugin = model_plugins.get_plugin(model_id)
+        self.search = search
+        self.expect = expect
+        self.batch_size = batch_size or config.MODEL_TEST_BATCH_SIZE
+        self.processes = config.MODEL_TEST_PROCESSES if processes is None else processes
+        self.limit = limit
+        if store is None and use_derivatives and os.path.exists(
+                os.path.join(config.DERIVATIVE_STORE_PATH, "index.sqlite3")):
+            store = derivatives.get_store()
+        self.store = store
+        self.input_spec = derivatives.model_input_spec(self.plugin)
+        self.counts = {"pass": 0, "fail": 0, "error": 0, "skipped": 0, "download_failed": 0, "from_derivatives": 0}
+        self.errors: List[str] = []
+
+    def tested_ids(self, page_size: int = 1000) -> Set[str]:
+        """Ids of images that already have a pass/fail result for this model version."""
+        tested: Set[str] = set()
+        offset = 0
+        while True:
+            response = (self.supabase.table("model_test_results").select("image_id, result")
+                        .eq("model_id", self.plugin.model_id).eq("version", self.plugin.version)
+                        .order("image_id").range(offset, offset + page_size - 1).execute())
+            rows = response.data or []
+            tested.update(str(row["image_id"]) for row in rows if row.get("result") != "error")
+            if len(rows) < page_size:
+                return tested
+            offset += page_size
+
+    def _result_row(self, image_id: str, prediction: Dict[str, Any]) -> Dict[str, Any]:
+        details = dict(prediction.get("details") or {})
+        if "error" in prediction:
+            details["error"] = prediction["error"]
+        else:
+            details["positive"] = bool(prediction.get("positive"))
+        details["expect"] = self.expect
+        return {
+            "image_id": image_id,
+            "model_id": self.plugin.model_id,
+            "model_name": self.plugin.name,
+            "version": self.plugin.version,
+            "test_date": datetime.now().isoformat(),
+            "result": result_label(prediction, self.expect),
+            "score": prediction.get("score"),
+            "details": details,
+        }
+
+    async def _fetch_batch(self, rows: List[Dict[str, Any]], slots: asyncio.Semaphore) -> List[Tuple[str, Any]]:
+        stored: Dict[str, derivatives.Derivative] = {}
+        if self.store is not None:
+            stored = await asyncio.to_thread(self.store.get_many, self.input_spec.name,
+                                             [str(row["id"]) for row in rows])
+            self.counts["from_derivatives"] += len(stored)
+
+        async def fetch(row):
+            if str(row["id"]) in stored:
+                return str(row["id"]), stored[str(row["id"])].to_prepared(self.input_spec.mode)
+            async with slots:
+                try:
+                    return str(row["id"]), await zip_stream.fetch_image_bytes(row)
+                except Exception as e:
+                    self.counts["download_failed"] += 1
+                    message = f"Could not load image {row['id']} ({row.get('url')}): {e}"
+                    print(message)
+                    self.errors.append(message)
+                    return None
+
+        return [item for item in await asyncio.gather(*(fetch(row) for row in rows)) if item is not None]
+
+    async def _infer(self, executor: Optional[ProcessPoolExecutor], batch: List[Tuple[str, bytes]]):
+        started = time.perf_counter()
+        if executor is None:
+            results = await asyncio.to_thread(run_batch, batch)
+        else:
+            results = await asyncio.get_running_loop().run_in_executor(executor, run_batch, batch)
+        metrics.MODEL_BATCH_SECONDS.observe(time.perf_counter() - started, model=self.plugin.model_id)
+        return results
+
+    async def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        tested = await asyncio.to_thread(self.tested_ids)
+        print(f"Testing {self.plugin.name} v{self.plugin.version}; {len(tested)} images already tested.")
+
+        # Images with a pass/fail row are skipped above, so an upsert only replaces earlier errors
+        writer = db_writer.BulkWriter(self.supabase, "model_test_results", on_conflict="image_id,model_id,version")
+        executor = None
+        if self.processes > 0:
+            executor = ProcessPoolExecutor(self.processes, initializer=_init_worker,
+                                           initargs=(self.plugin.model_id,))
+        else:
+            _init_worker(self.plugin.model_id)
+        max_pending = max(1, self.processes) * 2
+        download_slots = asyncio.Semaphore(config.IMAGE_DOWNLOAD_CONCURRENCY)
+        pending = set()
+        submitted = 0
+
+        async def drain(return_when):
+            nonlocal pending
+            done, pending = await asyncio.wait(pending, return_when=return_when)
+            for task in done:
+                for image_id, prediction in task.result():
+                    row = self._result_row(image_id, prediction)
+                    self.counts[row["result"]] += 1
+                    metrics.MODEL_TEST_IMAGES.inc(model=self.plugin.model_id, result=row["result"])
+                    await writer.add(row)
+
+        async def submit(rows):
+            batch = await self._fetch_batch(rows, download_slots)
+            if batch:
+                pending.add(asyncio.create_task(self._infer(executor, batch)))
+            while len(pending) >= max_pending:
+                await drain(asyncio.FIRST_COMPLETED)
+
+        try:
+            rows: List[Dict[str, Any]] = []
+            async for row in image_search.iter_rows(self.supabase, self.search, columns=IMAGE_COLUMNS):
+                if str(row["id"]) in tested:
+                    self.counts["skipped"] += 1
+                    continue
+                if self.limit is not None and submitted >= self.limit:
+                    break
+                rows.append(row)
+                submitted += 1
+                if len(rows) >= self.batch_size:
+                    await submit(rows)
+                    rows = []
+            if rows:
+                await submit(rows)
+            if pending:
+                await drain(asyncio.ALL_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+            await writer.flush()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        self.errors.extend(writer.errors)
+        elapsed = time.perf_counter() - started
+        tested_now = self.counts["pass"] + self.counts["fail"] + self.counts["error"]
+        summary = dict(self.counts, tested=tested_now, written=writer.written, elapsed_seconds=round(elapsed, 2),
+                       images_per_second=round(tested_now / elapsed, 2) if elapsed else None)
+        print(f"Model test finished: {summary}")
+        return summary
+
+
+def _create_supabase():
+    try:
+        return supabase_client.create_client()
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a model plugin over collected images.")
+    parser.add_argument("--model", help="Model plugin id (see --list)")
+    parser.add_argument("--list", action="store_true", help="List the available model plugins")
+    parser.add_argument("--keyword", help="Only test images matching this keyword/tag")
+    parser.add_argument("--source")
+    parser.add_argument("--format")
+    parser.add_argument("--expect", choices=EXPECTATIONS, default="negative")
+    parser.add_argument("--limit", type=int, help="Test at most this many new images")
+    parser.add_argument("--batch-size", type=int, default=config.MODEL_TEST_BATCH_SIZE)
+    parser.add_argument("--processes", type=int, default=config.MODEL_TEST_PROCESSES,
+                        help="Pool processes for decoding and inference (0 runs in this process)")
+    args = parser.parse_args()
+
+    if args.list or not args.model:
+        for plugin in model_plugins.get_plugins():
+            print(f"{plugin.model_id}\t{plugin.name} (v{plugin.version})")
+    else:
+        runner = ModelTestRunner(
+            _create_supabase(), args.model,
+            image_search.ImageSearch(args.keyword, source=args.source, format=args.format),
+            expect=args.expect, batch_size=args.batch_size, processes=args.processes, limit=args.limit)
+
+        async def main():
+            try:
+                await runner.run()
+            finally:
+                await http_client.close_async_session()
+
+        asyncio.run(main())
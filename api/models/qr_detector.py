@@ -0,0 +1,206 @@
+import itertools
+import math
+from typing import List, Dict, Any, Optional, Tuple
+
+from api import model_plugins
+
+# A finder pattern crossed through its centre reads dark:light:dark:light:dark = 1:1:3:1:1
+FINDER_RATIOS = (1, 1, 3, 1, 1)
+# Limits for three finder patterns to count as one QR code
+MAX_MODULE_RATIO = 1.4 # largest / smallest module size
+MAX_CORNER_COSINE = 0.2 # |cos| of the corner angle (0 = right angle)
+MIN_LEG_RATIO = 0.8 # shorter / longer side
+MIN_TIMING_AGREEMENT = 0.8 # fraction of timing-pattern modules that must read as expected
+
+
+def _matches_finder(runs: List[int]) -> Optional[float]:
+    """Returns the module size if five run lengths fit the 1:1:3:1:1 finder ratio."""
+    total = sum(runs)
+    if total < 7:
+        return None
+    module = total / 7.0
+    tolerance = module * 0.5
+    for run, ratio in zip(runs, FINDER_RATIOS):
+        if abs(run - module * ratio) > tolerance * ratio:
+            return None
+    return module
+
+
+def _runs_around(line: bytes, position: int) -> Optional[Tuple[List[int], float]]:
+    """
+    Measures the five finder runs through `position` (which must be dark) along one line of
+    0/1 pixels. Returns the run lengths and the centre of the middle run, or None.
+    """
+    if not line[position]:
+        return None
+    length = len(line)
+    start = position
+    while start > 0 and line[start - 1]:
+        start -= 1
+    end = position
+    while end < length - 1 and line[end + 1]:
+        end += 1
+    runs = [0, 0, end - start + 1, 0, 0]
+
+    cursor = start - 1
+    for index, dark in ((1, 0), (0, 1)):
+        while cursor >= 0 and line[cursor] == dark:
+            runs[index] += 1
+            cursor -= 1
+    cursor = end + 1
+    for index, dark in ((3, 0), (4, 1)):
+        while cursor < length and line[cursor] == dark:
+            runs[index] += 1
+            cursor += 1
+    if 0 in runs:
+        return None
+    return runs, (start + end) / 2.0
+
+
+def find_finder_patterns(bits: bytes, width: int, height: int) -> List[Dict[str, float]]:
+    """
+    Locates QR finder patterns in a binarized image (one byte per pixel, 1 = dark).
+    Rows are scanned for 1:1:3:1:1 runs, every hit is cross-checked along its column, and hits
+    belonging to the same pattern are merged. Returns centres, module sizes and hit counts.
+    """
+    candidates = []
+    for y in range(height):
+        row = bits[y * width:(y + 1) * width]
+        x = 0
+        runs = []
+        for dark, group in itertools.groupby(row):
+            run = len(list(group))
+            runs.append((dark, x, run))
+            x += run
+        for i in range(len(runs) - 4):
+            if not runs[i][0]:
+                continue
+            window = runs[i:i + 5]
+            module = _matches_finder([run for _, _, run in window])
+            if module is None:
+                continue
+            centre_x = int(window[2][1] + window[2][2] / 2)
+            vertical = _runs_around(bits[centre_x::width], y)
+            if vertical is None:
+                continue
+            vertical_module = _matches_finder(vertical[0])
+            if vertical_module is None or max(module, vertical_module) > 1.6 * min(module, vertical_module):
+                continue
+            candidates.append((centre_x, vertical[1], (module + vertical_module) / 2))
+
+    clusters: List[List[float]] = [] # [sum_x, sum_y, sum_module, count]
+    for x, y, module in candidates:
+        for cluster in clusters:
+            count = cluster[3]
+            if math.hypot(cluster[0] / count - x, cluster[1] / count - y) <= 2 * cluster[2] / count:
+                cluster[0] += x
+                cluster[1] += y
+                cluster[2] += module
+                cluster[3] += 1
+                break
+        else:
+            clusters.append([x, y, module, 1])
+    return [{"x": c[0] / c[3], "y": c[1] / c[3], "module": c[2] / c[3], "hits": c[3]}
+            for c in clusters if c[3] >= 2]
+
+
+def _corner_confidence(corner: Dict[str, float], a: Dict[str, float], b: Dict[str, float]) -> float:
+    """How well three finder patterns form a QR code's corner: right angle, equal legs, plausible size."""
+    ax, ay = a["x"] - corner["x"], a["y"] - corner["y"]
+    bx, by = b["x"] - corner["x"], b["y"] - corner["y"]
+    leg_a, leg_b = math.hypot(ax, ay), math.hypot(bx, by)
+    module = (corner["module"] + a["module"] + b["module"]) / 3
+    # Finder centres of the smallest QR code (21 modules) are 14 modules apart
+    if min(leg_a, leg_b) < 12 * module:
+        return 0.0
+    cosine = abs(ax * bx + ay * by) / (leg_a * leg_b)
+    leg_ratio = min(leg_a, leg_b) / max(leg_a, leg_b)
+    if cosine > MAX_CORNER_COSINE or leg_ratio < MIN_LEG_RATIO:
+        return 0.0
+    return (1 - cosine) * leg_ratio
+
+
+def _timing_agreement(bits: bytes, width: int, height: int, corner: Dict[str, float],
+                      a: Dict[str, float], b: Dict[str, float]) -> float:
+    """
+    Fraction of the two timing patterns (the alternating modules on row and column 6 between the
+    finder patterns) that read as expected, with the module grid spanned by the finder centres.
+    Samples outside the image count as mismatches; returns 0 when no QR code size fits.
+    """
+    # Module sizes are measured along rows and columns, so a rotated code reads them too large
+    angle = math.atan2(a["y"] - corner["y"], a["x"] - corner["x"])
+    module = (corner["module"] + a["module"] + b["module"]) / 3 * max(abs(math.cos(angle)), abs(math.sin(angle)))
+    legs = (math.hypot(a["x"] - corner["x"], a["y"] - corner["y"])
+            + math.hypot(b["x"] - corner["x"], b["y"] - corner["y"])) / 2
+    # Versions 1-40 are 21-177 modules wide, and finder centres sit 7 modules less apart. The
+    # module estimate is rough for larger codes, so the neighbouring versions are tried too.
+    estimate = round((legs / module + 7 - 17) / 4)
+    best = 0.0
+    for version in range(max(1, estimate - 1), min(40, estimate + 1) + 1):
+        span = 4 * version + 10
+        step_a = ((a["x"] - corner["x"]) / span, (a["y"] - corner["y"]) / span)
+        step_b = ((b["x"] - corner["x"]) / span, (b["y"] - corner["y"]) / span)
+        matches = total = 0
+        for index in range(8, 4 * version + 9):
+            # Module centres relative to the corner finder's centre (module 3, 3)
+            for i, j in ((index, 6), (6, index)):
+                x = int(round(corner["x"] + (i - 3) * step_a[0] + (j - 3) * step_b[0]))
+                y = int(round(corner["y"] + (i - 3) * step_a[1] + (j - 3) * step_b[1]))
+                if 0 <= x < width and 0 <= y < height:
+                    matches += bits[y * width + x] == (index % 2 == 0)
+                total += 1
+        best = max(best, matches / total)
+    return best
+
+
+class QRDetector(model_plugins.ModelPlugin):
+    """
+    Reference QR code detector in pure Python (Pillow only, CPU).
+
+    Images are binarized at their mean brightness and searched for the three finder patterns
+    of a QR code. `positive` means three patterns with consistent module sizes form a
+    right-angled corner with equal sides, and the timing patterns between them alternate as
+    they do in a QR code; `score` is how closely they fit. Meant as the baseline plugin for
+    false-positive testing on pattern images, not as a production decoder. Check changes
+    against noise with `python -m bench.qr_negatives`.
+    """
+
+    model_id = "qr_detector"
+    name = "QR Detector (finder patterns)"
+    version = "2"
+    input_mode = "L"
+    input_size = (400, 400)
+    input_fill = 255 # White padding reads as quiet zone
+
+    def predict_one(self, image: model_plugins.PreparedImage) -> Dict[str, Any]:
+        image = image.cropped() # The padding would skew the threshold
+        width, height = image.size
+        pixels = image.pixels
+        threshold = sum(pixels) // max(1, len(pixels))
+        bits = pixels.translate(bytes(1 if value < threshold else 0 for value in range(256)))
+        patterns = sorted(find_finder_patterns(bits, width, height), key=lambda p: -p["hits"])[:12]
+
+        best, best_corner = 0.0, None
+        for first, second, third in itertools.combinations(patterns, 3):
+            modules = [first["module"], second["module"], third["module"]]
+            if max(modules) > MAX_MODULE_RATIO * min(modules):
+                continue
+            for corner, a, b in ((first, second, third), (second, first, third), (third, first, second)):
+                confidence = _corner_confidence(corner, a, b)
+                if confidence <= best:
+                    continue
+                timing = _timing_agreement(bits, width, height, corner, a, b)
+                if timing >= MIN_TIMING_AGREEMENT and confidence * timing > best:
+                    best, best_corner = confidence * timing, (corner, a, b)
+
+        scale = image.original_size[0] / width
+        details = {"finder_patterns": len(patterns), "scale": round(scale, 3)}
+        if best_corner:
+            details["corners"] = [[round(p["x"] * scale, 1), round(p["y"] * scale, 1)] for p in best_corner]
+        return {"positive": best_corner is not None, "score": round(best, 4), "details": details}
+
+    def predict_batch(self, images: List[model_plugins.PreparedImage]) -> List[Dict[str, Any]]:
+        return [self.predict_one(image) for image in images]
+
+
+model_plugins.register(QRDetector())
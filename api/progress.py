@@ -0,0 +1,139 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional, Callable, List
+
+from api import metrics
+from lib.shared import config
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# Progress of jobs running in this process (inline backend, or the worker's own jobs)
+_active: Dict[str, "JobProgress"] = {}
+
+
+class JobProgress:
+    """
+    Live progress of one crawl job: per-source counts, throughput, errors and ETA.
+
+    `publish()` is called as pages are accepted; at most once per PROGRESS_PUBLISH_INTERVAL it
+    hands a snapshot to `sink` (e.g. the job queue, so the API process can stream it) and
+    writes the running image_count to the crawl_jobs row.
+    Phase changes are timed into the job_phase_seconds histogram and the job's trace, whose
+    spans are included in the final snapshot.
+    """
+
+    def __init__(self, job_id: str, keyword: str, limit: int, errors: List[str], supabase=None,
+                 sink: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.job_id = job_id
+        self.keyword = keyword
+        self.limit = limit
+        self.errors = errors
+        self.supabase = supabase
+        self.sink = sink
+        self.status = "running"
+        self._phase = "starting"
+        self._phase_started = time.perf_counter()
+        self._phase_started_at = time.time()
+        self.trace = metrics.start_trace()
+        self.per_source: Dict[str, int] = {}
+        self.collected = 0
+        self.started_at = time.time()
+        self._published_at = 0.0
+        self._published_count = -1
+
+    @property
+    def phase(self) -> str:
+        return self._phase
+
+    @phase.setter
+    def phase(self, phase: str):
+        self._end_phase()
+        self._phase = phase
+
+    def _end_phase(self):
+        now = time.perf_counter()
+        duration = now - self._phase_started
+        metrics.JOB_PHASE_SECONDS.observe(duration, phase=self._phase)
+        if len(self.trace) < config.METRICS_TRACE_MAX_SPANS:
+            self.trace.append({"name": f"phase.{self._phase}", "start": round(self._phase_started_at, 3),
+                               "seconds": round(duration, 4)})
+        self._phase_started = now
+        self._phase_started_at = time.time()
+
+    def record(self, images: List[Dict[str, Any]], restored: bool = False):
+        """Counts accepted images by their source (`restored` images were counted by an earlier attempt)."""
+        for img_data in images:
+            source = img_data.get("source") or "unknown"
+            self.per_source[source] = self.per_source.get(source, 0) + 1
+            if not restored:
+                metrics.JOB_IMAGES.inc(source=source)
+        self.collected += len(images)
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        throughput = self.collected / elapsed
+        remaining = max(0, self.limit - self.collected)
+        eta = None
+        if self.status == "running" and throughput > 0:
+            eta = round(remaining / throughput, 1)
+        snapshot = {
+            "job_id": self.job_id,
+            "keyword": self.keyword,
+            "status": self.status,
+            "phase": self.phase,
+            "collected": self.collected,
+            "limit": self.limit,
+            "per_source": dict(self.per_source),
+            "error_count": len(self.errors),
+            "last_error": self.errors[-1] if self.errors else None,
+            "elapsed_seconds": round(elapsed, 1),
+            "images_per_second": round(throughput, 2),
+            "eta_seconds": eta,
+            "updated_at": time.time(),
+        }
+        if self.status in TERMINAL_STATUSES:
+            snapshot["trace"] = list(self.trace)
+        return snapshot
+
+    def _write(self, snapshot: Dict[str, Any], write_count: bool):
+        if self.sink is not None:
+            self.sink(self.job_id, snapshot)
+        if write_count and self.supabase is not None:
+            self.supabase.table("crawl_jobs").update({"image_count": self.collected}).eq("id", self.job_id).execute()
+
+    async def publish(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._published_at < config.PROGRESS_PUBLISH_INTERVAL:
+            return
+        self._published_at = now
+        write_count = self.collected != self._published_count and self.status == "running"
+        self._published_count = self.collected
+        try:
+            await asyncio.to_thread(self._write, self.snapshot(), write_count)
+        except Exception as e:
+            # Progress is best effort; never fail the job over it
+            print(f"Progress update failed for job {self.job_id}: {e}")
+
+    async def finish(self, status: str):
+        if self.status in TERMINAL_STATUSES:
+            return
+        self.phase = "done"
+        self.status = status
+        metrics.JOBS.inc(status=status)
+        metrics.JOBS_IN_FLIGHT.dec()
+        await self.publish(force=True)
+        _active.pop(self.job_id, None)
+
+
+def start(job_id: str, keyword: str, limit: int, errors: List[str], supabase=None,
+          sink: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> JobProgress:
+    progress = JobProgress(job_id, keyword, limit, errors, supabase=supabase, sink=sink)
+    metrics.JOBS_IN_FLIGHT.inc()
+    _active[job_id] = progress
+    return progress
+
+
+def get_local(job_id: str) -> Optional[Dict[str, Any]]:
+    """Snapshot of a job running in this process, if any."""
+    progress = _active.get(job_id)
+    return progress.snapshot() if progress else None
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+from collections import Counter
+from contextlib import aclosing
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
+
+from api import source_engine
+from lib.shared import config
+
+_synonyms: Optional[Dict[str, List[str]]] = None
+_synonyms_lock = threading.Lock()
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def load_synonyms() -> Dict[str, List[str]]:
+    """Reads QUERY_SYNONYMS_PATH (a JSON object of keyword -> related queries) once per process."""
+    global _synonyms
+    with _synonyms_lock:
+        if _synonyms is None:
+            _synonyms = {}
+            if config.QUERY_SYNONYMS_PATH:
+                try:
+                    with open(config.QUERY_SYNONYMS_PATH, encoding="utf-8") as synonyms_file:
+                        _synonyms = {_normalize(keyword): list(related)
+                                     for keyword, related in json.load(synonyms_file).items()}
+                except Exception as e:
+                    print(f"Could not load query synonyms from {config.QUERY_SYNONYMS_PATH}: {e}")
+        return _synonyms
+
+
+class QueryExpander:
+    """
+    Chooses related queries for a keyword whose own results ran dry.
+
+    Candidates come, in this order, from user-supplied variants, the synonyms file and the tags
+    of results already returned for the job (Pixabay and Unsplash tag their images). Tags count
+    once they appear on at least QUERY_EXPANSION_MIN_TAG_COUNT results, most frequent first.
+    Every query is used at most once per job, and at most `max_variants` are used in total.
+    """
+
+    def __init__(self, keyword: str, variants: Optional[List[str]] = None, max_variants: Optional[int] = None):
+        self.keyword = keyword
+        self.max_variants = config.QUERY_EXPANSION_MAX_VARIANTS if max_variants is None else max_variants
+        self.used: List[str] = []
+        self._seen = {_normalize(keyword)}
+        self._explicit = [variant for variant in (variants or []) if variant and variant.strip()]
+        self._explicit += load_synonyms().get(_normalize(keyword), [])
+        self._tag_counts: Counter = Counter()
+
+    def observe(self, images: List[Dict[str, Any]]):
+        """Counts the tags of returned images as candidate queries."""
+        for img_data in images:
+            tags = {_normalize(tag) for tag in (img_data.get("tags") or []) if isinstance(tag, str) and tag.strip()}
+            self._tag_counts.update(tags - self._seen)
+
+    def _candidates(self) -> List[str]:
+        tags = [tag for tag, count in self._tag_counts.most_common()
+                if count >= config.QUERY_EXPANSION_MIN_TAG_COUNT]
+        return self._explicit + tags
+
+    def next_variant(self) -> Optional[str]:
+        """The best query not used yet, or None when the candidates or the variant budget run out."""
+        if len(self.used) >= self.max_variants:
+            return None
+        for candidate in self._candidates():
+            if _normalize(candidate) not in self._seen:
+                self._seen.add(_normalize(candidate))
+                self.used.append(candidate)
+                return candidate
+        return None
+
+
+async def iter_expanded_pages(expander: QueryExpander, limit: int, parallel: Optional[int] = None,
+                              errors: Optional[List[str]] = None,
+                              positions_for: Optional[Callable[[str], Dict[str, Optional[int]]]] = None
+                              ) -> AsyncIterator[Tuple[str, str, List[Dict[str, Any]], Dict[str, Optional[int]]]]:
+    """
+    Searches related queries through the source adapters and yields
+    (query, source name, images, read positions of the query as of that page).
+
+    Up to `parallel` queries run at once, each through source_engine.iter_source_pages; when one
+    runs out, the next variant is picked, so tags seen in the variants' own results can lead to
+    further queries. Pages are yielded as they arrive from any query. Like iter_source_pages the
+    consumer stops by closing the generator (it decides when `limit` is met, after dedup); all
+    searches still running are then cancelled.
+    `positions_for(query)` supplies the positions dict a query's search resumes from
+    (see source_engine.iter_source_pages); without it every query starts at its first page.
+    """
+    parallel = parallel or config.QUERY_EXPANSION_PARALLEL
+    pages: asyncio.Queue = asyncio.Queue(maxsize=parallel)
+    searches: Dict[asyncio.Task, str] = {}
+    done = object()
+
+    async def search(query: str):
+        positions = positions_for(query) if positions_for else {}
+        try:
+            async with aclosing(source_engine.iter_source_pages(query, limit, errors=errors,
+                                                                positions=positions)) as query_pages:
+                async for source_name, page in query_pages:
+                    expander.observe(page)
+                    # The search reads ahead while the page waits in the queue; keep its own positions
+                    await pages.put((query, source_name, page, dict(positions)))
+        except Exception as e:
+            message = f"Related query '{query}' failed: {e}"
+            print(message)
+            if errors is not None:
+                errors.append(message)
+        # Not reached when cancelled, so a full queue cannot block the cleanup below
+        await pages.put((query, None, done, None))
+
+    def start_next() -> bool:
+        query = expander.next_variant()
+        if query is None:
+            return False
+        print(f"Expanding '{expander.keyword}' with related query '{query}'")
+        searches[asyncio.create_task(search(query))] = query
+        return True
+
+    try:
+        while len(searches) < parallel and start_next():
+            pass
+        running = len(searches)
+        while running:
+            query, source_name, page, page_positions = await pages.get()
+            if page is done:
+                running -= 1
+                if start_next():
+                    running += 1
+                continue
+            yield query, source_name, page, page_positions
+    finally:
+        for task in searches:
+            task.cancel()
+        await asyncio.gather(*searches, return_exceptions=True)
@@ -0,0 +1,264 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Mapping, Tuple
+
+from lib.shared import config
+
+# Provider quotas as (requests, period in seconds). Each source adapter declares its own
+# (see api/sources.py); providers without one get DEFAULT_QUOTA.
+PROVIDER_QUOTAS: Dict[str, Tuple[int, float]] = {}
+DEFAULT_QUOTA = (60, 60)
+
+
+class QuotaExhausted(Exception):
+    """Raised when a provider has no budget left within the allowed wait."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with reservations.
+
+    `reserve()` takes a token immediately when one is available; otherwise it books the next
+    token (the balance may go negative) and returns how long the caller has to wait for it.
+    Because bookings are made under one lock, concurrent jobs are served in arrival order.
+    Quota headers reported by the provider (`observe()`) cap the bucket until their reset time.
+    All state changes happen inside `_state()`, which SharedTokenBucket extends to other processes.
+    """
+
+    def __init__(self, name: str, capacity: int, period: float):
+        self.name = name
+        self.capacity = float(capacity)
+        self.refill_rate = capacity / period # tokens per second
+        self.tokens = float(capacity)
+        self.updated_at = self._clock()
+        # Provider-reported quota (from response headers)
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None # _clock() time when `remaining` resets
+        self.granted = 0
+        self.deferred = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clock() -> float:
+        return time.monotonic()
+
+    @contextmanager
+    def _state(self):
+        with self._lock:
+            yield
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining = None
+            self.reset_at = None
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Books one token and returns the wait in seconds, or None if it would exceed `max_wait`."""
+        with self._state():
+            now = self._clock()
+            self._refill(now)
+
+            wait = 0.0
+            if self.tokens < 1:
+                wait = (1 - self.tokens) / self.refill_rate
+            if self.remaining is not None and self.remaining <= 0:
+                # The provider says the quota is spent: nothing before its reset time
+                wait = max(wait, (self.reset_at - now) if self.reset_at is not None else float("inf"))
+
+            if wait > max_wait:
+                self.rejected += 1
+                return None
+
+            self.tokens -= 1
+            if self.remaining is not None:
+                self.remaining -= 1
+            self.granted += 1
+            if wait > 0:
+                self.deferred += 1
+            return wait
+
+    def observe(self, remaining: Optional[int], reset_in: Optional[float], default_reset: Optional[float] = None):
+        """
+        Records the provider's remaining quota and the seconds until it resets.
+        `default_reset` is used when the provider does not say when its window resets.
+        """
+        with self._state():
+            now = self._clock()
+            self._refill(now)
+            if remaining is not None:
+                self.remaining = remaining
+                # Never hold more local tokens than the provider says are left
+                self.tokens = min(self.tokens, float(remaining))
+            if reset_in is not None:
+                self.reset_at = now + max(0.0, reset_in)
+            elif remaining is not None and self.reset_at is None and default_reset is not None:
+                self.reset_at = now + default_reset
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._state():
+            now = self._clock()
+            self._refill(now)
+            return {
+                "capacity": self.capacity,
+                "tokens": round(self.tokens, 2),
+                "refill_per_second": self.refill_rate,
+                "provider_remaining": self.remaining,
+                "provider_reset_in": round(self.reset_at - now, 1) if self.reset_at is not None else None,
+                "granted": self.granted,
+                "deferred": self.deferred,
+                "rejected": self.rejected,
+            }
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose balance and provider quota live in a SQLite file, so every process on the
+    host (the worker pool and the API) draws from one bucket per provider instead of each getting
+    the full quota. Each operation loads the state, applies the change and stores it in one
+    BEGIN IMMEDIATE transaction; wall-clock time is used since it is shared between processes.
+    The granted/deferred/rejected counters stay per process.
+    """
+
+    def __init__(self, name: str, capacity: int, period: float, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(name, capacity, period)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    provider TEXT PRIMARY KEY,
+                    capacity REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    remaining INTEGER,
+                    reset_at REAL
+                )""")
+
+    @staticmethod
+    def _clock() -> float:
+        return time.time()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _state(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT capacity, tokens, updated_at, remaining, reset_at "
+                                   "FROM rate_limit_buckets WHERE provider = ?", (self.name,)).fetchone()
+                # A changed quota starts a fresh bucket
+                if row is not None and row[0] == self.capacity:
+                    _, self.tokens, self.updated_at, self.remaining, self.reset_at = row
+                else:
+                    self.tokens, self.updated_at = self.capacity, self._clock()
+                    self.remaining = self.reset_at = None
+                yield
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (provider, capacity, tokens, updated_at, remaining, reset_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.name, self.capacity, self.tokens, self.updated_at, self.remaining, self.reset_at))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def set_quota(provider: str, capacity: int, period: float):
+    """Sets a provider's quota; its bucket is rebuilt on next use."""
+    with _buckets_lock:
+        PROVIDER_QUOTAS[provider] = (capacity, period)
+        _buckets.pop(provider, None)
+
+
+def get_bucket(provider: str) -> TokenBucket:
+    """
+    Returns the bucket for a provider, shared by every job in the process and, with
+    RATE_LIMIT_STATE_PATH set, by every process using that file.
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            capacity, period = PROVIDER_QUOTAS.get(provider, DEFAULT_QUOTA)
+            if config.RATE_LIMIT_STATE_PATH:
+                bucket = SharedTokenBucket(provider, capacity, period, config.RATE_LIMIT_STATE_PATH)
+            else:
+                bucket = TokenBucket(provider, capacity, period)
+            _buckets[provider] = bucket
+        return bucket
+
+
+async def acquire(provider: str, max_wait: Optional[float] = None):
+    """
+    Waits for a request slot for `provider`.
+    Raises QuotaExhausted when no slot opens within `max_wait` seconds, so the caller can
+    reroute the work to providers that still have budget.
+    """
+    max_wait = config.RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+    wait = get_bucket(provider).reserve(max_wait)
+    if wait is None:
+        raise QuotaExhausted(f"{provider} quota exhausted")
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def _header(headers: Mapping[str, str], name: str) -> Optional[str]:
+    # Providers differ in capitalisation (X-RateLimit-Remaining vs X-Ratelimit-Remaining)
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def observe_response(provider: str, status_code: int, headers: Mapping[str, str]):
+    """
+    Feeds provider quota headers back into the bucket.
+    Pixabay sends X-RateLimit-Reset as seconds until reset, Pexels as a UNIX timestamp;
+    Unsplash only sends the remaining count (hourly window). A 429 empties the bucket
+    until Retry-After (or a minute if absent).
+    """
+    remaining = _header(headers, "x-ratelimit-remaining")
+    reset = _header(headers, "x-ratelimit-reset")
+
+    remaining_value = int(remaining) if remaining is not None and remaining.isdigit() else None
+    reset_in = None
+    if reset is not None:
+        try:
+            reset_value = float(reset)
+            # Large values are absolute UNIX timestamps, small ones are relative seconds
+            reset_in = reset_value - time.time() if reset_value > 1e9 else reset_value
+        except ValueError:
+            reset_in = None
+
+    if status_code == 429:
+        retry_after = _header(headers, "retry-after")
+        remaining_value = 0
+        reset_in = float(retry_after) if retry_after and retry_after.isdigit() else 60.0
+
+    if remaining_value is not None or reset_in is not None:
+        get_bucket(provider).observe(remaining_value, reset_in,
+                                     default_reset=PROVIDER_QUOTAS.get(provider, DEFAULT_QUOTA)[1])
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """Current bucket state for every known provider."""
+    return {provider: get_bucket(provider).snapshot() for provider in PROVIDER_QUOTAS}
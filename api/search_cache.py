@@ -0,0 +1,201 @@
+import functools
+import hashlib
+import inspect
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from lib.shared import config
+
+# Freshness per provider (seconds). Pixabay asks clients to cache search results for 24 hours;
+# the others get the shorter default so results stay reasonably fresh.
+SOURCE_TTLS = {
+    "Pixabay": 24 * 3600,
+}
+
+
+def make_key(source: str, query: str, page: int, params: Dict[str, Any]) -> str:
+    """Cache key for one provider call: (source, normalized query, page, remaining params)."""
+    payload = json.dumps([source, query.strip().lower(), page, sorted(params.items())], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class _DiskBackend:
+    """SQLite-backed second tier so cached searches survive restarts and are shared between processes."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row and row[0] <= time.time():
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return row
+
+    def set(self, key: str, expires_at: float, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, value))
+            self._conn.commit()
+
+
+class SearchCache:
+    """
+    TTL + LRU cache for provider search results.
+
+    Entries are stored as JSON text, so every hit returns fresh objects the caller may mutate,
+    and the size of the text is what counts against `max_bytes`. The least recently used
+    entries are evicted once the memory cap is exceeded. An optional SQLite file acts as a
+    second tier behind the in-memory one. Times are wall-clock so disk entries stay valid
+    across processes.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float, disk_path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _DiskBackend(disk_path) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def _lookup(self, key: str, count: bool) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return entry[1]
+                self._remove(key)
+                self.expirations += 1
+        if self._disk is not None:
+            row = self._disk.get(key)
+            if row is not None:
+                self._store_memory(key, row[0], row[1])
+                if count:
+                    with self._lock:
+                        self.disk_hits += 1
+                return row[1]
+        if count:
+            with self._lock:
+                self.misses += 1
+        return None
+
+    def contains(self, key: str) -> bool:
+        """True if a fresh entry exists (does not touch the hit/miss counters)."""
+        return self._lookup(key, count=False) is not None
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        value = self._lookup(key, count=True)
+        return json.loads(value) if value is not None else None
+
+    def _store_memory(self, key: str, expires_at: float, value: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if len(value) > self.max_bytes:
+                return
+            self._entries[key] = (expires_at, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def set(self, key: str, results: List[Dict[str, Any]], ttl: Optional[float] = None):
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        value = json.dumps(results)
+        self._store_memory(key, expires_at, value)
+        if self._disk is not None:
+            self._disk.set(key, expires_at, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "disk_backend": self._disk is not None,
+            }
+
+
+_cache: Optional[SearchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SearchCache:
+    """Returns the process-wide search cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache(config.SEARCH_CACHE_MAX_BYTES, config.SEARCH_CACHE_TTL,
+                                     disk_path=config.SEARCH_CACHE_PATH)
+    return _cache
+
+
+def cached_search(source: str):
+    """
+    Decorator for the search_* functions in api_sources.
+    Non-empty results are cached under (source, query, page, other params). Errors raise and are
+    never cached; empty results are not cached either, so a query without results is asked again later.
+    The wrapper's `is_cached(...)` lets callers skip rate limiting for calls served from cache.
+    """
+    def decorator(search_func: Callable[..., List[Dict[str, Any]]]):
+        signature = inspect.signature(search_func)
+
+        def cache_key(*args, **kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            query = params.pop("query")
+            page = params.pop("page", 1)
+            return make_key(source, query, page, params)
+
+        @functools.wraps(search_func)
+        def wrapper(*args, **kwargs):
+            if not config.SEARCH_CACHE_ENABLED:
+                return search_func(*args, **kwargs)
+            key = cache_key(*args, **kwargs)
+            cached = get_cache().get(key)
+            if cached is not None:
+                return cached
+            results = search_func(*args, **kwargs)
+            if results:
+                get_cache().set(key, results, ttl=SOURCE_TTLS.get(source))
+            return results
+
+        def is_cached(*args, **kwargs) -> bool:
+            return config.SEARCH_CACHE_ENABLED and get_cache().contains(cache_key(*args, **kwargs))
+
+        wrapper.is_cached = is_cached
+        return wrapper
+    return decorator
@@ -0,0 +1,203 @@
+import asyncio
+import math
+from collections import deque
+from typing import List, Dict, Any, AsyncIterator, Optional, Deque, Tuple
+
+from api import metrics, rate_limit, sources as source_registry
+from api.sources import SourceAdapter
+
+
+class SourceCursor:
+    """
+    Paginated cursor over one source adapter.
+
+    Pages are fetched concurrently and handed out in page order by `next_page()`. How many are
+    outstanding is decided by `fill(wanted)`: enough pages to cover `wanted` more images, at most
+    `spec.max_in_flight`. Nothing is fetched until the cursor is filled, so a source whose results
+    are not needed spends no quota; requests that have started cannot be taken back.
+    Every page request first takes a token from the provider's rate-limit bucket.
+    The cursor is exhausted after a short page, a failed page, an exhausted quota or the
+    provider's result cap. `limit` only sizes the pages; the consumer decides when to stop,
+    so results rejected downstream (e.g. duplicates) can be replaced from deeper pages.
+    A resumed cursor starts at `start_page`; `last_page` is the number of the page last returned
+    and `finished` is set once the source came back with a short page (not after a failure).
+    """
+
+    def __init__(self, spec: SourceAdapter, keyword: str, limit: int, errors: Optional[List[str]] = None,
+                 start_page: int = 1):
+        self.spec = spec
+        self.keyword = keyword
+        self.errors = errors
+        self.page_size = max(1, min(limit, spec.per_page_limit))
+        self.max_pages = None
+        if spec.max_results:
+            # Page n ends at result n * page_size and providers reject pages past their cap, so every
+            # page must fit within it: shrink the pages evenly or drop the partial last one, whichever
+            # reaches more results
+            self.page_size = min(self.page_size, spec.max_results)
+            self.max_pages = spec.max_results // self.page_size
+            pages = math.ceil(spec.max_results / self.page_size)
+            if pages > self.max_pages and (spec.max_results // pages) * pages > self.max_pages * self.page_size:
+                self.page_size, self.max_pages = spec.max_results // pages, pages
+        self._next_page = start_page
+        self._pending: Deque[asyncio.Task] = deque()
+        self._exhausted = False
+        self.last_page = start_page - 1
+        self.finished = False
+
+    @property
+    def exhausted(self) -> bool:
+        """True once no page is outstanding and none will be requested."""
+        return not self._pending and (self._exhausted or (self.max_pages is not None
+                                                          and self._next_page > self.max_pages))
+
+    def fill(self, wanted: int) -> int:
+        """
+        Requests pages until the outstanding ones cover `wanted` images (at least one page while
+        the cursor is not exhausted) and returns how many images those pages can hold.
+        """
+        pages = max(1, math.ceil(wanted / self.page_size))
+        while (not self._exhausted and len(self._pending) < min(pages, self.spec.max_in_flight)
+               and (self.max_pages is None or self._next_page <= self.max_pages)):
+            self._pending.append(asyncio.create_task(self._fetch_page(self._next_page)))
+            self._next_page += 1
+        return len(self._pending) * self.page_size
+
+    async def _fetch_page(self, page: int) -> List[Dict[str, Any]]:
+        # Calls served from the search cache do not spend provider quota
+        cached = self.spec.is_cached(self.keyword, page, self.page_size)
+        if not cached:
+            # Waits for a slot in the provider's shared token bucket (raises QuotaExhausted if none opens soon)
+            with metrics.span("rate_limit.wait", metrics.RATE_LIMIT_WAIT_SECONDS, source=self.spec.name):
+                await rate_limit.acquire(self.spec.name)
+        with metrics.PROVIDER_IN_FLIGHT.track_inflight(source=self.spec.name), \
+                metrics.span("provider.search", metrics.PROVIDER_REQUEST_SECONDS,
+                             source=self.spec.name, cached=str(cached).lower()):
+            return await asyncio.wait_for(
+                self.spec.fetch_page(self.keyword, page, self.page_size),
+                timeout=self.spec.timeout,
+            )
+
+    def _record_error(self, message: str):
+        print(message)
+        if self.errors is not None:
+            self.errors.append(message)
+
+    async def next_page(self) -> Optional[List[Dict[str, Any]]]:
+        """Returns the next page of images, or None once the cursor is exhausted."""
+        if not self._pending:
+            return None
+        task = self._pending.popleft()
+        self.last_page += 1
+        try:
+            images = await task
+        except asyncio.TimeoutError:
+            metrics.PROVIDER_ERRORS.inc(source=self.spec.name, reason="timeout")
+            self._record_error(f"API Error from {self.spec.name}: timed out after {self.spec.timeout}s")
+            images = None
+        except rate_limit.QuotaExhausted as e:
+            metrics.PROVIDER_ERRORS.inc(source=self.spec.name, reason="quota")
+            # No budget left: lower-priority sources pick up the remaining work
+            self._record_error(f"API Error from {self.spec.name}: {e}, rerouting to other sources")
+            images = None
+        except Exception as e:
+            metrics.PROVIDER_ERRORS.inc(source=self.spec.name, reason="error")
+            self._record_error(f"API Error from {self.spec.name}: {e}")
+            images = None
+
+        if not images or len(images) < self.page_size:
+            # Short or failed page: later pages would be empty, stop paging this source.
+            # Only a page that came back short is the source's end; a failed one is asked for again on resume
+            self.finished = images is not None
+            self._exhausted = True
+            self.close()
+        return images or None
+
+    def close(self):
+        """Cancels any outstanding page requests."""
+        while self._pending:
+            task = self._pending.popleft()
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception() # Mark results of skipped pages as retrieved
+
+
+def _schedule(cursors: List[SourceCursor], missing: int):
+    """
+    Fills the cursors in priority order until their outstanding pages cover `missing` images.
+    The first cursor is the one being read and always gets at least one page.
+    """
+    for position, cursor in enumerate(cursors):
+        if cursor.exhausted:
+            continue
+        if position > 0 and missing <= 0:
+            break
+        missing -= cursor.fill(missing)
+
+
+async def iter_source_pages(keyword: str, limit: int, sources: Optional[List[SourceAdapter]] = None,
+                            errors: Optional[List[str]] = None,
+                            positions: Optional[Dict[str, Optional[int]]] = None
+                            ) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Pages through all sources concurrently and yields (source name, images) in priority order.
+
+    `sources` defaults to the registered, configured adapters (see api/sources.py).
+    Every source gets a SourceCursor. Before each page is read, the images still missing from
+    `limit` are spread over the cursors in priority order (see `_schedule`), so lower-priority
+    sources only fetch, concurrently, what higher-priority ones cannot cover, and a source is
+    never more than `ceil(missing / page_size)` pages ahead. Once `limit` images have been
+    yielded, each further read (the consumer rejected some of them) fetches one more page.
+    Pages from a source are only yielded once every higher-priority source is exhausted, so
+    trimming the stream to `limit` keeps the Pixabay -> Pexels -> Unsplash -> Google ordering.
+    Images without a URL are dropped.
+    The consumer stops the search by closing the generator (use contextlib.aclosing), which
+    cancels the remaining page requests.
+    Per-source failures and timeouts are appended to `errors` instead of aborting the search.
+    `positions` maps source names to the number of pages already read, or None for sources that
+    ran out of results; reading resumes after those pages and finished sources are skipped.
+    The dict is kept current before each page is yielded (the page's own number included), so
+    a job can checkpoint it alongside the images and resume from it without re-fetching.
+    """
+    sources = source_registry.get_sources() if sources is None else sources
+    if positions is not None:
+        sources = [spec for spec in sources if spec.name not in positions or positions[spec.name] is not None]
+    if limit <= 0 or not sources:
+        return
+
+    cursors = [SourceCursor(spec, keyword, limit, errors=errors,
+                            start_page=(positions or {}).get(spec.name, 0) + 1) for spec in sources]
+    yielded = 0
+
+    try:
+        for index, cursor in enumerate(cursors):
+            print(f"Collecting {cursor.spec.name} results for '{keyword}'...")
+            source_count = 0
+            while True:
+                _schedule(cursors[index:], limit - yielded)
+                images_from_api = await cursor.next_page()
+                if positions is not None and (images_from_api is not None or cursor.finished):
+                    # Failed pages are not recorded, so a resumed search asks for them again
+                    positions[cursor.spec.name] = None if cursor.finished else cursor.last_page
+                if images_from_api is None:
+                    break
+                page = []
+                for img_data in images_from_api:
+                    if not img_data.get("url"): # Only keep images with a valid URL
+                        continue
+                    img_data.setdefault("source", cursor.spec.name)
+                    page.append(img_data)
+                source_count += len(page)
+                yielded += len(page)
+                if page:
+                    yield cursor.spec.name, page
+            if source_count:
+                print(f"Found {source_count} images from {cursor.spec.name}.")
+            else:
+                print(f"No images found or API error from {cursor.spec.name}.")
+    finally:
+        # Enough high-priority results (or the consumer stopped early): drop the rest
+        for cursor in cursors:
+            cursor.close()
+
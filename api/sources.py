@@ -0,0 +1,121 @@
+import asyncio
+import importlib
+import threading
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from api import rate_limit
+from lib.shared import config
+
+# Default per-source timeout (seconds) for a single provider call
+DEFAULT_SOURCE_TIMEOUT = 15.0
+# Default number of pages each provider may have in flight at once
+DEFAULT_MAX_IN_FLIGHT_PAGES = 3
+
+
+class SourceAdapter:
+    """
+    Interface every image source implements to take part in a crawl.
+
+    An adapter declares its page size (`per_page_limit`), the most results one query can reach
+    (`max_results`, None if unbounded), its quota as (requests, period in seconds), its place
+    in the priority order (lower runs first) and how many pages it may have in flight, and
+    implements `fetch_page()`. The source engine schedules registered adapters generically.
+    `fetch_page()` returns images in the unified format (url, source, source_url, alt_text,
+    width, height, size, format, tags); returning fewer than `page_size` images ends the source.
+    """
+
+    name: str = ""
+    per_page_limit: int = 10
+    max_results: Optional[int] = None
+    quota: Optional[Tuple[int, float]] = None
+    priority: int = 100
+    timeout: float = DEFAULT_SOURCE_TIMEOUT
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT_PAGES
+
+    def is_configured(self) -> bool:
+        """False when the source cannot run (e.g. its API key is missing); it is then skipped."""
+        return True
+
+    def is_cached(self, keyword: str, page: int, page_size: int) -> bool:
+        """True if the page would be served from the search cache (and needs no rate-limit token)."""
+        return False
+
+    async def fetch_page(self, keyword: str, page: int, page_size: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class SearchFunctionAdapter(SourceAdapter):
+    """
+    Adapter for the blocking search_* functions in api_sources.
+    `size_param` is the keyword argument the function uses for its page size
+    (Google Custom Search uses 'num' instead of 'per_page'). Calls run in a worker thread.
+    """
+
+    def __init__(self, name: str, search_func: Callable[..., List[Dict[str, Any]]], per_page_limit: int,
+                 size_param: str = "per_page", max_results: Optional[int] = None,
+                 quota: Optional[Tuple[int, float]] = None, priority: int = 100,
+                 configured: Optional[Callable[[], bool]] = None,
+                 timeout: float = DEFAULT_SOURCE_TIMEOUT, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT_PAGES):
+        self.name = name
+        self.search_func = search_func
+        self.per_page_limit = per_page_limit
+        self.size_param = size_param
+        self.max_results = max_results
+        self.quota = quota
+        self.priority = priority
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._configured = configured
+
+    def is_configured(self) -> bool:
+        return self._configured() if self._configured else True
+
+    def _kwargs(self, page: int, page_size: int) -> Dict[str, Any]:
+        return {self.size_param: page_size, "page": page}
+
+    def is_cached(self, keyword: str, page: int, page_size: int) -> bool:
+        is_cached = getattr(self.search_func, "is_cached", None)
+        return bool(is_cached and is_cached(keyword, **self._kwargs(page, page_size)))
+
+    async def fetch_page(self, keyword: str, page: int, page_size: int) -> List[Dict[str, Any]]:
+        # Runs the (blocking) source search function in a worker thread so the event loop stays free
+        return await asyncio.to_thread(self.search_func, keyword, **self._kwargs(page, page_size))
+
+
+_registry: Dict[str, SourceAdapter] = {}
+_discovered = False
+_discover_lock = threading.Lock()
+
+
+def register(adapter: SourceAdapter) -> SourceAdapter:
+    """Adds (or replaces) a source; its declared quota sizes the provider's rate-limit bucket."""
+    if not adapter.name:
+        raise ValueError("Source adapters need a name")
+    _registry[adapter.name] = adapter
+    if adapter.quota:
+        rate_limit.set_quota(adapter.name, *adapter.quota)
+    return adapter
+
+
+def discover():
+    """Imports the modules listed in SOURCE_MODULES once; each registers its adapters on import."""
+    global _discovered
+    with _discover_lock:
+        if _discovered:
+            return
+        for module_name in config.SOURCE_MODULES:
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                print(f"Could not load image source module {module_name}: {e}")
+        _discovered = True
+        for adapter in _registry.values():
+            if not adapter.is_configured():
+                print(f"Image source {adapter.name} is not configured and will be skipped.")
+
+
+def get_sources() -> List[SourceAdapter]:
+    """Configured sources in priority order."""
+    discover()
+    adapters = [adapter for adapter in _registry.values() if adapter.is_configured()]
+    return sorted(adapters, key=lambda adapter: adapter.priority)
@@ -0,0 +1,183 @@
+import asyncio
+import os
+from typing import List, Dict, Any, AsyncIterator, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit, urldefrag, quote
+from urllib.robotparser import RobotFileParser
+
+from api import http_client
+from lib.shared import config
+
+SOURCE_NAME = "Web Crawl"
+IMAGE_EXTENSIONS = {".jpg": "jpg", ".jpeg": "jpg", ".png": "png", ".gif": "gif", ".webp": "webp"}
+
+
+def start_urls_for(keyword: str) -> List[str]:
+    """Expands the configured backup start URL templates for a keyword."""
+    return [template.format(keyword=quote(keyword)) for template in config.BACKUP_CRAWL_START_URLS]
+
+
+def _int_attr(value: Optional[str]) -> Optional[int]:
+    return int(value) if value and value.isdigit() else None
+
+
+def parse_page(html: str, page_url: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Extracts image metadata and outgoing links from an HTML page."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    images = []
+    for img in soup.find_all("img"):
+        src = img.get("src") or img.get("data-src")
+        if not src or src.startswith("data:"):
+            continue
+        image_url = urljoin(page_url, src) # Make sure the image URL is absolute
+        extension = os.path.splitext(urlsplit(image_url).path)[1].lower()
+        images.append({
+            "url": image_url,
+            "source": SOURCE_NAME,
+            "source_url": page_url,
+            "alt_text": img.get("alt") or "",
+            "width": _int_attr(img.get("width")),
+            "height": _int_attr(img.get("height")),
+            "size": None,
+            "format": IMAGE_EXTENSIONS.get(extension, "jpg"),
+            "tags": [],
+        })
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        link, _ = urldefrag(urljoin(page_url, anchor["href"]))
+        if link.startswith(("http://", "https://")):
+            links.append(link)
+    return images, links
+
+
+class AsyncImageCrawler:
+    """
+    Breadth-first image crawler that runs on the event loop.
+
+    Every request carries its own depth, so links found on a page at depth d are queued at d+1
+    and only followed while d < `max_depth`. robots.txt is fetched once per host and obeyed
+    (a host whose robots.txt fails with a server or network error is not crawled), at most
+    `max_pages` pages are fetched, at most `per_domain_concurrency` requests run against one
+    host at a time, and links are only followed within the start URLs' domains. Pages of images are handed out through a
+    bounded queue: when the consumer stops reading (its limit is filled) the crawl pauses,
+    and closing the iterator cancels it.
+    """
+
+    def __init__(self, start_urls: List[str], max_depth: Optional[int] = None,
+                 per_domain_concurrency: Optional[int] = None, workers: Optional[int] = None,
+                 max_pages: Optional[int] = None):
+        self.start_urls = start_urls
+        self.max_depth = config.DEFAULT_CRAWL_DEPTH if max_depth is None else max_depth
+        self.per_domain_concurrency = per_domain_concurrency or config.BACKUP_CRAWL_PER_DOMAIN_CONCURRENCY
+        self.workers = workers or config.BACKUP_CRAWL_WORKERS
+        self.max_pages = max_pages or config.BACKUP_CRAWL_MAX_PAGES
+        self.allowed_hosts = {(urlsplit(url).hostname or "").lower() for url in start_urls}
+        self.headers = {"User-Agent": config.BACKUP_CRAWL_USER_AGENT}
+        self._robots: Dict[str, Optional[RobotFileParser]] = {}
+        self._robots_locks: Dict[str, asyncio.Lock] = {}
+        self._domain_slots: Dict[str, asyncio.Semaphore] = {}
+        self._seen: Set[str] = set()
+        self.pages_crawled = 0
+        self.errors: List[str] = []
+
+    async def _robots_for(self, url: str) -> Optional[RobotFileParser]:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        lock = self._robots_locks.setdefault(origin, asyncio.Lock())
+        async with lock:
+            if origin not in self._robots:
+                parser = RobotFileParser(f"{origin}/robots.txt")
+                try:
+                    response = await http_client.async_get(f"{origin}/robots.txt", headers=self.headers)
+                    if response.status_code in (401, 403) or response.status_code >= 500:
+                        # Server errors mean robots.txt is unreachable: crawl nothing there (RFC 9309 2.3.1.4)
+                        parser.disallow_all = True
+                    elif response.status_code >= 400:
+                        parser.allow_all = True
+                    else:
+                        parser.parse(response.content.decode("utf-8", errors="replace").splitlines())
+                except Exception as e:
+                    print(f"Could not fetch robots.txt for {origin}, skipping the host: {e}")
+                    parser.disallow_all = True
+                self._robots[origin] = parser
+        return self._robots[origin]
+
+    async def allowed(self, url: str) -> bool:
+        robots = await self._robots_for(url)
+        return robots.can_fetch(config.BACKUP_CRAWL_USER_AGENT, url)
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = (urlsplit(url).hostname or "").lower()
+        if host not in self._domain_slots:
+            self._domain_slots[host] = asyncio.Semaphore(self.per_domain_concurrency)
+        return self._domain_slots[host]
+
+    async def _crawl_one(self, url: str, depth: int, frontier: asyncio.Queue, results: asyncio.Queue):
+        if not await self.allowed(url):
+            print(f"robots.txt disallows {url}, skipping.")
+            return
+        # Take the page slot before fetching, so concurrent workers cannot overshoot max_pages
+        if self.pages_crawled >= self.max_pages:
+            return
+        self.pages_crawled += 1
+        async with self._slot(url):
+            response = await http_client.async_get(url, headers=self.headers)
+        if response.status_code >= 400:
+            self.errors.append(f"Backup crawl got HTTP {response.status_code} for {url}")
+            return
+        if "html" not in response.headers.get("Content-Type", "").lower():
+            return
+
+        html = response.content.decode("utf-8", errors="replace")
+        # Parsing is CPU-bound; keep it off the event loop
+        images, links = await asyncio.to_thread(parse_page, html, url)
+        print(f"Crawling: {url} (Depth: {depth}), found {len(images)} images")
+        if images:
+            await results.put(images)
+
+        if depth < self.max_depth:
+            for link in links:
+                if (urlsplit(link).hostname or "").lower() in self.allowed_hosts and link not in self._seen:
+                    self._seen.add(link)
+                    frontier.put_nowait((link, depth + 1))
+
+    async def _worker(self, frontier: asyncio.Queue, results: asyncio.Queue):
+        while True:
+            url, depth = await frontier.get()
+            try:
+                if self.pages_crawled < self.max_pages:
+                    await self._crawl_one(url, depth, frontier, results)
+            except Exception as e:
+                message = f"Backup crawl error for {url}: {e}"
+                print(message)
+                self.errors.append(message)
+            finally:
+                frontier.task_done()
+
+    async def iter_pages(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yields lists of images, one per crawled page, until the crawl is exhausted or closed."""
+        frontier: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.workers)
+        for url in self.start_urls:
+            if url not in self._seen:
+                self._seen.add(url)
+                frontier.put_nowait((url, 0))
+
+        workers = [asyncio.create_task(self._worker(frontier, results)) for _ in range(self.workers)]
+        finished = asyncio.create_task(frontier.join())
+        try:
+            while True:
+                getter = asyncio.create_task(results.get())
+                done, _ = await asyncio.wait({getter, finished}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                # Frontier drained: hand out anything still buffered, then stop
+                while not results.empty():
+                    yield results.get_nowait()
+                return
+        finally:
+            for task in workers + [finished]:
+                task.cancel()
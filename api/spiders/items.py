@@ -0,0 +1,15 @@
+import scrapy
+
+
+class ImageMetadataItem(scrapy.Item):
+    # Mirrors the image_metadata table columns filled in by the crawler
+    url = scrapy.Field()
+    alt_text = scrapy.Field()
+    width = scrapy.Field()
+    height = scrapy.Field()
+    size = scrapy.Field()
+    format = scrapy.Field()
+    source_url = scrapy.Field()
+    crawl_date = scrapy.Field()
+    tags = scrapy.Field()
+    keyword = scrapy.Field()
@@ -1,21 +1,40 @@
 import scrapy
-from image_crawler.items import ImageMetadataItem
+from scrapy.exceptions import CloseSpider
+from api.spiders.items import ImageMetadataItem
 from datetime import datetime
 
+from lib.shared import config
+
 class ImageSpider(scrapy.Spider):
+    """
+    Standalone Scrapy version of the backup crawler (`scrapy runspider api/spiders/web_crawler.py -a start_url=...`).
+    The crawl job pipeline uses api.spiders.async_crawler, which follows the same rules without
+    blocking the API event loop.
+    """
     name = "image_spider"
     # start_urls = ["http://quotes.toscrape.com/"] # Example URL, will be dynamic
+    custom_settings = {
+        "ROBOTSTXT_OBEY": True,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": config.BACKUP_CRAWL_PER_DOMAIN_CONCURRENCY,
+        "USER_AGENT": config.BACKUP_CRAWL_USER_AGENT,
+    }
 
     def __init__(self, *args, **kwargs):
         super(ImageSpider, self).__init__(*args, **kwargs)
         self.start_urls = [kwargs.get('start_url')]
         self.crawl_job_id = kwargs.get('crawl_job_id') # To link images to a specific crawl job
         self.crawl_depth = int(kwargs.get('crawl_depth', 1))
-        self.current_depth = 0
+        self.limit = int(kwargs.get('limit', config.DEFAULT_CRAWL_LIMIT))
         self.image_count = 0
 
+    def start_requests(self):
+        for url in self.start_urls:
+            yield scrapy.Request(url, callback=self.parse, meta={'crawl_depth': 0})
+
     def parse(self, response):
-        self.logger.info(f"Crawling: {response.url} (Depth: {self.current_depth})")
+        # Depth travels with each request, so concurrent responses do not share a counter
+        depth = response.meta.get('crawl_depth', 0)
+        self.logger.info(f"Crawling: {response.url} (Depth: {depth})")
 
         # Extract image metadata
         for img in response.css('img'):
@@ -33,12 +52,13 @@ class ImageSpider(scrapy.Spider):
                 # tags and model_test_results will be added later or by other pipelines/processes
                 yield item
                 self.image_count += 1
+                if self.image_count >= self.limit:
+                    raise CloseSpider("limit reached")
 
         # Follow links to other pages if crawl_depth allows
-        if self.current_depth < self.crawl_depth:
-            self.current_depth += 1
+        if depth < self.crawl_depth:
             for a in response.css('a::attr(href)'):
-                yield response.follow(a, callback=self.parse)
+                yield response.follow(a, callback=self.parse, meta={'crawl_depth': depth + 1})
 
     def closed(self, reason):
         self.logger.info(f"Spider closed: {self.name}, Reason: {reason}")
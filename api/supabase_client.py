@@ -0,0 +1,42 @@
+import threading
+
+from lib.shared import config
+
+_client = None
+_initialized = False
+_lock = threading.Lock()
+
+
+def is_configured() -> bool:
+    return bool(config.SUPABASE_URL and config.SUPABASE_KEY)
+
+
+def create_client():
+    """A new Supabase client for SUPABASE_URL/SUPABASE_KEY. Raises RuntimeError if they are not set."""
+    if not is_configured():
+        raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set.")
+    # The supabase package pulls in httpx, auth, storage and realtime clients; import it on first use only
+    from supabase import create_client as supabase_create_client
+
+    return supabase_create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+
+
+def get_client():
+    """
+    The process-wide Supabase client, created on first use.
+    Returns None when Supabase is not configured or the client could not be created (tried once).
+    """
+    global _client, _initialized
+    if not _initialized:
+        with _lock:
+            if not _initialized:
+                if is_configured():
+                    try:
+                        _client = create_client()
+                        print("Supabase client initialized.")
+                    except Exception as e:
+                        print(f"Failed to initialize Supabase client: {e}")
+                else:
+                    print("Supabase URL or Key not found in environment variables. Check .env file and environment setup.")
+                _initialized = True
+    return _client
@@ -0,0 +1,143 @@
+"""
+Crawl worker pool.
+
+Runs crawl jobs from the SQLite job queue in separate processes, so crawling does not compete
+with API traffic in the web process:
+
+    python -m api.worker --processes 2 --concurrency 4
+
+Each process runs up to `--concurrency` jobs at once on its own event loop. The supervisor
+restarts processes that die and requeues jobs whose heartbeat went stale, so in-flight jobs
+are recovered after a crash or restart.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime
+
+from lib.shared import config
+from api import job_queue, metrics, supabase_client
+
+HEARTBEAT_INTERVAL = 10 # seconds
+POLL_INTERVAL = 1 # seconds between queue polls when idle
+
+
+async def _heartbeat(queue: job_queue.JobQueue, job_id: str):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        await asyncio.to_thread(queue.heartbeat, job_id)
+
+
+async def _run_job(queue: job_queue.JobQueue, job):
+    # Imported here so the supervisor process does not initialize the API module
+    from api.main import run_image_search_in_background
+
+    job_id = job["id"]
+    heartbeat = asyncio.create_task(_heartbeat(queue, job_id))
+    try:
+        payload = job.get("payload") or {}
+        status = await run_image_search_in_background(
+            job["keyword"], job["crawl_limit"], job_id,
+            should_cancel=lambda: queue.is_cancel_requested(job_id),
+            expand=payload.get("expand"), variants=payload.get("variants"),
+            # Retried jobs and jobs requeued after a lost worker continue from their checkpoints
+            resume=bool(payload.get("resume")) or job["attempts"] > 1)
+        if status is None:
+            # The job never ran (no Supabase client), so there is nothing to report as completed
+            await asyncio.to_thread(queue.finish, job_id, job_queue.FAILED, "Supabase client not initialized.")
+        else:
+            await asyncio.to_thread(queue.finish, job_id, status)
+    except Exception as e:
+        print(f"Worker job {job_id} failed: {e}")
+        await asyncio.to_thread(queue.finish, job_id, job_queue.FAILED, str(e))
+    finally:
+        heartbeat.cancel()
+
+
+async def _worker_loop(concurrency: int):
+    queue = job_queue.get_queue()
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    # Publishes this process's metrics for the API's /metrics endpoint
+    exporter = asyncio.create_task(metrics.export_loop())
+    print(f"Crawl worker {worker_name} started with concurrency {concurrency}.")
+    while True:
+        await slots.acquire()
+        job = await asyncio.to_thread(queue.lease, worker_name)
+        if job is None:
+            slots.release()
+            await asyncio.sleep(POLL_INTERVAL)
+            continue
+        print(f"Worker {worker_name} leased job {job['id']} (attempt {job['attempts']}).")
+        task = asyncio.create_task(_run_job(queue, job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+
+def _worker_main(concurrency: int):
+    asyncio.run(_worker_loop(concurrency))
+
+
+def _recover_stale(queue: job_queue.JobQueue, label: str):
+    """
+    Requeues jobs whose worker died. Jobs the queue gives up on (out of attempts, or cancelled
+    while their worker was gone) have no worker left to close their crawl_jobs row, so it is
+    closed here; otherwise the row would stay running and could never be retried.
+    """
+    recovered, closed = queue.recover_stale()
+    if recovered:
+        print(f"Requeued {len(recovered)} {label} jobs: {', '.join(recovered)}")
+    if not closed:
+        return
+    supabase = supabase_client.get_client()
+    for job_id, status, error in closed:
+        print(f"Crawl job {job_id} {status} after its worker was lost.")
+        if supabase is None:
+            continue
+        update = {"status": status, "end_time": datetime.now().isoformat(), "pid": None}
+        if error:
+            update["errors"] = [error]
+        try:
+            supabase.table("crawl_jobs").update(update).eq("id", job_id).execute()
+        except Exception as e:
+            print(f"Could not update crawl job {job_id}: {e}")
+
+
+def run_pool(processes: int, concurrency: int):
+    """Supervises `processes` worker processes until interrupted."""
+    queue = job_queue.get_queue()
+    _recover_stale(queue, "interrupted")
+
+    workers = {}
+    try:
+        while True:
+            for slot in range(processes):
+                process = workers.get(slot)
+                if process is None or not process.is_alive():
+                    if process is not None:
+                        print(f"Worker process {process.pid} exited with code {process.exitcode}; restarting.")
+                    process = multiprocessing.Process(target=_worker_main, args=(concurrency,), daemon=True)
+                    process.start()
+                    workers[slot] = process
+            _recover_stale(queue, "stale")
+            time.sleep(HEARTBEAT_INTERVAL)
+    except KeyboardInterrupt:
+        print("Stopping crawl workers...")
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the crawl job worker pool.")
+    parser.add_argument("--processes", type=int, default=config.WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=config.WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    run_pool(args.processes, args.concurrency)
@@ -0,0 +1,270 @@
+"""
+In-memory stand-in for the Supabase client, covering the query-builder calls the API makes.
+
+    supabase = FakeSupabase(latency=0.02)
+    supabase.table("crawl_jobs").insert({...}).execute()
+
+Supported: select (column projection), insert, upsert (on_conflict, ignore_duplicates), update, delete,
+eq, gt, in_, or_ (PostgREST logic trees with eq/lt/gt/lte/gte/ilike/cs and nested and()/or()),
+order, range and limit, plus rpc("search_images", ...) from the image search migration.
+Every execute() sleeps `latency` seconds and fails with probability
+`error_rate`, so write paths can be measured against a slow or flaky database.
+"""
+import copy
+import fnmatch
+import random
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+def _split_top_level(expression: str) -> List[str]:
+    """Splits a PostgREST logic list on commas outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in expression:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _compare(value: Any, operator: str, operand: str) -> bool:
+    operand = operand.strip('"')
+    if operator == "ilike":
+        return value is not None and fnmatch.fnmatch(str(value).lower(), operand.lower().replace("%", "*"))
+    if operator == "cs":
+        wanted = [item.strip('"') for item in operand.strip("{}").split(",") if item]
+        return isinstance(value, list) and all(item in value for item in wanted)
+    if value is None:
+        return False
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            operand = type(value)(operand)
+        except ValueError:
+            value = str(value)
+    else:
+        value = str(value)
+    return {
+        "eq": lambda: value == operand,
+        "lt": lambda: value < operand,
+        "gt": lambda: value > operand,
+        "lte": lambda: value <= operand,
+        "gte": lambda: value >= operand,
+    }[operator]()
+
+
+def _matches(row: Dict[str, Any], condition: str) -> bool:
+    for group in ("and", "or"):
+        if condition.startswith(f"{group}(") and condition.endswith(")"):
+            results = (_matches(row, part) for part in _split_top_level(condition[len(group) + 1:-1]))
+            return all(results) if group == "and" else any(results)
+    column, operator, operand = condition.split(".", 2)
+    return _compare(row.get(column), operator, operand)
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table_name = table
+        self._action = "select"
+        self._columns: Optional[List[str]] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+        self._filters: List[Any] = []
+        self._order: List[Any] = []
+        self._range: Optional[Any] = None
+        self._limit: Optional[int] = None
+
+    def select(self, columns: str = "*"):
+        self._action = "select"
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self._action, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: Optional[str] = None, ignore_duplicates: bool = False):
+        self._action, self._payload = "upsert", rows
+        self._on_conflict, self._ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, values: Dict[str, Any]):
+        self._action, self._payload = "update", values
+        return self
+
+    def delete(self):
+        self._action = "delete"
+        return self
+
+    def eq(self, column: str, value: Any):
+        self._filters.append(lambda row: row.get(column) == value or str(row.get(column)) == str(value))
+        return self
+
+    def gt(self, column: str, value: Any):
+        self._filters.append(lambda row: _compare(row.get(column), "gt", str(value)))
+        return self
+
+    def in_(self, column: str, values: List[Any]):
+        wanted = {str(value) for value in values}
+        self._filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def or_(self, expression: str):
+        self._filters.append(lambda row: _matches(row, f"or({expression})"))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int):
+        self._range = (start, end)
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def execute(self) -> FakeResponse:
+        self.db.simulate()
+        with self.db.lock:
+            table = self.db.tables.setdefault(self.table_name, [])
+            if self._action == "select":
+                return FakeResponse(self._select(table))
+            if self._action == "update":
+                updated = [row for row in table if all(check(row) for check in self._filters)]
+                for row in updated:
+                    row.update(copy.deepcopy(self._payload))
+                return FakeResponse(copy.deepcopy(updated))
+            if self._action == "delete":
+                deleted, kept = [], []
+                for row in table:
+                    (deleted if all(check(row) for check in self._filters) else kept).append(row)
+                table[:] = kept
+                return FakeResponse(copy.deepcopy(deleted))
+            rows = self._payload if isinstance(self._payload, list) else [self._payload]
+            return FakeResponse([self.db.write_row(table, self.table_name, row, self._on_conflict,
+                                                   self._ignore_duplicates) for row in copy.deepcopy(rows)])
+
+    def _select(self, table: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rows = [row for row in table if all(check(row) for check in self._filters)]
+        for column, desc in reversed(self._order):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        if self._range is not None:
+            rows = rows[self._range[0]:self._range[1] + 1]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._columns is not None:
+            rows = [{column: row.get(column) for column in self._columns} for row in rows]
+        return copy.deepcopy(rows)
+
+
+def _search_images(rows: List[Dict[str, Any]], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Python version of the search_images database function."""
+    query = (params.get("p_query") or "").lower()
+    descending = params.get("p_descending", False)
+    after_id = params.get("p_after_id")
+    by_date = params.get("p_order_by", "id") == "crawl_date"
+
+    def sort_key(row: Dict[str, Any]):
+        # Rows without a crawl_date sort as the oldest (ISO strings order chronologically)
+        return (row.get("crawl_date") or "", row["id"]) if by_date else (row["id"],)
+
+    def keep(row: Dict[str, Any]) -> bool:
+        if query and not (query in str(row.get("keyword") or "").lower()
+                          or query in str(row.get("alt_text") or "").lower()
+                          or params["p_query"] in (row.get("tags") or [])):
+            return False
+        for column, param in (("source", "p_source"), ("format", "p_format")):
+            if params.get(param) is not None and row.get(column) != params[param]:
+                return False
+        for column, param in (("width", "p_min_width"), ("height", "p_min_height")):
+            if params.get(param) is not None and (row.get(column) or 0) < params[param]:
+                return False
+        if after_id is not None:
+            after = (params.get("p_after_date") or "", int(after_id)) if by_date else (int(after_id),)
+            return sort_key(row) < after if descending else sort_key(row) > after
+        return True
+
+    matches = sorted((row for row in rows if keep(row)), key=sort_key, reverse=descending)
+    return matches[:max(1, min(params.get("p_limit", 100), 1000))]
+
+
+class FakeRpc:
+    def __init__(self, db: "FakeSupabase", name: str, params: Dict[str, Any]):
+        if name != "search_images":
+            raise NotImplementedError(f"FakeSupabase does not implement rpc {name}")
+        self.db = db
+        self.params = params
+        self._columns: Optional[List[str]] = None
+
+    def select(self, *columns: str):
+        joined = ",".join(columns)
+        self._columns = None if joined.strip() == "*" else [c.strip() for c in joined.split(",")]
+        return self
+
+    def execute(self) -> FakeResponse:
+        self.db.simulate()
+        with self.db.lock:
+            rows = _search_images(self.db.tables.get("image_metadata", []), self.params)
+            if self._columns is not None:
+                rows = [{column: row.get(column) for column in self._columns} for row in rows]
+            return FakeResponse(copy.deepcopy(rows))
+
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self._next_ids: Dict[str, int] = {}
+        self._random = random.Random(seed)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    def simulate(self):
+        with self.lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise RuntimeError("Simulated Supabase error")
+
+    def write_row(self, table: List[Dict[str, Any]], table_name: str, row: Dict[str, Any],
+                  on_conflict: Optional[str], ignore_duplicates: bool) -> Dict[str, Any]:
+        if on_conflict:
+            keys = [key.strip() for key in on_conflict.split(",")]
+            for existing in table:
+                if all(existing.get(key) == row.get(key) for key in keys):
+                    if not ignore_duplicates:
+                        existing.update({k: v for k, v in row.items() if k != "id"})
+                    return existing
+        if "id" not in row:
+            self._next_ids[table_name] = self._next_ids.get(table_name, 0) + 1
+            row["id"] = self._next_ids[table_name]
+        table.append(row)
+        return row
@@ -0,0 +1,164 @@
+"""
+Local stand-ins for the image providers and their image CDN.
+
+    python -m bench.mock_servers --port 8089 --latency 0.05 --error-rate 0.01
+
+One aiohttp server answers with the response shapes of each provider, so the real api_sources
+modules can be pointed at it by swapping their BASE_URL:
+
+    /pixabay/api/               Pixabay search       (hits, webformatURL, ...)
+    /pexels/v1/search           Pexels search        (photos, src.medium, ...)
+    /unsplash/search/photos     Unsplash search      (results, urls.regular, ...)
+    /google/customsearch/v1     Google CSE (images)  (items, link, ...)
+    /mock/search                api.api_sources.mock_provider's MOCK_PROVIDER_URL
+    /images/<seed>.jpg          image CDN, serving a small JPEG generated from the seed
+
+Every request waits `latency` seconds (plus up to `jitter`), and search requests fail with
+HTTP 500 with probability `error_rate`. Results are deterministic per (provider, query, position),
+so runs are repeatable and distinct queries never share image URLs.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import random
+from collections import OrderedDict
+from typing import List, Dict, Any
+
+PROVIDERS = {
+    # Path -> (provider, page size parameter, maximum page size)
+    "/pixabay/api/": ("pixabay", "per_page", 200),
+    "/pexels/v1/search": ("pexels", "per_page", 80),
+    "/unsplash/search/photos": ("unsplash", "per_page", 30),
+    "/google/customsearch/v1": ("google", "num", 10),
+    "/mock/search": ("mock", "per_page", 100),
+}
+
+
+class MockServers:
+    def __init__(self, base_url: str, latency: float = 0.05, jitter: float = 0.02, error_rate: float = 0.0,
+                 results_per_query: int = 500, image_size: int = 256, seed: int = 0):
+        self.base_url = base_url.rstrip("/")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.results_per_query = results_per_query
+        self.image_size = image_size
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._images: "OrderedDict[str, bytes]" = OrderedDict()
+
+    async def _delay(self):
+        self.requests += 1
+        await asyncio.sleep(self.latency + self._random.random() * self.jitter)
+
+    def _seed(self, provider: str, query: str, position: int) -> str:
+        return hashlib.blake2b(f"{provider}:{query}:{position}".encode("utf-8"), digest_size=8).hexdigest()
+
+    def _results(self, provider: str, query: str, start: int, count: int) -> List[Dict[str, Any]]:
+        end = min(start + count, self.results_per_query)
+        results = []
+        for position in range(start, end):
+            seed = self._seed(provider, query, position)
+            image_url = f"{self.base_url}/images/{seed}.jpg"
+            page_url = f"https://{provider}.example/photos/{seed}"
+            size = self.image_size
+            alt = f"{query} {position}"
+            if provider == "pixabay":
+                results.append({"webformatURL": image_url, "pageURL": page_url, "tags": f"{query}, bench",
+                                "webformatWidth": size, "webformatHeight": size})
+            elif provider == "pexels":
+                results.append({"src": {"medium": image_url}, "url": page_url, "alt": alt,
+                                "width": size, "height": size})
+            elif provider == "unsplash":
+                results.append({"urls": {"regular": image_url}, "links": {"html": page_url},
+                                "alt_description": alt, "width": size, "height": size,
+                                "tags": [{"title": query}]})
+            elif provider == "google":
+                results.append({"link": image_url, "title": alt, "fileFormat": "image/jpeg",
+                                "image": {"contextLink": page_url, "width": size, "height": size}})
+            else:
+                results.append({"url": image_url, "source_url": page_url, "alt_text": alt, "width": size,
+                                "height": size, "size": None, "format": "jpg", "tags": [query]})
+        return results
+
+    async def search(self, request):
+        from aiohttp import web
+
+        await self._delay()
+        if self._random.random() < self.error_rate:
+            return web.json_response({"error": "simulated failure"}, status=500)
+        provider, size_param, max_size = PROVIDERS[request.path]
+        query = request.query.get("q") or request.query.get("query") or ""
+        count = min(int(request.query.get(size_param, max_size)), max_size)
+        if provider == "google":
+            start = int(request.query.get("start", 1)) - 1
+        else:
+            start = (int(request.query.get("page", 1)) - 1) * count
+        results = self._results(provider, query, start, count)
+        headers = {"X-RateLimit-Remaining": "100000", "X-RateLimit-Reset": "60"}
+        key = {"pixabay": "hits", "pexels": "photos", "unsplash": "results", "google": "items", "mock": "hits"}[provider]
+        return web.json_response({key: results, "total": self.results_per_query}, headers=headers)
+
+    def _render_image(self, seed: str) -> bytes:
+        from PIL import Image
+
+        content = self._images.get(seed)
+        if content is None:
+            rng = random.Random(seed)
+            # Blocks of random colour, so the images differ for perceptual dedup as well
+            blocks = Image.new("RGB", (8, 8))
+            blocks.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(64)])
+            image = blocks.resize((self.image_size, self.image_size))
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=85)
+            content = buffer.getvalue()
+            self._images[seed] = content
+            if len(self._images) > 4096:
+                self._images.popitem(last=False)
+        return content
+
+    async def image(self, request):
+        from aiohttp import web
+
+        await self._delay()
+        seed = request.match_info["seed"]
+        return web.Response(body=self._render_image(seed), content_type="image/jpeg")
+
+    async def health(self, request):
+        from aiohttp import web
+
+        return web.json_response({"status": "ok", "requests": self.requests})
+
+    def app(self):
+        from aiohttp import web
+
+        app = web.Application()
+        for path in PROVIDERS:
+            app.router.add_get(path, self.search)
+        app.router.add_get("/images/{seed}.jpg", self.image)
+        app.router.add_get("/health", self.health)
+        return app
+
+
+def main():
+    from aiohttp import web
+
+    parser = argparse.ArgumentParser(description="Run local mock image providers and a mock image CDN.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.05, help="Base delay per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random delay per request in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of search requests answered with HTTP 500")
+    parser.add_argument("--results-per-query", type=int, default=500)
+    parser.add_argument("--image-size", type=int, default=256, help="Edge length of the generated JPEGs in pixels")
+    args = parser.parse_args()
+
+    servers = MockServers(f"http://{args.host}:{args.port}", latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, results_per_query=args.results_per_query,
+                          image_size=args.image_size)
+    web.run_app(servers.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Negative-sample check for the reference QR detector (api/models/qr_detector.py).
+
+    python -m bench.qr_negatives
+    python -m bench.qr_negatives --samples 50 --sigma 40 --sigma 80 --blur 0 --blur 1 --blur 2
+
+Runs the detector over seeded Gaussian noise images (blurred with each --blur radius) that cannot
+contain a QR code, and over synthetic QR codes drawn with Pillow as a sanity check that it still
+finds real ones. Exits with status 1 on any false positive or missed QR code, so detector changes
+can be checked in CI.
+"""
+import argparse
+import random
+import sys
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from api import derivatives, model_plugins
+from api.models import qr_detector
+
+SIZE = 400
+
+
+def prepare(image: Image.Image, image_id: str) -> model_plugins.PreparedImage:
+    """Letterboxes the image to the detector's input like the model runner does."""
+    detector = qr_detector.QRDetector
+    converted = derivatives.letterbox_image(image, detector.input_mode, detector.input_size, image.size,
+                                            detector.input_fill)
+    return model_plugins.PreparedImage(image_id, converted.mode, converted.size, converted.tobytes(), image.size,
+                                       model_plugins.content_box(image.size, detector.input_size))
+
+
+def noise_image(rng: random.Random, sigma: float, blur: float) -> Image.Image:
+    # Sampling from a table of Gaussian values is much faster than one gauss() call per pixel
+    table = [max(0, min(255, int(rng.gauss(128, sigma)))) for _ in range(4096)]
+    pixels = bytes(rng.choices(table, k=SIZE * SIZE))
+    image = Image.frombytes("L", (SIZE, SIZE), pixels)
+    return image.filter(ImageFilter.GaussianBlur(blur)) if blur else image
+
+
+def synthetic_qr(rng: random.Random, version: int, module: int, angle: float) -> Image.Image:
+    """A QR-shaped image: finder and timing patterns as in the standard, random data modules."""
+    dimension = 4 * version + 17
+    dark = [[rng.random() < 0.5 for _ in range(dimension)] for _ in range(dimension)]
+    for top, left in ((0, 0), (0, dimension - 7), (dimension - 7, 0)):
+        # 7x7 finder (dark ring, light ring, 3x3 centre) plus its light separator
+        for row in range(-1, 8):
+            for col in range(-1, 8):
+                if 0 <= top + row < dimension and 0 <= left + col < dimension:
+                    ring = max(abs(row - 3), abs(col - 3))
+                    dark[top + row][left + col] = ring in (0, 1, 3)
+    for index in range(8, dimension - 8):
+        dark[6][index] = dark[index][6] = index % 2 == 0
+
+    quiet = 4 * module
+    image = Image.new("L", (dimension * module + 2 * quiet, dimension * module + 2 * quiet), 255)
+    draw = ImageDraw.Draw(image)
+    for row in range(dimension):
+        for col in range(dimension):
+            if dark[row][col]:
+                x, y = quiet + col * module, quiet + row * module
+                draw.rectangle((x, y, x + module - 1, y + module - 1), fill=0)
+    return image.rotate(angle, expand=True, fillcolor=255) if angle else image
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the QR detector for false positives on noise.")
+    parser.add_argument("--samples", type=int, default=20, help="Noise images per sigma and blur radius")
+    parser.add_argument("--sigma", type=float, action="append", help="Noise standard deviation (default 40, 80)")
+    parser.add_argument("--blur", type=float, action="append", help="Gaussian blur radius (default 0, 1, 2)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    detector = qr_detector.QRDetector()
+    detector.load()
+    rng = random.Random(args.seed)
+    failures: List[str] = []
+
+    for sigma in args.sigma or [40, 80]:
+        for blur in args.blur or [0, 1, 2]:
+            images = [prepare(noise_image(rng, sigma, blur), f"noise-{sigma}-{blur}-{i}") for i in range(args.samples)]
+            positives = [image.image_id for image, prediction in zip(images, detector.predict_batch(images))
+                         if prediction["positive"]]
+            print(f"noise sigma={sigma:g} blur={blur:g}: {len(positives)}/{len(images)} false positives")
+            failures.extend(f"false positive on {image_id}" for image_id in positives)
+
+    cases: List[Tuple[int, int, float]] = [(version, module, angle) for version in (1, 3, 7)
+                                           for module in (4, 8) for angle in (0, 15, 90)]
+    images = [prepare(synthetic_qr(rng, *case), f"qr-v{case[0]}-m{case[1]}-r{case[2]:g}") for case in cases]
+    missed = [image.image_id for image, prediction in zip(images, detector.predict_batch(images))
+              if not prediction["positive"]]
+    print(f"synthetic QR codes: {len(images) - len(missed)}/{len(images)} detected")
+    failures.extend(f"missed {image_id}" for image_id in missed)
+
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Offline benchmark for the crawl pipeline and the ZIP export.
+
+    python -m bench.run --jobs 20 --concurrency 5 --limit 50 --downloads 5
+    python -m bench.run --json bench-results.json
+    python -m bench.run --baseline bench-results.json   # prints the change against an earlier run
+    python -m bench.run --batch                          # the same jobs as one POST /api/crawl/batch
+
+Runs the real FastAPI app (inline job backend) under uvicorn against:
+  * bench.mock_servers in a subprocess, standing in for Pixabay, Pexels, Unsplash, Google CSE
+    and the image CDN, with configurable latency and error rate;
+  * bench.fake_supabase in place of the Supabase client, with configurable latency and error rate.
+
+Reports jobs/sec, images/sec, p50/p99 latency and peak RSS for POST /api/crawl (until the job
+finishes) and GET /api/images/download. No API keys or Supabase project are needed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for an empty list)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KB on Linux (bytes on macOS); good enough where /proc is unavailable
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler:
+    """Tracks the peak resident set size of this process while a scenario runs."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample(self):
+        while True:
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            await asyncio.sleep(self.interval)
+
+    async def __aenter__(self):
+        self.peak_mb = current_rss_mb()
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._task.cancel()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+def _configure_environment(args, workdir: str, mock_url: str):
+    """Settings must be in the environment before the api modules (and lib.shared.config) are imported."""
+    os.environ.update({
+        "JOB_QUEUE_BACKEND": "inline",
+        "BATCH_INLINE_CONCURRENCY": str(args.concurrency),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "job_queue.sqlite3"),
+        "IMAGE_STORAGE_PATH": os.path.join(workdir, "images"),
+        "SEARCH_CACHE_ENABLED": "true" if args.search_cache else "false",
+        "SEARCH_CACHE_PATH": "",
+        "METRICS_DIR": "",
+        "BACKUP_CRAWL_ENABLED": "false",
+        "DOWNLOAD_IMAGES_ON_CRAWL": "false" if args.no_store else "true",
+        "DEDUP_PERCEPTUAL": "true" if args.perceptual else "false",
+        "MOCK_PROVIDER_URL": f"{mock_url}/mock/search",
+        "MOCK_PROVIDER_IMAGE_URL": f"{mock_url}/images/{{seed}}.jpg",
+        "SOURCE_MODULES": ",".join(f"api.api_sources.{name}" for name in args.sources),
+        # Any value enables the sources; requests only ever reach the mock servers
+        "PIXABAY_API_KEY": "bench",
+        "PEXELS_API_KEY": "bench",
+        "UNSPLASH_ACCESS_KEY": "bench",
+        "GOOGLE_CUSTOM_SEARCH_API_KEY": "bench",
+        "GOOGLE_CSE_ID": "bench",
+    })
+    os.environ.pop("SUPABASE_URL", None)
+    os.environ.pop("SUPABASE_KEY", None)
+
+
+def _point_sources_at(mock_url: str):
+    from api import rate_limit, sources
+    from api.api_sources import pixabay, pexels, unsplash, google_images
+
+    pixabay.BASE_URL = f"{mock_url}/pixabay/api/"
+    pexels.BASE_URL = f"{mock_url}/pexels/v1/search"
+    unsplash.BASE_URL = f"{mock_url}/unsplash/search/photos"
+    google_images.BASE_URL = f"{mock_url}/google/customsearch/v1"
+    # Measure the pipeline, not the providers' free-tier quotas
+    for adapter in sources.get_sources():
+        rate_limit.set_quota(adapter.name, 1_000_000, 1)
+
+
+def _start_mock_servers(args, port: int) -> subprocess.Popen:
+    command = [sys.executable, "-m", "bench.mock_servers", "--port", str(port),
+               "--latency", str(args.provider_latency), "--jitter", str(args.provider_jitter),
+               "--error-rate", str(args.provider_error_rate), "--image-size", str(args.image_size)]
+    return subprocess.Popen(command, cwd=REPO_ROOT)
+
+
+async def _wait_until_up(client, url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with client.get(url) as response:
+                if response.status < 500:
+                    return
+        except Exception:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{url} did not come up within {timeout}s")
+        await asyncio.sleep(0.1)
+
+
+def _job_row(fake, job_id: str) -> Optional[Dict[str, Any]]:
+    with fake.lock:
+        for row in fake.tables.get("crawl_jobs", []):
+            if row["id"] == job_id:
+                return dict(row)
+    return None
+
+
+async def bench_crawl(client, api_url: str, fake, args) -> Dict[str, Any]:
+    slots = asyncio.Semaphore(args.concurrency)
+    post_latencies: List[float] = []
+    job_latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    images = 0
+
+    async def run_job(index: int):
+        nonlocal images
+        async with slots:
+            started = time.perf_counter()
+            async with client.post(f"{api_url}/api/crawl",
+                                   json={"keyword": f"{args.keyword}-{index}", "limit": args.limit}) as response:
+                body = await response.json()
+            post_latencies.append(time.perf_counter() - started)
+            if response.status != 200:
+                statuses["rejected"] = statuses.get("rejected", 0) + 1
+                return
+            while True:
+                row = _job_row(fake, body["job_id"])
+                if row and row["status"] in TERMINAL_STATUSES:
+                    break
+                await asyncio.sleep(0.02)
+            job_latencies.append(time.perf_counter() - started)
+            statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+            images += row.get("image_count") or 0
+
+    async with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_job(i) for i in range(args.jobs)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "jobs": args.jobs,
+        "statuses": statuses,
+        "images": images,
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_second": round(args.jobs / elapsed, 2),
+        "images_per_second": round(images / elapsed, 1),
+        "post_p50_ms": _ms(percentile(post_latencies, 50)),
+        "post_p99_ms": _ms(percentile(post_latencies, 99)),
+        "job_p50_ms": _ms(percentile(job_latencies, 50)),
+        "job_p99_ms": _ms(percentile(job_latencies, 99)),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+
+
+async def bench_batch(client, api_url: str, args) -> Dict[str, Any]:
+    """Runs the crawl scenario's jobs as one batch and polls its aggregate progress until done."""
+    keywords = [f"{args.keyword}-{index}" for index in range(args.jobs)]
+    async with RssSampler() as rss:
+        started = time.perf_counter()
+        async with client.post(f"{api_url}/api/crawl/batch", json={"keywords": keywords, "limit": args.limit}) as response:
+            response.raise_for_status()
+            batch_id = (await response.json())["batch_id"]
+        post_latency = time.perf_counter() - started
+        while True:
+            async with client.get(f"{api_url}/api/crawl/batches/{batch_id}") as response:
+                summary = await response.json()
+            if summary["status"] == "done":
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "jobs": args.jobs,
+        "statuses": summary["statuses"],
+        "images": summary["image_count"],
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_second": round(args.jobs / elapsed, 2),
+        "images_per_second": round(summary["image_count"] / elapsed, 1),
+        "post_p50_ms": _ms(post_latency),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+
+
+async def bench_download(client, api_url: str, args) -> Dict[str, Any]:
+    slots = asyncio.Semaphore(args.download_concurrency)
+    first_byte: List[float] = []
+    totals: List[float] = []
+    sizes: List[int] = []
+
+    async def download():
+        async with slots:
+            started = time.perf_counter()
+            size = 0
+            async with client.get(f"{api_url}/api/images/download", params={"keyword": args.keyword}) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_any():
+                    if not size:
+                        first_byte.append(time.perf_counter() - started)
+                    size += len(chunk)
+            totals.append(time.perf_counter() - started)
+            sizes.append(size)
+
+    async with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(download() for _ in range(args.downloads)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "downloads": args.downloads,
+        "archive_mb": round(sum(sizes) / len(sizes) / 1e6, 2) if sizes else 0,
+        "elapsed_seconds": round(elapsed, 3),
+        "downloads_per_second": round(args.downloads / elapsed, 2),
+        "mb_per_second": round(sum(sizes) / elapsed / 1e6, 1),
+        "ttfb_p50_ms": _ms(percentile(first_byte, 50)),
+        "ttfb_p99_ms": _ms(percentile(first_byte, 99)),
+        "total_p50_ms": _ms(percentile(totals, 50)),
+        "total_p99_ms": _ms(percentile(totals, 99)),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+async def run_benchmarks(args) -> Dict[str, Any]:
+    import aiohttp
+    import uvicorn
+
+    workdir = tempfile.mkdtemp(prefix="image-crawl-bench-")
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    _configure_environment(args, workdir, mock_url)
+    mock_servers = _start_mock_servers(args, args.mock_port)
+    try:
+        from api import main
+        from bench.fake_supabase import FakeSupabase
+
+        _point_sources_at(mock_url)
+        fake = FakeSupabase(latency=args.db_latency, error_rate=args.db_error_rate)
+        main.supabase = fake
+
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.api_port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        timeout = aiohttp.ClientTimeout(total=None)
+        async with aiohttp.ClientSession(timeout=timeout) as client:
+            await _wait_until_up(client, f"{mock_url}/health")
+            await _wait_until_up(client, f"{api_url}/health")
+            if args.batch:
+                results = {"crawl": await bench_batch(client, api_url, args)}
+            else:
+                results = {"crawl": await bench_crawl(client, api_url, fake, args)}
+            if args.downloads:
+                results["download"] = await bench_download(client, api_url, args)
+        results["supabase_calls"] = fake.calls
+        server.should_exit = True
+        await server_task
+        return results
+    finally:
+        mock_servers.terminate()
+        mock_servers.wait(timeout=10)
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    for scenario in ("crawl", "download"):
+        if scenario not in results:
+            continue
+        print(f"\n== {scenario} ==")
+        for key, value in results[scenario].items():
+            line = f"  {key:<22} {value}"
+            previous = (baseline or {}).get(scenario, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+                line += f"  ({(value - previous) / previous * 100:+.1f}% vs baseline {previous})"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawl jobs and ZIP exports against local mocks.")
+    parser.add_argument("--jobs", type=int, default=20, help="Crawl jobs to run")
+    parser.add_argument("--concurrency", type=int, default=5, help="Crawl jobs in flight at once")
+    parser.add_argument("--limit", type=int, default=50, help="Images per crawl job")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit the jobs as one POST /api/crawl/batch (run --concurrency at a time)")
+    parser.add_argument("--keyword", default="bench")
+    parser.add_argument("--downloads", type=int, default=5, help="ZIP exports to run after the crawl (0 to skip)")
+    parser.add_argument("--download-concurrency", type=int, default=1)
+    parser.add_argument("--sources", nargs="+", default=["pixabay", "pexels", "unsplash", "google_images"],
+                        help="api_sources modules to enable (e.g. mock_provider)")
+    parser.add_argument("--provider-latency", type=float, default=0.05)
+    parser.add_argument("--provider-jitter", type=float, default=0.02)
+    parser.add_argument("--provider-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.01, help="Seconds per fake Supabase call")
+    parser.add_argument("--db-error-rate", type=float, default=0.0)
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--no-store", action="store_true", help="Do not download images at crawl time")
+    parser.add_argument("--perceptual", action="store_true", help="Enable perceptual (dHash) dedup")
+    parser.add_argument("--search-cache", action="store_true", help="Enable the provider search cache")
+    parser.add_argument("--mock-port", type=int, default=8089)
+    parser.add_argument("--api-port", type=int, default=8099)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
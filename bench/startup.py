@@ -0,0 +1,130 @@
+"""
+Cold-start profile of the API module.
+
+    python -m bench.startup
+    python -m bench.startup --runs 5 --budget-ms 600 --top 20
+
+Imports api.main in fresh interpreters with `python -X importtime`, serves one GET /health
+straight through the ASGI app, and reports the median import and first-request times plus the
+modules that cost the most to import. Exits with status 1 when the median import time is over
+--budget-ms, so it can guard cold-start latency in CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import List, Dict, Any
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; calls the ASGI app directly so no HTTP client is imported
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import api.main
+imported = time.perf_counter()
+
+async def first_request():
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/health", "raw_path": b"/health", "query_string": b"",
+             "root_path": "", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80)}
+    await api.main.app(scope, receive, send)
+    return messages[0]["status"]
+
+status = asyncio.run(first_request())
+print(json.dumps({"import_ms": (imported - started) * 1000,
+                  "first_request_ms": (time.perf_counter() - imported) * 1000, "status": status}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parses `-X importtime` lines into {module, self_us, cumulative_us, depth}."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        modules.append({
+            "module": name.strip(),
+            "self_us": int(head.split(":", 1)[1]),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return modules
+
+
+def direct_imports(modules: List[Dict[str, Any]], parent: str) -> List[Dict[str, Any]]:
+    """Modules imported directly by `parent` (importtime lists children right before their parent)."""
+    for index, module in enumerate(modules):
+        if module["module"] == parent:
+            children = []
+            for child in reversed(modules[:index]):
+                if child["depth"] <= module["depth"]:
+                    break
+                if child["depth"] == module["depth"] + 1:
+                    children.append(child)
+            return children
+    return []
+
+
+def profile_once() -> Dict[str, Any]:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["modules"] = parse_importtime(result.stderr)
+    return timings
+
+
+def median(values: List[float]) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the API's import time and first request latency.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to measure (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", 800)),
+                        help="Fail when the median import of api.main takes longer")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list by cumulative import time")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    runs = [profile_once() for _ in range(max(1, args.runs))]
+    import_ms = median([run["import_ms"] for run in runs])
+    first_request_ms = median([run["first_request_ms"] for run in runs])
+
+    # Direct imports of api.main show which dependency pays for what
+    last = runs[-1]["modules"]
+    direct = sorted(direct_imports(last, "api.main"), key=lambda m: -m["cumulative_us"])
+    heaviest_self = sorted(last, key=lambda m: -m["self_us"])
+
+    print(f"import api.main: {import_ms:.1f} ms (median of {len(runs)}; budget {args.budget_ms:.0f} ms)")
+    print(f"first GET /health: {first_request_ms:.1f} ms (status {runs[-1]['status']})")
+    print("\nDirect imports of api.main by cumulative time:")
+    for module in direct[:args.top]:
+        print(f"  {module['cumulative_us'] / 1000:8.1f} ms  {module['module']}")
+    print("\nModules by self time:")
+    for module in heaviest_self[:args.top]:
+        print(f"  {module['self_us'] / 1000:8.1f} ms  {module['module']}")
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump({"import_ms": import_ms, "first_request_ms": first_request_ms, "budget_ms": args.budget_ms,
+                       "direct_imports": [{"module": m["module"], "ms": m["cumulative_us"] / 1000} for m in direct]},
+                      results_file, indent=2)
+
+    if import_ms > args.budget_ms:
+        print(f"\nOver budget by {import_ms - args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,35 @@
 # shared/config.py
 # Common configuration settings for the crawler and dashboard.
 
-# Supabase configuration
 import os
 
-SUPABASE_URL = os.environ.get("SUPABASE_URL", "YOUR_SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "YOUR_SUPABASE_ANON_KEY")
+# Environment: the nearest .env file is loaded once, here, before any setting is read.
+# Set LOAD_DOTENV=false where the platform injects the environment (e.g. Vercel) to skip the directory walk.
+if os.environ.get("LOAD_DOTENV", "true").lower() == "true":
+    try:
+        from dotenv import load_dotenv, find_dotenv
+        load_dotenv(find_dotenv())
+    except ImportError:
+        pass
+
+# Supabase configuration (the client is created on first use, see api/supabase_client.py)
+SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "")
+
+# Image search API keys
+PIXABAY_API_KEY = os.environ.get("PIXABAY_API_KEY")
+PEXELS_API_KEY = os.environ.get("PEXELS_API_KEY")
+UNSPLASH_ACCESS_KEY = os.environ.get("UNSPLASH_ACCESS_KEY")
+GOOGLE_CUSTOM_SEARCH_API_KEY = os.environ.get("GOOGLE_CUSTOM_SEARCH_API_KEY")
+GOOGLE_CSE_ID = os.environ.get("GOOGLE_CSE_ID")
+
+# API startup: clients and source modules are created on first use unless EAGER_INIT is set
+EAGER_INIT = os.environ.get("EAGER_INIT", "false").lower() == "true" # Warm them at startup instead (long-running servers)
 
 # Image storage configuration (e.g., local path or cloud storage bucket)
-IMAGE_STORAGE_PATH = "./images"
+IMAGE_STORAGE_PATH = os.environ.get("IMAGE_STORAGE_PATH", "./images")
+DOWNLOAD_IMAGES_ON_CRAWL = os.environ.get("DOWNLOAD_IMAGES_ON_CRAWL", "true").lower() == "true" # Store verified copies at crawl time
+IMAGE_DOWNLOAD_CONCURRENCY = int(os.environ.get("IMAGE_DOWNLOAD_CONCURRENCY", 16)) # Parallel downloads per job
 
 # Default crawling settings
 DEFAULT_CRAWL_DEPTH = 1
@@ -16,3 +37,100 @@ DEFAULT_CRAWL_LIMIT = 100
 
 # API endpoints for inter-service communication (if applicable)
 CRAWLER_API_URL = "http://localhost:8000/api/crawler"
+
+# Shared HTTP client settings (connection pool used by API sources and image downloads)
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 20)) # Number of hosts kept in the pool
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 16)) # Keep-alive connections per host
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 3)) # Retries on connection errors, 429 and 5xx
+HTTP_BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.5)) # Exponential backoff base (seconds)
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 15)) # Default request timeout (seconds)
+
+# Provider rate limiting
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", 10)) # Longest a call is deferred before rerouting (seconds)
+
+# ZIP export settings
+ZIP_DOWNLOAD_CONCURRENCY = int(os.environ.get("ZIP_DOWNLOAD_CONCURRENCY", 16)) # Parallel image downloads per export
+
+# Sharded dataset export (python -m api.dataset_export)
+DATASET_SHARD_BYTES = int(os.environ.get("DATASET_SHARD_BYTES", 512 * 1024 * 1024)) # Tar shard size before a new shard is started
+DATASET_SHARD_SAMPLES = int(os.environ.get("DATASET_SHARD_SAMPLES", 10000)) # Samples per shard, whichever limit is hit first
+DATASET_MANIFEST_ROW_GROUP = int(os.environ.get("DATASET_MANIFEST_ROW_GROUP", 5000)) # Manifest rows buffered per write
+
+# Supabase bulk write settings
+DB_WRITE_CHUNK_SIZE = int(os.environ.get("DB_WRITE_CHUNK_SIZE", 200)) # Rows per bulk upsert
+DB_WRITE_MAX_IN_FLIGHT = int(os.environ.get("DB_WRITE_MAX_IN_FLIGHT", 2)) # Concurrent chunk writes per job
+
+# Duplicate detection
+DEDUP_PERCEPTUAL = os.environ.get("DEDUP_PERCEPTUAL", "false").lower() == "true" # Also drop near-duplicates by dHash (downloads each image)
+DEDUP_PHASH_MAX_DISTANCE = int(os.environ.get("DEDUP_PHASH_MAX_DISTANCE", 4)) # Max differing bits for a near-duplicate
+
+# Search result cache (in front of the api_sources search functions)
+SEARCH_CACHE_ENABLED = os.environ.get("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 3600)) # Default freshness (seconds)
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", 64 * 1024 * 1024)) # In-memory cap before LRU eviction
+SEARCH_CACHE_PATH = os.environ.get("SEARCH_CACHE_PATH") # Optional SQLite file for an on-disk tier
+
+# Crawl job queue and worker pool
+JOB_QUEUE_BACKEND = os.environ.get("JOB_QUEUE_BACKEND", "sqlite") # "sqlite" (worker pool) or "inline" (BackgroundTasks)
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", "./data/job_queue.sqlite3")
+# Provider rate-limit buckets shared by the API and worker processes ("" keeps them per process)
+RATE_LIMIT_STATE_PATH = os.environ.get("RATE_LIMIT_STATE_PATH", JOB_QUEUE_PATH if JOB_QUEUE_BACKEND != "inline" else "")
+JOB_LEASE_TIMEOUT = float(os.environ.get("JOB_LEASE_TIMEOUT", 60)) # Seconds without heartbeat before a job is requeued
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", 2))
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", 4)) # Concurrent jobs per worker process
+BATCH_MAX_KEYWORDS = int(os.environ.get("BATCH_MAX_KEYWORDS", 1000)) # Keywords per POST /api/crawl/batch
+BATCH_INLINE_CONCURRENCY = int(os.environ.get("BATCH_INLINE_CONCURRENCY", 4)) # Concurrent batch jobs with the inline backend
+
+# Backup web crawling (used when the API sources cannot fill a job's limit)
+BACKUP_CRAWL_ENABLED = os.environ.get("BACKUP_CRAWL_ENABLED", "true").lower() == "true"
+BACKUP_CRAWL_START_URLS = [
+    url.strip() for url in os.environ.get("BACKUP_CRAWL_START_URLS", "").split(",") if url.strip()
+] # Comma-separated templates, {keyword} is replaced with the URL-encoded keyword; none configured skips the crawl
+BACKUP_CRAWL_PER_DOMAIN_CONCURRENCY = int(os.environ.get("BACKUP_CRAWL_PER_DOMAIN_CONCURRENCY", 2))
+BACKUP_CRAWL_WORKERS = int(os.environ.get("BACKUP_CRAWL_WORKERS", 8))
+BACKUP_CRAWL_MAX_PAGES = int(os.environ.get("BACKUP_CRAWL_MAX_PAGES", 50)) # Page budget per job
+BACKUP_CRAWL_USER_AGENT = os.environ.get("BACKUP_CRAWL_USER_AGENT", "image-crawl-model-test/1.0")
+
+# Adaptive query expansion: related queries when a keyword's own results run dry (see api/query_expansion.py)
+QUERY_EXPANSION_ENABLED = os.environ.get("QUERY_EXPANSION_ENABLED", "false").lower() == "true" # Default for requests that do not set `expand`
+QUERY_EXPANSION_MAX_VARIANTS = int(os.environ.get("QUERY_EXPANSION_MAX_VARIANTS", 8)) # Related queries tried per job
+QUERY_EXPANSION_PARALLEL = int(os.environ.get("QUERY_EXPANSION_PARALLEL", 2)) # Related queries searched at once
+QUERY_EXPANSION_MIN_TAG_COUNT = int(os.environ.get("QUERY_EXPANSION_MIN_TAG_COUNT", 2)) # Results a tag must appear on
+QUERY_SYNONYMS_PATH = os.environ.get("QUERY_SYNONYMS_PATH", "") # Optional JSON file: {"keyword": ["related query", ...]}
+
+# Job checkpoints: accepted pages are committed as they arrive so failed jobs can resume (see api/checkpoint.py)
+CHECKPOINT_ENABLED = os.environ.get("CHECKPOINT_ENABLED", "true").lower() == "true" # Requires the crawl_job_checkpoints table
+
+# Job progress streaming
+PROGRESS_PUBLISH_INTERVAL = float(os.environ.get("PROGRESS_PUBLISH_INTERVAL", 1.0)) # Seconds between progress snapshots
+
+# Metrics and tracing (GET /metrics)
+METRICS_DIR = os.environ.get("METRICS_DIR", "./data/metrics") # Worker processes export their metrics here; empty disables
+METRICS_EXPORT_INTERVAL = float(os.environ.get("METRICS_EXPORT_INTERVAL", 5.0)) # Seconds between worker exports
+METRICS_TRACE_MAX_SPANS = int(os.environ.get("METRICS_TRACE_MAX_SPANS", 500)) # Spans kept per job trace
+
+# Image sources: modules that register a source adapter on import (see api/sources.py)
+SOURCE_MODULES = [name.strip() for name in os.environ.get(
+    "SOURCE_MODULES",
+    "api.api_sources.pixabay,api.api_sources.pexels,api.api_sources.unsplash,api.api_sources.google_images",
+).split(",") if name.strip()]
+
+# Mock provider for load testing (add api.api_sources.mock_provider to SOURCE_MODULES)
+MOCK_PROVIDER_URL = os.environ.get("MOCK_PROVIDER_URL", "") # Local mock search server; empty generates results in-process
+MOCK_PROVIDER_IMAGE_URL = os.environ.get("MOCK_PROVIDER_IMAGE_URL", "http://127.0.0.1:8089/images/{seed}.jpg")
+MOCK_PROVIDER_LATENCY = float(os.environ.get("MOCK_PROVIDER_LATENCY", 0.05)) # Seconds per generated page
+MOCK_PROVIDER_TOTAL_RESULTS = int(os.environ.get("MOCK_PROVIDER_TOTAL_RESULTS", 1000))
+MOCK_PROVIDER_QUOTA = int(os.environ.get("MOCK_PROVIDER_QUOTA", 1000)) # Requests per second
+
+# Model testing (python -m api.model_runner)
+MODEL_PLUGIN_MODULES = [name.strip() for name in os.environ.get(
+    "MODEL_PLUGIN_MODULES", "api.models.qr_detector").split(",") if name.strip()]
+MODEL_TEST_BATCH_SIZE = int(os.environ.get("MODEL_TEST_BATCH_SIZE", 32)) # Images per model call
+MODEL_TEST_PROCESSES = int(os.environ.get("MODEL_TEST_PROCESSES", max(1, (os.cpu_count() or 2) - 1))) # Decode/inference pool size
+
+# Derivatives: thumbnails and model-input pixels in packed shards (python -m api.derivatives)
+DERIVATIVE_STORE_PATH = os.environ.get("DERIVATIVE_STORE_PATH", "./data/derivatives")
+DERIVATIVE_SHARD_BYTES = int(os.environ.get("DERIVATIVE_SHARD_BYTES", 256 * 1024 * 1024)) # Pack file size before a new shard is started
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", 320)) # Longest thumbnail side (pixels)
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", 80)) # JPEG quality of stored thumbnails
@@ -14,6 +14,9 @@ export interface ImageMetadata {
   tags?: string[];
   model_test_results?: ModelTestResult[]; // snake_case to match Supabase
   keyword?: string; // Keyword used to find this image
+  source?: string; // Provider that supplied the image (e.g. Pixabay)
+  content_hash?: string; // SHA-256 of the stored image bytes
+  has_thumbnail?: boolean; // Thumbnail stored in the derivative store (GET /api/images/{id}/thumbnail)
 }
 
 export interface ModelTestResult {
@@ -28,7 +31,7 @@ export interface ModelTestResult {
 
 export interface CrawlJob {
   id: string;
-  status: 'pending' | 'running' | 'completed' | 'failed';
+  status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled';
   start_time: string; // ISO 8601 string (snake_case to match Supabase)
   end_time?: string; // ISO 8601 string (snake_case to match Supabase)
   target_url: string; // snake_case to match Supabase
@@ -36,6 +39,13 @@ export interface CrawlJob {
   image_count: number; // snake_case to match Supabase
   errors?: string[];
   pid?: number; // Process ID for tracking (optional)
+  batch_id?: string; // Set for jobs started together by POST /api/crawl/batch
+  options?: CrawlJobOptions; // Options the job was started with (reused by retries)
+}
+
+export interface CrawlJobOptions {
+  expand?: boolean | null; // Search related queries when the keyword alone cannot fill the limit
+  variants?: string[] | null; // Related queries to try first when expanding
 }
 
 // Supabase table types (example)
@@ -1,6 +1,6 @@
 import { NextResponse } from 'next/server';
 import { createClient } from '@supabase/supabase-js';
-import { BlobReader, BlobWriter, ZipWriter } from '@zip.js/zip.js';
+import { BlobReader, ZipWriter } from '@zip.js/zip.js';
 
 // Define ImageMetadata interface directly for this API route
 interface ImageMetadata {
@@ -27,66 +27,117 @@ if (!supabaseUrl || !supabaseAnonKey) {
 
 const supabase = createClient(supabaseUrl, supabaseAnonKey);
 
-export async function GET(request: Request) {
+// Rows per search_images call (the function's maximum)
+const PAGE_SIZE = 1000;
+// Images downloaded at once; only these are held in memory while the archive streams out
+const DOWNLOAD_CONCURRENCY = 8;
+
+// Indexed search (search_images in supabase/migrations); the keyword is passed as a bound argument.
+// Matches are read one keyset page (ordered by id) at a time.
+async function fetchPage(keyword: string, afterId: string | null): Promise<ImageMetadata[]> {
+  const { data: page, error } = await supabase
+    .rpc('search_images', { p_query: keyword || null, p_limit: PAGE_SIZE, p_after_id: afterId })
+    .select('id, url, alt_text, keyword');
+  if (error) {
+    throw error;
+  }
+  return (page || []) as ImageMetadata[];
+}
+
+async function fetchImage(imgData: ImageMetadata, index: number): Promise<{ filename: string; blob: Blob } | null> {
+  const imgUrl = imgData.url;
+  if (!imgUrl) {
+    console.warn(`Skipping image with no URL: ${imgData.alt_text}`);
+    return null;
+  }
+
   try {
-    const { searchParams } = new URL(request.url);
-    const keyword = searchParams.get('keyword') || '';
+    const response = await fetch(imgUrl);
+    if (!response.ok) {
+      throw new Error(`Failed to fetch image from ${imgUrl}: ${response.statusText}`);
+    }
+    const blob = await response.blob();
+
+    // Determine filename
+    let filename = imgUrl.substring(imgUrl.lastIndexOf('/') + 1).split('?')[0];
+    if (!filename || filename.indexOf('.') === -1) {
+      // Fallback if filename is not clear from URL
+      filename = `${imgData.keyword || 'image'}_${index}.${blob.type.split('/')[1] || 'jpg'}`;
+    }
+    return { filename, blob };
+  } catch (e) {
+    console.error(`Error downloading image ${imgUrl}:`, e);
+    return null;
+  }
+}
 
-    let query = supabase.from('image_metadata').select('url, alt_text, keyword');
-    if (keyword) {
-      query = query.or(`alt_text.ilike.%${keyword}%,tags.cs.{"${keyword}"},keyword.ilike.%${keyword}%`);
+// Downloads each page in small concurrent chunks and appends the images to the archive in order,
+// reading the next page only once the previous one has been written. Stops when the client goes away.
+async function writeArchive(zipWriter: ZipWriter<unknown>, keyword: string, firstPage: ImageMetadata[],
+                            signal: AbortSignal) {
+  let page = firstPage;
+  let index = 0;
+  while (true) {
+    for (let start = 0; start < page.length; start += DOWNLOAD_CONCURRENCY) {
+      if (signal.aborted) {
+        return;
+      }
+      const chunk = page.slice(start, start + DOWNLOAD_CONCURRENCY);
+      const files = await Promise.all(chunk.map((imgData, offset) => fetchImage(imgData, index + start + offset)));
+      for (const file of files) {
+        if (!file) {
+          continue;
+        }
+        try {
+          await zipWriter.add(file.filename, new BlobReader(file.blob));
+        } catch (e) {
+          console.error(`Error adding image ${file.filename} to zip:`, e);
+        }
+      }
+    }
+    index += page.length;
+    if (page.length < PAGE_SIZE) {
+      break;
     }
+    page = await fetchPage(keyword, String(page[page.length - 1].id));
+  }
+}
 
-    const { data: imagesToDownload, error } = await query;
+export async function GET(request: Request) {
+  try {
+    const { searchParams } = new URL(request.url);
+    const keyword = searchParams.get('keyword') || '';
 
-    if (error) {
+    // Fetch the first page up front so an empty result can still be reported as 404
+    let firstPage: ImageMetadata[];
+    try {
+      firstPage = await fetchPage(keyword, null);
+    } catch (error) {
       console.error('Error fetching images from Supabase:', error);
       return NextResponse.json({ error: 'Failed to fetch images from database' }, { status: 500 });
     }
-
-    if (!imagesToDownload || imagesToDownload.length === 0) {
+    if (firstPage.length === 0) {
       return NextResponse.json({ error: 'No images found for the given keyword.' }, { status: 404 });
     }
 
-    const zipWriter = new ZipWriter(new BlobWriter("application/zip"));
-    const downloadPromises = imagesToDownload.map(async (imgData: ImageMetadata, index: number) => {
-      const imgUrl = imgData.url;
-      if (!imgUrl) {
-        console.warn(`Skipping image with no URL: ${imgData.alt_text}`);
-        return null;
-      }
-
+    // The archive is streamed to the client as entries are added instead of being built in memory
+    const { readable, writable } = new TransformStream<Uint8Array, Uint8Array>();
+    const zipWriter = new ZipWriter(writable);
+    (async () => {
       try {
-        const response = await fetch(imgUrl);
-        if (!response.ok) {
-          throw new Error(`Failed to fetch image from ${imgUrl}: ${response.statusText}`);
-        }
-        const blob = await response.blob();
-        
-        // Determine filename
-        let filename = imgUrl.substring(imgUrl.lastIndexOf('/') + 1).split('?')[0];
-        if (!filename || filename.indexOf('.') === -1) {
-          // Fallback if filename is not clear from URL
-          filename = `${imgData.keyword || 'image'}_${index}.${blob.type.split('/')[1] || 'jpg'}`;
-        }
-
-        await zipWriter.add(filename, new BlobReader(blob));
-        return filename;
-      } catch (e) {
-        console.error(`Error downloading or adding image ${imgUrl} to zip:`, e);
-        return null;
+        await writeArchive(zipWriter, keyword, firstPage, request.signal);
+      } catch (error) {
+        // The response has started: end the archive with the images written so far
+        console.error('Error streaming images into the zip file:', error);
       }
-    });
-
-    await Promise.allSettled(downloadPromises);
-
-    const zipBlob = await zipWriter.close();
+      await zipWriter.close();
+    })().catch((error) => console.error('Error closing the zip stream:', error));
 
     const headers = new Headers();
     headers.set('Content-Type', 'application/zip');
     headers.set('Content-Disposition', 'attachment; filename="filtered_images.zip"');
 
-    return new NextResponse(zipBlob, { status: 200, headers });
+    return new NextResponse(readable, { status: 200, headers });
 
   } catch (error: unknown) {
     console.error('Error generating zip file in Next.js API route:', error);
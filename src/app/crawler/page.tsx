@@ -7,6 +7,8 @@ import { CrawlJob } from '@shared/types';
 export default function CrawlerPage() {
   const [keyword, setKeyword] = useState('');
   const [limit, setLimit] = useState(10); // Number of images to collect
+  const [expand, setExpand] = useState(false); // Search related queries if the keyword runs dry
+  const [variants, setVariants] = useState(''); // Comma-separated related queries to try first
   const [loading, setLoading] = useState(false);
   const [message, setMessage] = useState('');
   const [crawlJobs, setCrawlJobs] = useState<CrawlJob[]>([]);
@@ -59,7 +61,12 @@ export default function CrawlerPage() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ keyword, limit }),
+        body: JSON.stringify({
+          keyword,
+          limit,
+          expand,
+          variants: variants.split(',').map((v) => v.trim()).filter(Boolean),
+        }),
       });
 
       if (!response.ok) {
@@ -133,6 +140,27 @@ export default function CrawlerPage() {
               required
             />
           </div>
+          <div>
+            <label className="inline-flex items-center text-sm font-medium text-gray-700">
+              <input
+                type="checkbox"
+                className="mr-2"
+                checked={expand}
+                onChange={(e) => setExpand(e.target.checked)}
+              />
+              Search related queries if the keyword alone cannot fill the limit
+            </label>
+            {expand && (
+              <input
+                type="text"
+                id="variants"
+                className="mt-2 block w-full border border-gray-300 rounded-md shadow-sm p-2"
+                placeholder="Related queries to try first, comma-separated (optional)"
+                value={variants}
+                onChange={(e) => setVariants(e.target.value)}
+              />
+            )}
+          </div>
           <button
             type="submit"
             className="inline-flex items-center px-4 py-2 border border-transparent text-base font-medium rounded-md shadow-sm text-white bg-blue-600 hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-blue-500 disabled:opacity-50"
@@ -6,39 +6,54 @@ import { ImageMetadata } from '@shared/types';
 import Image from 'next/image';
 import { XMarkIcon } from '@heroicons/react/24/outline'; // Import XMarkIcon for close button
 
+// Rows per search_images call; more are loaded with the "Load More" button
+const PAGE_SIZE = 100;
+
 export default function ImagesPage() {
   const [images, setImages] = useState<ImageMetadata[]>([]);
   const [loading, setLoading] = useState(true);
+  const [hasMore, setHasMore] = useState(false);
   const [filterKeyword, setFilterKeyword] = useState('');
   const [sortOrder, setSortOrder] = useState<'desc' | 'asc'>('desc'); // 'desc' for newest first
   const [selectedImage, setSelectedImage] = useState<ImageMetadata | null>(null);
 
+  // Indexed search (search_images in supabase/migrations) ordered by crawl_date, one keyset page at a time;
+  // the keyword is passed as a bound argument. Pass the last loaded image to read the page after it.
+  const fetchPage = React.useCallback(async (after?: ImageMetadata) => {
+    const { data, error } = await supabase.rpc('search_images', {
+      p_query: filterKeyword || null,
+      p_order_by: 'crawl_date',
+      p_descending: sortOrder === 'desc',
+      p_limit: PAGE_SIZE,
+      p_after_id: after ? String(after.id) : null,
+      p_after_date: after ? after.crawl_date : null,
+    });
+    if (error) {
+      console.error('Error fetching images:', error);
+      return null;
+    }
+    return data as ImageMetadata[];
+  }, [filterKeyword, sortOrder]);
+
   const fetchImages = React.useCallback(async () => {
     setLoading(true);
-    let query = supabase.from('image_metadata').select('*');
-
-    if (filterKeyword) {
-      // Search in alt_text and tags (assuming tags are stored as text[])
-      query = query.or(`alt_text.ilike.%${filterKeyword}%,tags.cs.{"${filterKeyword}"},keyword.ilike.%${filterKeyword}%`);
+    const page = await fetchPage();
+    if (page) {
+      setImages(page);
+      setHasMore(page.length === PAGE_SIZE);
     }
+    setLoading(false);
+  }, [fetchPage]);
 
-    query = query.order('crawl_date', { ascending: sortOrder === 'asc' });
-
-    const { data, error } = await query;
-
-    if (error) {
-      console.error('Error fetching images:', error);
-    } else {
-      // Sort by crawl_date based on sortOrder
-      const sortedData = (data as ImageMetadata[]).sort((a, b) => {
-        const dateA = new Date(a.crawl_date).getTime();
-        const dateB = new Date(b.crawl_date).getTime();
-        return sortOrder === 'desc' ? dateB - dateA : dateA - dateB;
-      });
-      setImages(sortedData);
+  const loadMore = async () => {
+    setLoading(true);
+    const page = await fetchPage(images[images.length - 1]);
+    if (page) {
+      setImages((loaded) => [...loaded, ...page]);
+      setHasMore(page.length === PAGE_SIZE);
     }
     setLoading(false);
-  }, [filterKeyword, sortOrder]);
+  };
 
   useEffect(() => {
     fetchImages();
@@ -148,7 +163,7 @@ export default function ImagesPage() {
           className="px-4 py-2 bg-green-600 text-white rounded-md shadow-sm hover:bg-green-700 disabled:opacity-50"
           disabled={loading || images.length === 0}
         >
-          Download Filtered Images ({images.length})
+          Download Filtered Images ({images.length}{hasMore ? '+' : ''})
         </button>
       </div>
 
@@ -166,11 +181,12 @@ export default function ImagesPage() {
             >
               <div className="relative w-full h-48">
                 <Image
-                  src={image.url}
+                  src={image.has_thumbnail ? `/api/images/${image.id}/thumbnail` : image.url}
                   alt={image.alt_text || 'Collected image'}
                   layout="fill"
                   objectFit="cover"
                   className="rounded-t-lg"
+                  unoptimized // Stored thumbnail when one was built (python -m api.derivatives), otherwise the original
                 />
               </div>
               <div className="p-4">
@@ -190,6 +206,18 @@ export default function ImagesPage() {
         </div>
       )}
 
+      {hasMore && (
+        <div className="text-center mt-8">
+          <button
+            onClick={loadMore}
+            className="px-4 py-2 bg-blue-600 text-white rounded-md shadow-sm hover:bg-blue-700 disabled:opacity-50"
+            disabled={loading}
+          >
+            Load More
+          </button>
+        </div>
+      )}
+
       {selectedImage && (
         <div
           className="fixed inset-0 bg-black bg-opacity-75 flex items-center justify-center z-50 p-4"
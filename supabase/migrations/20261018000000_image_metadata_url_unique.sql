@@ -0,0 +1,8 @@
+-- Bulk upserts into image_metadata use the image URL as the conflict target.
+-- Remove existing duplicate URLs (keeping the earliest row) before adding the unique index.
+DELETE FROM image_metadata a
+USING image_metadata b
+WHERE a.url = b.url
+  AND a.ctid > b.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS image_metadata_url_key ON image_metadata (url);
@@ -0,0 +1,2 @@
+-- 64-bit dHash (stored as signed bigint) used for near-duplicate detection across sources.
+ALTER TABLE image_metadata ADD COLUMN IF NOT EXISTS phash bigint;
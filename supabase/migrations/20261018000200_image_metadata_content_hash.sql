@@ -0,0 +1,3 @@
+-- SHA-256 of the image bytes; the file lives at IMAGE_STORAGE_PATH/<hash[0:2]>/<hash[2:4]>/<hash>.<format>.
+ALTER TABLE image_metadata ADD COLUMN IF NOT EXISTS content_hash text;
+CREATE INDEX IF NOT EXISTS image_metadata_content_hash_idx ON image_metadata (content_hash);
@@ -0,0 +1,69 @@
+-- Indexed image search for listings and ZIP exports (api/image_search.py).
+-- Leading-wildcard ILIKE cannot use a B-tree index; trigram GIN indexes can.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Provider that supplied the image (Pixabay, Pexels, ...), used as a search filter.
+ALTER TABLE image_metadata ADD COLUMN IF NOT EXISTS source text;
+
+CREATE INDEX IF NOT EXISTS image_metadata_keyword_trgm_idx ON image_metadata USING gin (keyword gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS image_metadata_alt_text_trgm_idx ON image_metadata USING gin (alt_text gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS image_metadata_tags_idx ON image_metadata USING gin (tags);
+CREATE INDEX IF NOT EXISTS image_metadata_source_id_idx ON image_metadata (source, id);
+CREATE INDEX IF NOT EXISTS image_metadata_format_id_idx ON image_metadata (format, id);
+
+-- Keyset-paginated search. Only the filters that are set become part of the statement, and
+-- every value is passed as a bound parameter, so each call gets a plan that uses the indexes
+-- above and user input is never spliced into SQL. p_after_id is the last id of the previous
+-- page, cast to the id column's type.
+CREATE OR REPLACE FUNCTION search_images(
+    p_query text DEFAULT NULL,
+    p_source text DEFAULT NULL,
+    p_format text DEFAULT NULL,
+    p_min_width integer DEFAULT NULL,
+    p_min_height integer DEFAULT NULL,
+    p_after_id text DEFAULT NULL,
+    p_limit integer DEFAULT 100,
+    p_descending boolean DEFAULT false
+)
+RETURNS SETOF image_metadata
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    conditions text[] := ARRAY['true'];
+    pattern text;
+    id_type text;
+BEGIN
+    IF p_query IS NOT NULL AND p_query <> '' THEN
+        -- Match the query literally: escape LIKE wildcards
+        pattern := '%' || replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_') || '%';
+        conditions := conditions || '(keyword ILIKE $1 OR alt_text ILIKE $1 OR tags @> ARRAY[$2])'::text;
+    END IF;
+    IF p_source IS NOT NULL THEN
+        conditions := conditions || 'source = $3'::text;
+    END IF;
+    IF p_format IS NOT NULL THEN
+        conditions := conditions || 'format = $4'::text;
+    END IF;
+    IF p_min_width IS NOT NULL THEN
+        conditions := conditions || 'width >= $5'::text;
+    END IF;
+    IF p_min_height IS NOT NULL THEN
+        conditions := conditions || 'height >= $6'::text;
+    END IF;
+    IF p_after_id IS NOT NULL THEN
+        SELECT format_type(atttypid, atttypmod) INTO id_type
+        FROM pg_attribute
+        WHERE attrelid = 'image_metadata'::regclass AND attname = 'id';
+        conditions := conditions || format('id %s CAST($7 AS %s)',
+                                           CASE WHEN p_descending THEN '<' ELSE '>' END, id_type);
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'SELECT * FROM image_metadata WHERE %s ORDER BY id %s LIMIT $8',
+        array_to_string(conditions, ' AND '),
+        CASE WHEN p_descending THEN 'DESC' ELSE 'ASC' END)
+    USING pattern, p_query, p_source, p_format, p_min_width, p_min_height, p_after_id,
+          least(greatest(p_limit, 1), 1000);
+END;
+$$;
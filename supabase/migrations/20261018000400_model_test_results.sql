@@ -0,0 +1,17 @@
+-- One row per (image, model, model version), written in bulk by api/model_runner.py.
+CREATE TABLE IF NOT EXISTS model_test_results (
+    id bigserial PRIMARY KEY
+);
+
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS image_id text;
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS model_id text;
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS model_name text;
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS version text;
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS test_date timestamptz DEFAULT now();
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS result text;
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS score double precision;
+ALTER TABLE model_test_results ADD COLUMN IF NOT EXISTS details jsonb;
+
+-- Conflict target of the bulk upserts; also lets a rerun list already-tested images quickly.
+CREATE UNIQUE INDEX IF NOT EXISTS model_test_results_image_model_version_key
+    ON model_test_results (model_id, version, image_id);
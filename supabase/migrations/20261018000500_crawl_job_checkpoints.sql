@@ -0,0 +1,18 @@
+-- One row per page a crawl job accepted, written by api/checkpoint.py as the job runs.
+-- A retried job restores the images stored here and resumes each source after its stored positions.
+CREATE TABLE IF NOT EXISTS crawl_job_checkpoints (
+    id bigserial PRIMARY KEY
+);
+
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS job_id text;
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS seq integer;
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS phase text;
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS query text;
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS source text;
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS positions jsonb;
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS images jsonb;
+ALTER TABLE crawl_job_checkpoints ADD COLUMN IF NOT EXISTS created_at timestamptz DEFAULT now();
+
+-- Conflict target of the per-page upserts; also serves the ordered read on resume.
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_job_checkpoints_job_seq_key
+    ON crawl_job_checkpoints (job_id, seq);
@@ -0,0 +1,4 @@
+-- Jobs started together by POST /api/crawl/batch share a batch_id; GET /api/crawl/batches/{id} aggregates them.
+ALTER TABLE crawl_jobs ADD COLUMN IF NOT EXISTS batch_id text;
+
+CREATE INDEX IF NOT EXISTS crawl_jobs_batch_id_idx ON crawl_jobs (batch_id);
@@ -0,0 +1,3 @@
+-- Set by python -m api.derivatives once an image's thumbnail is stored; the gallery only
+-- requests GET /api/images/{id}/thumbnail for these rows and loads the original URL otherwise.
+ALTER TABLE image_metadata ADD COLUMN IF NOT EXISTS has_thumbnail boolean NOT NULL DEFAULT false;
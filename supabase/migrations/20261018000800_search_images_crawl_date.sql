@@ -0,0 +1,82 @@
+-- Crawl-date ordering for search_images (image gallery "Newest/Oldest First").
+-- Rows without a crawl_date sort as the oldest, so the keyset below never skips them.
+CREATE INDEX IF NOT EXISTS image_metadata_crawl_date_id_idx
+    ON image_metadata ((coalesce(crawl_date, '-infinity'::timestamptz)), id);
+
+-- The new parameters change the signature; drop the old one so PostgREST sees a single function.
+DROP FUNCTION IF EXISTS search_images(text, text, text, integer, integer, text, integer, boolean);
+
+-- Same as 20261018000300_image_metadata_search.sql, plus p_order_by: 'id' (default) or
+-- 'crawl_date', ordered by (crawl_date, id). With 'crawl_date', pass the last row's crawl_date
+-- as p_after_date together with its id as p_after_id to read the next page.
+CREATE OR REPLACE FUNCTION search_images(
+    p_query text DEFAULT NULL,
+    p_source text DEFAULT NULL,
+    p_format text DEFAULT NULL,
+    p_min_width integer DEFAULT NULL,
+    p_min_height integer DEFAULT NULL,
+    p_after_id text DEFAULT NULL,
+    p_limit integer DEFAULT 100,
+    p_descending boolean DEFAULT false,
+    p_order_by text DEFAULT 'id',
+    p_after_date text DEFAULT NULL
+)
+RETURNS SETOF image_metadata
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    conditions text[] := ARRAY['true'];
+    pattern text;
+    id_type text;
+    direction text := CASE WHEN p_descending THEN 'DESC' ELSE 'ASC' END;
+    order_clause text;
+BEGIN
+    IF p_order_by IS NULL OR p_order_by NOT IN ('id', 'crawl_date') THEN
+        RAISE EXCEPTION 'p_order_by must be id or crawl_date';
+    END IF;
+    IF p_query IS NOT NULL AND p_query <> '' THEN
+        -- Match the query literally: escape LIKE wildcards
+        pattern := '%' || replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_') || '%';
+        conditions := conditions || '(keyword ILIKE $1 OR alt_text ILIKE $1 OR tags @> ARRAY[$2])'::text;
+    END IF;
+    IF p_source IS NOT NULL THEN
+        conditions := conditions || 'source = $3'::text;
+    END IF;
+    IF p_format IS NOT NULL THEN
+        conditions := conditions || 'format = $4'::text;
+    END IF;
+    IF p_min_width IS NOT NULL THEN
+        conditions := conditions || 'width >= $5'::text;
+    END IF;
+    IF p_min_height IS NOT NULL THEN
+        conditions := conditions || 'height >= $6'::text;
+    END IF;
+    IF p_after_id IS NOT NULL THEN
+        SELECT format_type(atttypid, atttypmod) INTO id_type
+        FROM pg_attribute
+        WHERE attrelid = 'image_metadata'::regclass AND attname = 'id';
+        IF p_order_by = 'crawl_date' THEN
+            conditions := conditions || format(
+                '(coalesce(crawl_date, ''-infinity''::timestamptz), id) %s '
+                '(coalesce(CAST($9 AS timestamptz), ''-infinity''::timestamptz), CAST($7 AS %s))',
+                CASE WHEN p_descending THEN '<' ELSE '>' END, id_type);
+        ELSE
+            conditions := conditions || format('id %s CAST($7 AS %s)',
+                                               CASE WHEN p_descending THEN '<' ELSE '>' END, id_type);
+        END IF;
+    END IF;
+
+    IF p_order_by = 'crawl_date' THEN
+        order_clause := format('coalesce(crawl_date, ''-infinity''::timestamptz) %s, id %s', direction, direction);
+    ELSE
+        order_clause := 'id ' || direction;
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'SELECT * FROM image_metadata WHERE %s ORDER BY %s LIMIT $8',
+        array_to_string(conditions, ' AND '), order_clause)
+    USING pattern, p_query, p_source, p_format, p_min_width, p_min_height, p_after_id,
+          least(greatest(p_limit, 1), 1000), p_after_date;
+END;
+$$;
@@ -0,0 +1,2 @@
+-- Options a crawl job was started with (expand, variants), so POST /api/crawl/jobs/{id}/retry runs it the same way.
+ALTER TABLE crawl_jobs ADD COLUMN IF NOT EXISTS options jsonb;